@@ -0,0 +1,407 @@
+import sys
+import os
+import argparse
+
+import numpy as np
+
+# Same path setup as main.py so 'core' can be imported when running from source
+if not getattr(sys, 'frozen', False):
+    src_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'src')
+    sys.path.append(src_path)
+
+from core.tariff_engine import TariffEngine
+from core.bulk_expression import BulkExpressionError, compile_bulk_expression
+from core.money import ROUNDING_MODES, percentage_factor, verify_affine
+from core.atomic_io import atomic_write
+from core.compressed_io import check_level
+from core.generator import GeneratorError, LinearPricing, parse_anchor_grid, parse_number_list
+
+
+def _engine(args):
+    """TariffEngine with the options shared by all saving commands."""
+    engine = TariffEngine()
+    engine.compression_level = args.compression_level
+    return engine
+
+
+def _load(engine, path):
+    success, msg = engine.load_template(path)
+    if not success:
+        raise SystemExit(msg)
+    return engine.load_table()
+
+
+def _expression(args):
+    """The bulk update of --expression, or --percent on --column written as an expression."""
+    if args.expression is not None:
+        return args.expression
+    if args.percent is None:
+        raise SystemExit("Entweder --expression oder --percent angeben.")
+    return f"{args.column} = {args.column} * {percentage_factor(args.percent)}"
+
+
+def cmd_bulk(args):
+    """Applies an expression-based or percentage bulk update to an XML tariff."""
+    engine = _engine(args)
+    engine.rounding_mode = args.rounding
+    df = _load(engine, args.input)
+
+    expression = _expression(args)
+    try:
+        preview = engine.preview_bulk_expression(df, expression)
+    except BulkExpressionError as e:
+        raise SystemExit(f"Ungültige Formel: {e}")
+
+    print("\n".join(preview.summary_lines()))
+
+    if args.verify:
+        # Compare the vectorized cents arithmetic against the Decimal reference implementation
+        rule = compile_bulk_expression(expression, df.columns.tolist())
+        terms = rule.affine_terms()
+        if not engine.schema.is_money(rule.target) or terms is None or rule.floor is not None:
+            print("Prüfung: nur für einfache Formeln (Spalte * a + b, optional mit round) auf Preisspalten möglich.")
+        else:
+            # The exact terms, so price/3 is checked as 1/3 and not as its float approximation
+            cents = df[rule.target].to_numpy()[preview.mask]
+            mismatches = verify_affine(cents, terms[0], terms[1], args.rounding, rule.cents_step)
+            print(f"Prüfung gegen Decimal-Referenz: {mismatches} Abweichung(en)")
+            if mismatches:
+                return 1
+
+    if args.dry_run:
+        return 0
+
+    df = preview.apply(df)
+    if args.lossless and engine.can_save_lossless():
+        engine.save_lossless(df, np.arange(len(df)), args.output or args.input)
+    else:
+        engine.update_tuples(df)
+        engine.save_to_file(args.output or args.input)
+    return 0
+
+
+def cmd_generate(args):
+    """Generates a stepped tariff from breakpoints and streams it to XML."""
+    engine = _engine(args)
+    engine.rounding_mode = args.rounding
+    try:
+        if args.template:
+            _load(engine, args.template)
+        else:
+            engine.create_from_definition(args.definition)
+
+        if args.anchors:
+            with open(args.anchors, 'r', encoding='utf-8') as f:
+                pricing = parse_anchor_grid(f.read())
+        else:
+            pricing = LinearPricing(args.base, args.per_km, args.per_unit)
+
+        df = engine.generate_grid(parse_number_list(args.distances), parse_number_list(args.quantities),
+                                  pricing, args.order_kind, args.quantity_column)
+    except GeneratorError as e:
+        raise SystemExit(f"Generator: {e}")
+
+    if args.compact:
+        from core.compaction import compact_brackets, verify_compaction
+        compaction = compact_brackets(df)
+        if verify_compaction(df, compaction.frame):
+            raise SystemExit("Zusammenfassen würde die Preisfindung ändern, abgebrochen.")
+        df = compaction.frame
+        print(compaction.summary())
+
+    if args.name:
+        engine.update_metadata({'name': args.name, 'id': args.name})
+    engine.save_streaming(df, args.output)
+    print(f"{len(df)} Zeilen nach {args.output} geschrieben.")
+    return 0
+
+
+def cmd_simulate(args):
+    """Replays historical shipments against the current prices and a proposed bulk update."""
+    from core.rating import BracketRater
+    from core.revenue import ShipmentFileError, load_shipments, simulate_revenue
+
+    engine = TariffEngine()
+    engine.rounding_mode = args.rounding
+    df = _load(engine, args.input)
+    try:
+        preview = engine.preview_bulk_expression(df, _expression(args))
+    except BulkExpressionError as e:
+        raise SystemExit(f"Ungültige Formel: {e}")
+    try:
+        rater = BracketRater(df, price_column=preview.column)
+        shipments = load_shipments(args.shipments, rater.quantity_column, args.distance_column,
+                                   args.quantity_column, args.order_kind_column)
+    except (ValueError, RuntimeError) as e:
+        raise SystemExit(str(e))
+
+    proposed = preview.apply(df.copy())[preview.column].to_numpy()
+    impact = simulate_revenue(df, shipments, proposed, preview.column, engine.schema.is_money(preview.column), rater)
+    print("\n".join(impact.summary_lines(args.top)))
+    if args.report:
+        with atomic_write(args.report, 'w', encoding='utf-8-sig') as f:
+            impact.bracket_frame().to_csv(f, sep=';', decimal=',', index=False, lineterminator='\n')
+        print(f"Bericht je Stufe nach {args.report} geschrieben.")
+    return 0
+
+
+def cmd_dedupe(args):
+    """Reports exact duplicate tuples and bracket conflicts, and removes them unless --dry-run."""
+    from core.dedupe import find_duplicates
+
+    engine = _engine(args)
+    df = _load(engine, args.input)
+    report = find_duplicates(df, args.keys.split(',') if args.keys else None)
+    print("\n".join(report.summary_lines(args.top, df)))
+
+    conflicts = None if args.conflicts == 'keep' else args.conflicts
+    mask = report.removal_mask(conflicts)
+    if args.dry_run or not mask.any():
+        # Unresolved conflicts fail the check, e.g. in a batch job before the upload
+        return 1 if report.conflicts.size and conflicts is None else 0
+
+    keep = np.flatnonzero(~mask)
+    df = df.iloc[keep].reset_index(drop=True)
+    if args.lossless and engine.can_save_lossless():
+        engine.save_lossless(df, keep, args.output or args.input)
+    else:
+        engine.update_tuples(df)
+        engine.save_to_file(args.output or args.input)
+    print(f"{int(mask.sum())} Zeilen entfernt.")
+    return 0
+
+
+def _bracket_filter(text):
+    """"maxDistance=250,maxWeight=1000" as {column: value}."""
+    bracket = {}
+    for part in text.split(","):
+        key, _, value = part.partition("=")
+        try:
+            bracket[key.strip()] = float(value)
+        except ValueError:
+            raise SystemExit(f"Ungültige Stufenangabe: {part}")
+    return bracket
+
+
+def cmd_history(args):
+    """Tariff version archive: add files, list, check out versions, price of a bracket over time."""
+    from core.tariff_history import HistoryError, TariffHistory
+
+    with TariffHistory(args.store) as history:
+        try:
+            if args.action == "add":
+                for path in args.files:
+                    for tariff, version_id, added in history.add_file(path, args.tariff, args.label):
+                        print(f"{path}: {tariff} Version {version_id} ({added / 1e3:.1f} kB neu gespeichert)")
+                print(history.summary_lines()[-1])
+            elif args.action == "list":
+                print("\n".join(history.summary_lines(args.tariff)))
+            elif args.action == "checkout":
+                engine, df = history.checkout(args.version)
+                engine.compression_level = args.compression_level
+                engine.save_streaming(df, args.output)
+                print(f"Version {args.version}: {len(df)} Zeilen nach {args.output} geschrieben.")
+            elif args.action == "price":
+                bracket = _bracket_filter(args.bracket) if args.bracket else None
+                frame = history.price_history(args.tariff, bracket, args.at, args.order_kind, args.column)
+                print(frame.to_string(index=False, na_rep="-", float_format=lambda v: f"{v:.2f}"))
+            elif args.action == "delete":
+                history.delete(args.version)
+                print(f"Version {args.version} gelöscht.")
+        except (HistoryError, ValueError) as e:
+            raise SystemExit(str(e))
+    return 0
+
+
+def cmd_repo(args):
+    """Tariff repository: ingest files into SQLite, list tariffs, find brackets across tariffs, open a tariff."""
+    import time
+    from core.tariff_repository import RepositoryError, TariffRepository
+
+    with TariffRepository(args.store) as repo:
+        try:
+            if args.action == "ingest":
+                started = time.perf_counter()
+                result = repo.ingest(args.paths, prune=args.prune)
+                print(f"{result['ingested']} eingelesen, {result['unchanged']} unverändert, "
+                      f"{result['removed']} entfernt ({time.perf_counter() - started:.1f} s)")
+                for path, message in result['errors'].items():
+                    print(f"Fehler in {path}: {message}")
+                print("\n".join(repo.summary_lines()))
+                return 1 if result['errors'] else 0
+            if args.action == "list":
+                frame = repo.tariffs(args.spec, args.valid_on, args.name)
+                print(frame.drop(columns=["path"]).to_string(index=False) if len(frame) else "Keine Tarife gefunden.")
+            elif args.action == "find":
+                started = time.perf_counter()
+                frame = repo.find_brackets(_bracket_filter(args.bracket) if args.bracket else None, args.at,
+                                           args.order_kind, args.spec, args.valid_on, args.name, args.limit)
+                elapsed = (time.perf_counter() - started) * 1000
+                if len(frame):
+                    print(frame.to_string(index=False, na_rep="-"))
+                print(f"{len(frame)} Stufe(n) in {frame['tariff'].nunique() if len(frame) else 0} Tarif(en), "
+                      f"{elapsed:.1f} ms")
+            elif args.action == "open":
+                engine, df = repo.open(args.tariff)
+                engine.compression_level = args.compression_level
+                engine.save_streaming(df, args.output)
+                print(f"Tarif {args.tariff}: {len(df)} Zeilen nach {args.output} geschrieben.")
+        except (RepositoryError, ValueError) as e:
+            raise SystemExit(str(e))
+    return 0
+
+
+def cmd_serve(args):
+    """Serves batch price quotes for the given tariff files/folders over local HTTP."""
+    import asyncio
+    from core.quote_service import QuoteServer, TariffStore
+
+    server = QuoteServer(TariffStore(args.tariffs), args.host, args.port, args.reload_interval)
+    try:
+        asyncio.run(server.serve())
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="cli.py", description="ORD Tariff Manager (Kommandozeile)",
+                                     epilog="Tarife werden als .xml, .xml.gz oder .xml.zst gelesen; die Endung der "
+                                            "Zieldatei bestimmt die Kompression beim Speichern.")
+    parser.add_argument("--compression-level", type=int,
+                        help="Kompressionsstufe für .xml.gz (1-9, Standard 6) und .xml.zst (1-22, Standard 3)")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    bulk = sub.add_parser("bulk", help="Formelbasierte oder prozentuale Preisanpassung")
+    bulk.add_argument("input", help="XML Tarif")
+    bulk.add_argument("-e", "--expression",
+                      help="z.B. \"price = price * 1.035 + 0.5 where maxDistance > 200 round 2 min 10\"")
+    bulk.add_argument("-p", "--percent", type=float, help="Prozentuale Änderung (statt --expression)")
+    bulk.add_argument("-c", "--column", default="price", help="Spalte für --percent (Standard: price)")
+    bulk.add_argument("-r", "--rounding", choices=list(ROUNDING_MODES), default="half_up",
+                      help="Rundungsmodus für Preisspalten")
+    bulk.add_argument("-o", "--output", help="Zieldatei (Standard: Eingabedatei überschreiben)")
+    bulk.add_argument("--dry-run", action="store_true", help="Nur Vorschau anzeigen, nichts speichern")
+    bulk.add_argument("--verify", action="store_true", help="Ergebnis gegen Decimal-Referenz prüfen")
+    bulk.add_argument("--lossless", action="store_true",
+                      help="Nur geänderte Werte in die Originaldatei einsetzen (Formatierung bleibt erhalten)")
+    bulk.set_defaults(func=cmd_bulk)
+
+    gen = sub.add_parser("generate", help="Stufentarif aus Entfernungs- und Mengenstufen erzeugen")
+    source = gen.add_mutually_exclusive_group(required=True)
+    source.add_argument("--definition", help="Tarif-Definition aus TariffDefinitions, z.B. SteppedWeightDistanceConsolidation.json")
+    source.add_argument("--template", help="Bestehender XML Tarif als Vorlage (Kopfdaten und Spalten)")
+    gen.add_argument("-d", "--distances", required=True, help="Entfernungs-Stufen, z.B. \"50;100;200\"")
+    gen.add_argument("-q", "--quantities", required=True, help="Gewichts-/Volumen-Stufen, z.B. \"10;25;50\"")
+    gen.add_argument("--quantity-column", help="Mengen-Spalte (Standard: erste max*-Spalte außer maxDistance)")
+    gen.add_argument("--base", type=float, default=0.0, help="Grundpreis in EUR")
+    gen.add_argument("--per-km", type=float, default=0.0, help="Preis pro km in EUR")
+    gen.add_argument("--per-unit", type=float, default=0.0, help="Preis pro Mengeneinheit in EUR")
+    gen.add_argument("--anchors", help="Ankerraster als TSV (statt linearer Preisfunktion), wird interpoliert")
+    gen.add_argument("--order-kind", type=int, choices=[2, 3], help="Auftragsart (2 = Distribution, 3 = Return)")
+    gen.add_argument("--compact", action="store_true",
+                     help="Benachbarte Stufen mit gleichem Preis vor dem Speichern zusammenfassen")
+    gen.add_argument("--name", help="Tarifname")
+    gen.add_argument("-r", "--rounding", choices=list(ROUNDING_MODES), default="half_up",
+                     help="Rundungsmodus für Preisspalten")
+    gen.add_argument("-o", "--output", required=True, help="Zieldatei")
+    gen.set_defaults(func=cmd_generate)
+
+    sim = sub.add_parser("simulate", help="Umsatzwirkung einer Preisanpassung an historischen Sendungen prüfen")
+    sim.add_argument("input", help="XML Tarif")
+    sim.add_argument("shipments", help="Sendungshistorie als CSV oder Parquet (Entfernung, Gewicht/Volumen, Auftragsart)")
+    sim.add_argument("-e", "--expression", help="Geplante Anpassung als Formel (wie bei bulk)")
+    sim.add_argument("-p", "--percent", type=float, help="Geplante prozentuale Änderung (statt --expression)")
+    sim.add_argument("-c", "--column", default="price", help="Spalte für --percent (Standard: price)")
+    sim.add_argument("-r", "--rounding", choices=list(ROUNDING_MODES), default="half_up",
+                     help="Rundungsmodus für Preisspalten")
+    sim.add_argument("--distance-column", help="Spalte mit der Entfernung (Standard: distance)")
+    sim.add_argument("--quantity-column", help="Spalte mit Gewicht/Volumen (Standard: weight bzw. volume)")
+    sim.add_argument("--order-kind-column", help="Spalte mit der Auftragsart (Standard: order_kind, falls vorhanden)")
+    sim.add_argument("--top", type=int, default=10, help="Anzahl der Stufen mit der größten Änderung")
+    sim.add_argument("--report", help="Bericht je Stufe als CSV schreiben")
+    sim.set_defaults(func=cmd_simulate)
+
+    dedupe = sub.add_parser("dedupe", help="Doppelte Tupel und widersprüchliche Stufen finden und entfernen")
+    dedupe.add_argument("input", help="XML Tarif")
+    dedupe.add_argument("--conflicts", choices=["keep", "first", "last"], default="keep",
+                        help="Stufen mit widersprüchlichen Werten: beibehalten (Standard), erste oder letzte Zeile behalten")
+    dedupe.add_argument("--keys", help="Schlüsselspalten, kommagetrennt (Standard: min*/max*-Spalten und id_orderkind)")
+    dedupe.add_argument("--top", type=int, default=10, help="Anzahl der aufgelisteten Konflikte")
+    dedupe.add_argument("-o", "--output", help="Zieldatei (Standard: Eingabedatei überschreiben)")
+    dedupe.add_argument("--dry-run", action="store_true", help="Nur berichten, nichts speichern")
+    dedupe.add_argument("--lossless", action="store_true",
+                        help="Nur die entfernten Tupel aus der Originaldatei schneiden (Formatierung bleibt erhalten)")
+    dedupe.set_defaults(func=cmd_dedupe)
+
+    history = sub.add_parser("history", help="Versionsarchiv für Tarife (SQLite, gleiche Blöcke werden geteilt)")
+    history.add_argument("--store", default="tariff_history.sqlite", help="Archivdatei (Standard: tariff_history.sqlite)")
+    actions = history.add_subparsers(dest="action", required=True)
+    add = actions.add_parser("add", help="XML Tarife als neue Versionen ablegen")
+    add.add_argument("files", nargs="+", help="XML Tarife")
+    add.add_argument("--tariff", help="Tarifname (Standard: Dateiname ohne Jahreszahl)")
+    add.add_argument("--label", help="Bezeichnung der Version (Standard: Jahreszahl im Dateinamen oder gültig ab)")
+    listing = actions.add_parser("list", help="Versionen und Speicherbedarf anzeigen")
+    listing.add_argument("--tariff", help="Nur Versionen dieses Tarifs")
+    checkout = actions.add_parser("checkout", help="Version als XML Tarif schreiben")
+    checkout.add_argument("version", type=int, help="Versionsnummer (siehe list)")
+    checkout.add_argument("-o", "--output", required=True, help="Zieldatei")
+    price = actions.add_parser("price", help="Preis einer Stufe über alle Versionen eines Tarifs")
+    price.add_argument("tariff", help="Tarifname (siehe list)")
+    price.add_argument("--bracket", help="Stufe über Spaltenwerte, z.B. \"maxDistance=100,maxWeight=50\"")
+    price.add_argument("--at", nargs=2, type=float, metavar=("DISTANCE", "QUANTITY"),
+                       help="Stufe über eine Sendung (folgt der Stufe, auch wenn sich die Grenzen ändern)")
+    price.add_argument("--order-kind", type=int, help="Auftragsart für --at")
+    price.add_argument("-c", "--column", default="price", help="Spalte (Standard: price)")
+    delete = actions.add_parser("delete", help="Version löschen (nicht mehr benötigte Blöcke werden entfernt)")
+    delete.add_argument("version", type=int, help="Versionsnummer")
+    history.set_defaults(func=cmd_history)
+
+    repo = sub.add_parser("repo", help="Tarif-Repository (SQLite) für Abfragen über alle Tarife")
+    repo.add_argument("--store", default="tariff_repository.sqlite",
+                      help="Datenbankdatei (Standard: tariff_repository.sqlite)")
+    actions = repo.add_subparsers(dest="action", required=True)
+    ingest = actions.add_parser("ingest", help="XML Tarife oder Ordner einlesen (unveränderte Dateien werden übersprungen)")
+    ingest.add_argument("paths", nargs="+", help="XML Tarife oder Ordner (rekursiv)")
+    ingest.add_argument("--prune", action="store_true", help="Tarife gelöschter Dateien entfernen")
+    for name, help_text in (("list", "Tarife auflisten"), ("find", "Stufen über alle Tarife suchen")):
+        query = actions.add_parser(name, help=help_text)
+        query.add_argument("--spec", help="Nur Tarife dieser Spezifikation (tariff_item_spec)")
+        query.add_argument("--valid-on", help="Nur Tarife, die an diesem Tag gültig sind (JJJJ-MM-TT)")
+        query.add_argument("--name", help="Nur Tarife, deren Name dies enthält")
+        if name == "find":
+            query.add_argument("--bracket", help="Stufe über Spaltenwerte, z.B. \"maxDistance=250,maxWeight=1000\"")
+            query.add_argument("--at", nargs=2, type=float, metavar=("DISTANCE", "QUANTITY"),
+                               help="Stufen, in die diese Sendung fällt")
+            query.add_argument("--order-kind", type=int, help="Nur Stufen dieser Auftragsart")
+            query.add_argument("--limit", type=int, default=1000, help="Höchstens so viele Stufen")
+    open_ = actions.add_parser("open", help="Tarif aus dem Repository als XML schreiben")
+    open_.add_argument("tariff", type=int, help="Tarifnummer (siehe list)")
+    open_.add_argument("-o", "--output", required=True, help="Zieldatei")
+    repo.set_defaults(func=cmd_repo)
+
+    serve = sub.add_parser("serve", help="Preisauskunft für Tarife als lokaler HTTP-Dienst (JSON)")
+    serve.add_argument("tariffs", nargs="+", help="XML Tarife oder Ordner mit XML Tarifen")
+    serve.add_argument("--host", default="127.0.0.1", help="Adresse (Standard: 127.0.0.1)")
+    serve.add_argument("--port", type=int, default=8765, help="Port (Standard: 8765)")
+    serve.add_argument("--reload-interval", type=float, default=2.0,
+                       help="Sekunden zwischen Prüfungen auf geänderte Tarif-Dateien")
+    serve.set_defaults(func=cmd_serve)
+
+    return parser
+
+
+if __name__ == "__main__":
+    parser = build_parser()
+    args = parser.parse_args()
+    target = getattr(args, 'output', None) or getattr(args, 'input', None)
+    if target:
+        try:
+            check_level(target, args.compression_level)
+        except ValueError as e:
+            parser.error(str(e))
+    try:
+        sys.exit(args.func(args))
+    except RuntimeError as e:
+        # Missing optional packages (zstandard, pyarrow) are reported as a message, not a traceback
+        raise SystemExit(str(e))
@@ -0,0 +1,150 @@
+"""
+Load test for the quote service (cli.py serve).
+
+    python quote_loadtest.py --url http://127.0.0.1:8765 --connections 32 --batch 50 --duration 10
+
+Opens keep-alive connections, sends batch quote requests with random shipments across
+the tariff's bracket ranges (and 5 % beyond, to exercise misses) as fast as the server
+answers, and reports requests and shipments per second plus latency percentiles. With --serve PATH a local instance is
+started for the run and stopped afterwards.
+"""
+import sys
+import os
+import argparse
+import asyncio
+import json
+import subprocess
+import time
+from urllib.parse import urlsplit
+
+import numpy as np
+
+
+async def _request(reader, writer, host, method, path, payload=None):
+    body = b"" if payload is None else json.dumps(payload).encode('utf-8')
+    writer.write((f"{method} {path} HTTP/1.1\r\nHost: {host}\r\nContent-Type: application/json\r\n"
+                  f"Content-Length: {len(body)}\r\n\r\n").encode('latin-1') + body)
+    head = await reader.readuntil(b"\r\n\r\n")
+    status = int(head.split(b" ", 2)[1])
+    length = 0
+    for line in head.split(b"\r\n"):
+        if line.lower().startswith(b"content-length:"):
+            length = int(line.split(b":", 1)[1])
+    return status, json.loads(await reader.readexactly(length))
+
+
+async def _wait_for_server(host, port, timeout):
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            reader, writer = await asyncio.open_connection(host, port)
+            status, result = await _request(reader, writer, host, "GET", "/tariffs")
+            writer.close()
+            return result
+        except OSError:
+            if time.monotonic() > deadline:
+                raise SystemExit(f"Keine Preisauskunft unter {host}:{port} erreichbar.")
+            await asyncio.sleep(0.2)
+
+
+def _payloads(tariff, batch, count, seed):
+    """Pre-built request bodies with random shipments (so the client does not limit the rate)."""
+    rng = np.random.default_rng(seed)
+    kinds = tariff['order_kinds']
+    payloads = []
+    for _ in range(count):
+        payload = {'tariff': tariff['name'],
+                   'distance': np.round(rng.uniform(0, tariff['max_distance'] * 1.05, batch), 1).tolist(),
+                   'quantity': np.round(rng.uniform(0, tariff['max_quantity'] * 1.05, batch), 2).tolist()}
+        if len(kinds) > 1:
+            payload['order_kind'] = kinds[0]
+        payloads.append(payload)
+    return payloads
+
+
+async def _worker(host, port, payloads, stop_at, latencies, counters):
+    reader, writer = await asyncio.open_connection(host, port)
+    i = 0
+    try:
+        while time.monotonic() < stop_at:
+            payload = payloads[i % len(payloads)]
+            i += 1
+            started = time.perf_counter()
+            status, result = await _request(reader, writer, host, "POST", "/quote", payload)
+            latencies.append(time.perf_counter() - started)
+            if status != 200:
+                counters['errors'] += 1
+                continue
+            counters['requests'] += 1
+            counters['shipments'] += len(result['prices'])
+            counters['unrated'] += result['unrated']
+    finally:
+        writer.close()
+
+
+async def run(args):
+    url = urlsplit(args.url)
+    host, port = url.hostname, url.port or 80
+    listing = await _wait_for_server(host, port, args.startup_timeout)
+    tariffs = listing['tariffs']
+    if not tariffs:
+        raise SystemExit("Der Dienst hat keine Tarife geladen.")
+    tariff = next((t for t in tariffs if t['name'] == args.tariff), None) if args.tariff else tariffs[0]
+    if tariff is None:
+        raise SystemExit(f"Tarif '{args.tariff}' ist nicht geladen.")
+    tariff = dict(tariff, max_distance=args.max_distance or tariff['max_distance'],
+                  max_quantity=args.max_quantity or tariff['max_quantity'])
+    payloads = _payloads(tariff, args.batch, 64, args.seed)
+
+    latencies = []
+    counters = {'requests': 0, 'shipments': 0, 'unrated': 0, 'errors': 0}
+    started = time.monotonic()
+    stop_at = started + args.duration
+    await asyncio.gather(*[_worker(host, port, payloads, stop_at, latencies, counters)
+                           for _ in range(args.connections)])
+    elapsed = time.monotonic() - started
+
+    lat = np.array(latencies) * 1000
+    print(f"Tarif: {tariff['name']} ({tariff['rows']} Zeilen), {args.connections} Verbindungen, "
+          f"{args.batch} Sendungen je Anfrage, {elapsed:.1f} s")
+    print(f"Anfragen:  {counters['requests']} ({counters['requests'] / elapsed:,.0f}/s), "
+          f"Fehler: {counters['errors']}")
+    print(f"Sendungen: {counters['shipments']} ({counters['shipments'] / elapsed:,.0f}/s), "
+          f"ohne Preis: {counters['unrated']}")
+    if lat.size:
+        p50, p90, p99 = np.percentile(lat, [50, 90, 99])
+        print(f"Latenz:    p50 {p50:.2f} ms, p90 {p90:.2f} ms, p99 {p99:.2f} ms, max {lat.max():.2f} ms")
+    return 0 if counters['errors'] == 0 else 1
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Lasttest für die Preisauskunft (cli.py serve)")
+    parser.add_argument("--url", default="http://127.0.0.1:8765", help="Adresse des Dienstes")
+    parser.add_argument("--serve", nargs="+", metavar="PATH",
+                        help="Lokale Instanz mit diesen Tarifen für den Test starten")
+    parser.add_argument("--tariff", help="Tarifname (Standard: erster geladener Tarif)")
+    parser.add_argument("--connections", type=int, default=32, help="Gleichzeitige Verbindungen")
+    parser.add_argument("--batch", type=int, default=50, help="Sendungen je Anfrage")
+    parser.add_argument("--duration", type=float, default=10.0, help="Dauer in Sekunden")
+    parser.add_argument("--max-distance", type=float, help="Größte zufällige Entfernung (Standard: größte Tarifstufe)")
+    parser.add_argument("--max-quantity", type=float, help="Größte zufällige Menge (Standard: größte Tarifstufe)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--startup-timeout", type=float, default=30.0)
+    args = parser.parse_args()
+
+    server = None
+    if args.serve:
+        url = urlsplit(args.url)
+        cli = os.path.join(os.path.dirname(os.path.abspath(__file__)), "cli.py")
+        server = subprocess.Popen([sys.executable, cli, "serve", *args.serve,
+                                   "--host", url.hostname, "--port", str(url.port or 80)])
+    try:
+        return asyncio.run(run(args))
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
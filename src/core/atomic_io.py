@@ -0,0 +1,57 @@
+import os
+import stat
+import tempfile
+from contextlib import contextmanager
+
+
+@contextmanager
+def atomic_write(path: str, mode: str = 'wb', encoding: str = None):
+    """
+    Opens a temporary file next to path for writing. When the block finishes, the file is
+    flushed, fsynced and renamed over path with os.replace, so readers see either the old
+    or the complete new file, never a truncated one. On an exception the temp file is
+    removed and path is left untouched.
+    """
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(prefix=f".{os.path.basename(path)}.", suffix=".tmp", dir=directory)
+    try:
+        with os.fdopen(fd, mode, encoding=encoding) as f:
+            yield f
+            f.flush()
+            os.fsync(f.fileno())
+        _copy_mode(path, tmp_path)
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.unlink(tmp_path)
+        except OSError:
+            pass
+        raise
+    _fsync_directory(directory)
+
+
+def write_bytes_atomic(path: str, data: bytes):
+    with atomic_write(path, 'wb') as f:
+        f.write(data)
+
+
+def _copy_mode(path: str, tmp_path: str):
+    """mkstemp creates 0600 files; keep the target's permissions, or the usual umask default."""
+    try:
+        mode = stat.S_IMODE(os.stat(path).st_mode)
+    except OSError:
+        umask = os.umask(0)
+        os.umask(umask)
+        mode = 0o666 & ~umask
+    os.chmod(tmp_path, mode)
+
+
+def _fsync_directory(directory: str):
+    """Makes the rename itself durable (POSIX only; Windows cannot open directories)."""
+    if os.name != 'posix':
+        return
+    fd = os.open(directory, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
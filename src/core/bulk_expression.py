@@ -0,0 +1,336 @@
+import ast
+import re
+from fractions import Fraction
+from typing import Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from .utils import row_positions
+from .schema import TariffSchema, to_cents
+from .money import ROUND_HALF_UP, affine_cents, euros_to_cents, to_fraction
+
+
+class BulkExpressionError(ValueError):
+    """Raised when a bulk update expression cannot be parsed or applied."""
+
+
+# Clause keywords that may follow the assignment, e.g.
+#   price = price * 1.035 + 0.5 where maxDistance > 200 and minWeight >= 1000 round 2 min 10
+_CLAUSE_RE = re.compile(r'\b(where|round|min)\b', re.IGNORECASE)
+
+_BIN_OPS = {
+    ast.Add: np.add,
+    ast.Sub: np.subtract,
+    ast.Mult: np.multiply,
+    ast.Div: np.divide,
+    ast.FloorDiv: np.floor_divide,
+    ast.Mod: np.mod,
+    ast.Pow: np.power,
+}
+
+_CMP_OPS = {
+    ast.Gt: np.greater,
+    ast.GtE: np.greater_equal,
+    ast.Lt: np.less,
+    ast.LtE: np.less_equal,
+    ast.Eq: np.equal,
+    ast.NotEq: np.not_equal,
+}
+
+
+class BulkExpression:
+    """
+    A parsed bulk update rule of the form
+        <column> = <expression> [where <condition>] [round <digits>] [min <floor>]
+
+    Expressions and conditions may reference any table column and use
+    + - * / // % **, comparisons and and/or/not. They are compiled into
+    NumPy operations over whole columns, so applying a rule is a single
+    masked, vectorized pass over the table.
+    """
+
+    def __init__(self, text: str, columns: List[str]):
+        self.text = text.strip()
+        self.columns = list(columns)
+        self.target = None
+        self.value_tree = None
+        self.where_tree = None
+        self.round_digits = None
+        self.floor = None
+        self._parse()
+
+    def _parse(self):
+        if '=' not in self.text:
+            raise BulkExpressionError("Ausdruck muss die Form '<Spalte> = <Formel>' haben.")
+
+        # Split off the target at the first single '=' (not part of ==, >=, <=, !=)
+        match = re.match(r'^\s*([A-Za-z_][A-Za-z0-9_]*)\s*=(?!=)(.*)$', self.text, re.DOTALL)
+        if not match:
+            raise BulkExpressionError("Zielspalte konnte nicht erkannt werden.")
+        self.target = match.group(1)
+        if self.target not in self.columns:
+            raise BulkExpressionError(f"Unbekannte Zielspalte: '{self.target}'")
+
+        # Split the right hand side into its clauses
+        rest = match.group(2)
+        parts = _CLAUSE_RE.split(rest)
+        value_text = parts[0]
+        clauses = {}
+        for keyword, body in zip(parts[1::2], parts[2::2]):
+            keyword = keyword.lower()
+            if keyword in clauses:
+                raise BulkExpressionError(f"Klausel '{keyword}' ist mehrfach angegeben.")
+            clauses[keyword] = body.strip()
+
+        self.value_tree = self._compile(value_text, "Formel")
+        if 'where' in clauses:
+            self.where_tree = self._compile(clauses['where'], "Bedingung")
+        if 'round' in clauses:
+            try:
+                self.round_digits = int(clauses['round'])
+            except ValueError:
+                raise BulkExpressionError(f"Ungültige Rundung: '{clauses['round']}'")
+        if 'min' in clauses:
+            try:
+                self.floor = float(clauses['min'].replace(',', '.'))
+            except ValueError:
+                raise BulkExpressionError(f"Ungültiger Mindestwert: '{clauses['min']}'")
+
+    def _compile(self, source: str, label: str) -> ast.AST:
+        source = source.strip()
+        if not source:
+            raise BulkExpressionError(f"{label} ist leer.")
+        try:
+            tree = ast.parse(source, mode='eval').body
+        except SyntaxError:
+            raise BulkExpressionError(f"{label} ist ungültig: '{source}'")
+        self._check_node(tree)
+        return tree
+
+    def _check_node(self, node: ast.AST):
+        """Whitelist the AST so only arithmetic on known columns can be evaluated."""
+        if isinstance(node, ast.BinOp) and type(node.op) in _BIN_OPS:
+            self._check_node(node.left)
+            self._check_node(node.right)
+        elif isinstance(node, ast.UnaryOp) and isinstance(node.op, (ast.UAdd, ast.USub, ast.Not)):
+            self._check_node(node.operand)
+        elif isinstance(node, ast.BoolOp):
+            for value in node.values:
+                self._check_node(value)
+        elif isinstance(node, ast.Compare) and all(type(op) in _CMP_OPS for op in node.ops):
+            self._check_node(node.left)
+            for comp in node.comparators:
+                self._check_node(comp)
+        elif isinstance(node, ast.Name):
+            if node.id not in self.columns:
+                raise BulkExpressionError(f"Unbekannte Spalte: '{node.id}'")
+        elif isinstance(node, ast.Constant) and isinstance(node.value, (int, float)) and not isinstance(node.value, bool):
+            pass
+        else:
+            raise BulkExpressionError(f"Nicht unterstützter Ausdruck: '{ast.unparse(node)}'")
+
+    def referenced_columns(self) -> List[str]:
+        names = {self.target}
+        for tree in (self.value_tree, self.where_tree):
+            if tree is not None:
+                names.update(n.id for n in ast.walk(tree) if isinstance(n, ast.Name))
+        return sorted(names)
+
+    def affine_terms(self, node: Optional[ast.AST] = None):
+        """
+        If the formula is target * a + b (any arrangement of constants, + - * / and
+        unary minus), returns the exact (a, b) as Fractions, otherwise None.
+        Such rules can be applied to cents exactly instead of through floats.
+        """
+        node = self.value_tree if node is None else node
+        if isinstance(node, ast.Constant):
+            return Fraction(0), to_fraction(node.value)
+        if isinstance(node, ast.Name):
+            return (Fraction(1), Fraction(0)) if node.id == self.target else None
+        if isinstance(node, ast.UnaryOp) and isinstance(node.op, (ast.USub, ast.UAdd)):
+            terms = self.affine_terms(node.operand)
+            if terms is None or isinstance(node.op, ast.UAdd):
+                return terms
+            return -terms[0], -terms[1]
+        if isinstance(node, ast.BinOp) and isinstance(node.op, (ast.Add, ast.Sub, ast.Mult, ast.Div)):
+            left = self.affine_terms(node.left)
+            right = self.affine_terms(node.right)
+            if left is None or right is None:
+                return None
+            if isinstance(node.op, ast.Add):
+                return left[0] + right[0], left[1] + right[1]
+            if isinstance(node.op, ast.Sub):
+                return left[0] - right[0], left[1] - right[1]
+            if isinstance(node.op, ast.Mult):
+                if left[0] == 0:
+                    return left[1] * right[0], left[1] * right[1]
+                if right[0] == 0:
+                    return left[0] * right[1], left[1] * right[1]
+                return None
+            if right[0] == 0 and right[1] != 0:
+                return left[0] / right[1], left[1] / right[1]
+        return None
+
+    def _evaluate(self, node: ast.AST, arrays: Dict[str, np.ndarray]):
+        if isinstance(node, ast.Constant):
+            return node.value
+        if isinstance(node, ast.Name):
+            return arrays[node.id]
+        if isinstance(node, ast.BinOp):
+            return _BIN_OPS[type(node.op)](self._evaluate(node.left, arrays), self._evaluate(node.right, arrays))
+        if isinstance(node, ast.UnaryOp):
+            operand = self._evaluate(node.operand, arrays)
+            if isinstance(node.op, ast.Not):
+                return np.logical_not(operand)
+            return np.negative(operand) if isinstance(node.op, ast.USub) else operand
+        if isinstance(node, ast.BoolOp):
+            combine = np.logical_and if isinstance(node.op, ast.And) else np.logical_or
+            result = self._evaluate(node.values[0], arrays)
+            for value in node.values[1:]:
+                result = combine(result, self._evaluate(value, arrays))
+            return result
+        if isinstance(node, ast.Compare):
+            # Chained comparisons (a < b < c) expand to (a < b) and (b < c)
+            result = True
+            left = self._evaluate(node.left, arrays)
+            for op, comp in zip(node.ops, node.comparators):
+                right = self._evaluate(comp, arrays)
+                result = np.logical_and(result, _CMP_OPS[type(op)](left, right))
+                left = right
+            return result
+        raise BulkExpressionError(f"Nicht unterstützter Ausdruck: '{ast.unparse(node)}'")
+
+    def evaluate(self, df: pd.DataFrame, rows=None, schema: Optional[TariffSchema] = None,
+                 rounding: str = ROUND_HALF_UP) -> "BulkPreview":
+        """
+        Evaluates the rule against the DataFrame without modifying it.
+        rows optionally restricts the update to a boolean mask or positional row numbers.
+        Columns are evaluated in user units, so money stored as cents is seen in euros.
+        Money results are rounded once, to whole cents or the round step, with the given rounding mode.
+        """
+        n = len(df)
+        schema = schema or TariffSchema(df.columns.tolist())
+        arrays = {}
+        for col in self.referenced_columns():
+            arrays[col] = schema.to_user_units(col, df[col].to_numpy())
+
+        with np.errstate(divide='ignore', invalid='ignore'):
+            values = np.broadcast_to(np.asarray(self._evaluate(self.value_tree, arrays), dtype=np.float64), (n,))
+            if self.where_tree is not None:
+                mask = np.broadcast_to(np.asarray(self._evaluate(self.where_tree, arrays), dtype=bool), (n,)).copy()
+            else:
+                mask = np.ones(n, dtype=bool)
+
+        if rows is not None and len(rows) > 0:
+            selected = np.zeros(n, dtype=bool)
+            selected[row_positions(rows, n)] = True
+            mask &= selected
+
+        # Rows whose result is not a finite number are left untouched
+        mask &= np.isfinite(values)
+
+        old_values = arrays[self.target][mask]
+        if schema.is_money(self.target):
+            stored = self._evaluate_cents(df[self.target].to_numpy()[mask], values[mask], rounding)
+            return BulkPreview(self.target, mask, old_values, stored / 100, schema, stored)
+
+        new_values = values[mask]
+        if self.round_digits is not None:
+            new_values = np.round(new_values, self.round_digits)
+        if self.floor is not None:
+            new_values = np.maximum(new_values, self.floor)
+
+        return BulkPreview(self.target, mask, old_values, new_values, schema)
+
+    @property
+    def cents_step(self) -> int:
+        """Rounding step of a money target in cents: 100 for 'round 0', 10 for 'round 1', else 1."""
+        if self.round_digits is not None and self.round_digits < 2:
+            return 10 ** (2 - self.round_digits)
+        return 1
+
+    def _evaluate_cents(self, cents: np.ndarray, float_values: np.ndarray, rounding: str) -> np.ndarray:
+        """
+        Money target: exact integer arithmetic for affine rules, float evaluation otherwise;
+        either way the result is rounded once, straight to the target step ('round 0' rounds
+        the exact value to whole euros, not the value already rounded to cents).
+        """
+        terms = self.affine_terms()
+        if terms is not None:
+            result = affine_cents(cents, terms[0], terms[1], rounding, self.cents_step)
+        else:
+            result = euros_to_cents(float_values, rounding, self.cents_step)
+        if self.floor is not None:
+            result = np.maximum(result, to_cents([self.floor])[0])
+        return result
+
+
+class BulkPreview:
+    """Result of evaluating a BulkExpression: which rows change and by how much."""
+
+    def __init__(self, column: str, mask: np.ndarray, old_values: np.ndarray, new_values: np.ndarray,
+                 schema: TariffSchema, stored_values: Optional[np.ndarray] = None):
+        self.column = column
+        self.mask = mask
+        self.old_values = old_values # User units (euros for money columns)
+        self.new_values = new_values
+        self.schema = schema
+        self._stored_values = stored_values # Exact storage values (cents) when already known
+
+    @property
+    def stored_values(self) -> np.ndarray:
+        """New values converted to the column's storage dtype (e.g. int64 cents)."""
+        if self._stored_values is not None:
+            return self._stored_values
+        return self.schema.coerce_column(self.column, self.new_values)
+
+    @property
+    def affected_rows(self) -> int:
+        return int(self.mask.sum())
+
+    @property
+    def deltas(self) -> np.ndarray:
+        return self.new_values - np.nan_to_num(self.old_values)
+
+    def histogram(self, bins: int = 10):
+        """Returns (counts, edges) of the per-row change."""
+        deltas = self.deltas
+        if deltas.size == 0:
+            return np.zeros(0, dtype=np.int64), np.zeros(0)
+        return np.histogram(deltas, bins=bins)
+
+    def summary_lines(self, bins: int = 10, width: int = 30) -> List[str]:
+        """Plain text report shared by the bulk update dialog and the CLI."""
+        lines = [f"Spalte: {self.column}", f"Betroffene Zeilen: {self.affected_rows}"]
+        if self.affected_rows == 0:
+            return lines
+
+        deltas = self.deltas
+        lines.append(f"Summe Änderung: {deltas.sum():+.2f}")
+        lines.append(f"Min / Max Änderung: {deltas.min():+.2f} / {deltas.max():+.2f}")
+
+        counts, edges = self.histogram(bins)
+        peak = max(int(counts.max()), 1)
+        for count, lo, hi in zip(counts, edges[:-1], edges[1:]):
+            bar = '#' * int(round(width * count / peak))
+            lines.append(f"{lo:+10.2f} .. {hi:+10.2f} | {bar} {count}")
+        return lines
+
+    def apply(self, df: pd.DataFrame) -> pd.DataFrame:
+        """Writes the new values into the DataFrame in one masked assignment."""
+        if self.affected_rows == 0:
+            return df
+        stored = self.stored_values
+        values = df[self.column].to_numpy()
+        if values.dtype == object or values.dtype.kind not in 'biuf':
+            values = self.schema.coerce_column(self.column, values)
+        values = values.astype(np.result_type(values.dtype, stored.dtype))
+        values[self.mask] = stored
+        df[self.column] = values
+        return df
+
+
+def compile_bulk_expression(text: str, columns: List[str]) -> BulkExpression:
+    """Parses and validates a bulk update rule against the given columns."""
+    return BulkExpression(text, columns)
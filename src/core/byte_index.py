@@ -0,0 +1,279 @@
+import xml.parsers.expat
+import xml.etree.ElementTree as ET
+from xml.sax.saxutils import escape
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+# Key of a leaf element outside the parameter tuples: ((tag, n-th sibling with that tag), ...) from the root
+LeafKey = Tuple[Tuple[str, int], ...]
+
+
+class ByteIndex:
+    """
+    Byte offsets of the editable parts of a comtec XML file, recorded in one expat pass.
+
+    For the parameter_tuples container of the first tariff_item it records where every
+    parameter_tuple starts and ends (including the whitespace in front of it) and the
+    span of every <value> text per parameter code. For all other leaf elements (names,
+    dates, ids) it records the text span and the original text. With these offsets a
+    save can copy the original bytes and splice in only what was edited.
+    """
+
+    def __init__(self, raw: bytes):
+        self.raw = raw
+        self.encoding = 'utf-8'
+        self.container_span = None # (end of <parameter_tuples> tag, start of </parameter_tuples>)
+        self.tuple_lead: List[int] = []  # Start of the whitespace run before each tuple
+        self.tuple_start: List[int] = []
+        self.tuple_end: List[int] = []
+        self.values: Dict[str, List[Tuple[int, int, bool]]] = {} # code -> per tuple (start, end, empty tag)
+        self.leaves: Dict[LeafKey, Tuple[int, int, str, bool]] = {} # key -> (start, end, text, empty tag)
+        self._parse()
+
+    # --- Indexing pass ---
+
+    def _tag_end(self, pos: int) -> int:
+        return self.raw.index(b'>', pos) + 1
+
+    def _parse(self):
+        raw = self.raw
+        parser = xml.parsers.expat.ParserCreate()
+        parser.buffer_text = True
+
+        path: List[Tuple[str, int]] = []
+        sibling_counts: List[Dict[str, int]] = [{}]
+        open_ends: List[int] = []
+        tag_starts: List[int] = []
+        has_children: List[bool] = []
+        text: List[List[str]] = []
+
+        state = {'container_depth': None, 'done': False, 'tuple': -1, 'code': None, 'value': None}
+
+        def decl(version, encoding, standalone):
+            if encoding:
+                self.encoding = encoding
+
+        def start(name, attrs):
+            pos = parser.CurrentByteIndex
+            counts = sibling_counts[-1]
+            n = counts.get(name, 0)
+            counts[name] = n + 1
+            if has_children:
+                has_children[-1] = True
+            path.append((name, n))
+            sibling_counts.append({})
+            open_ends.append(self._tag_end(pos))
+            tag_starts.append(pos)
+            has_children.append(False)
+            text.append([])
+
+            depth = len(path)
+            cdepth = state['container_depth']
+            if cdepth is None and not state['done'] and name == 'parameter_tuples' \
+                    and len(path) >= 2 and path[-2][0] == 'tariff_item':
+                state['container_depth'] = depth
+                self._container_start = open_ends[-1]
+            elif cdepth is not None and depth == cdepth + 1 and name == 'parameter_tuple':
+                state['tuple'] += 1
+                chunk = raw[max(0, pos - 256):pos]
+                self.tuple_lead.append(pos - (len(chunk) - len(chunk.rstrip())))
+                self.tuple_start.append(pos)
+                state['code'] = None
+                state['value'] = None
+
+        def chars(data):
+            if text:
+                text[-1].append(data)
+
+        def end(name):
+            pos = parser.CurrentByteIndex
+            content_start = open_ends.pop()
+            tag_start = tag_starts.pop()
+            content = "".join(text.pop())
+            children = has_children.pop()
+            key = tuple(path)
+            path.pop()
+            sibling_counts.pop()
+
+            empty = raw[pos - 2:pos] == b'/>' and content_start == pos
+            element_end = pos if empty else self._tag_end(pos)
+            depth = len(key)
+            cdepth = state['container_depth']
+
+            if cdepth is not None and depth > cdepth:
+                # Inside the tuples container
+                if name == 'code' and depth == cdepth + 3:
+                    state['code'] = content
+                elif name == 'value' and depth == cdepth + 3:
+                    state['value'] = (tag_start, element_end, True) if empty else (content_start, pos, False)
+                elif name == 'parameter' and depth == cdepth + 2:
+                    if state['code'] is not None and state['value'] is not None:
+                        spans = self.values.setdefault(state['code'], [])
+                        spans.extend([None] * (state['tuple'] + 1 - len(spans)))
+                        spans[state['tuple']] = state['value']
+                    state['code'] = None
+                    state['value'] = None
+                elif name == 'parameter_tuple' and depth == cdepth + 1:
+                    self.tuple_end.append(element_end)
+                return
+
+            if cdepth is not None and depth == cdepth:
+                self.container_span = (self._container_start, pos)
+                state['container_depth'] = None
+                state['done'] = True
+                return
+
+            if not children:
+                self.leaves[key] = (tag_start, element_end, content, True) if empty \
+                    else (content_start, pos, content, False)
+
+        parser.XmlDeclHandler = decl
+        parser.StartElementHandler = start
+        parser.EndElementHandler = end
+        parser.CharacterDataHandler = chars
+        parser.Parse(raw, True)
+
+        n = len(self.tuple_start)
+        for spans in self.values.values():
+            spans.extend([None] * (n - len(spans)))
+
+    # --- Queries ---
+
+    def __len__(self):
+        return len(self.tuple_start)
+
+    def tuple_bytes(self, t: int) -> bytes:
+        return self.raw[self.tuple_start[t]:self.tuple_end[t]]
+
+    def lead_bytes(self, t: int) -> bytes:
+        return self.raw[self.tuple_lead[t]:self.tuple_start[t]]
+
+    def encode_text(self, text: str) -> bytes:
+        return escape(text).encode(self.encoding, 'xmlcharrefreplace')
+
+    def fill_empty(self, start: int, end: int, tag: str, text: bytes) -> bytes:
+        """Replacement for an empty element <tag .../> that now gets text: <tag ...>text</tag>."""
+        return self.raw[start:end - 2].rstrip() + b'>' + text + f"</{tag}>".encode(self.encoding)
+
+
+def leaf_text_edits(index: ByteIndex, root: ET.Element) -> List[Tuple[int, int, bytes]]:
+    """Splices for leaf elements outside the tuples whose text in the tree differs from the file."""
+    edits = []
+
+    def walk(elem, key):
+        if elem.tag == 'parameter_tuples':
+            return
+        children = list(elem)
+        if not children:
+            leaf = index.leaves.get(key)
+            if leaf is None:
+                return
+            start, end, original, empty = leaf
+            current = elem.text or ""
+            if current != original:
+                text = index.encode_text(current)
+                edits.append((start, end, index.fill_empty(start, end, elem.tag, text) if empty else text))
+            return
+        counts = {}
+        for child in children:
+            if not isinstance(child.tag, str):
+                continue # Comments / processing instructions
+            n = counts.get(child.tag, 0)
+            counts[child.tag] = n + 1
+            walk(child, key + ((child.tag, n),))
+
+    walk(root, ((root.tag, 0),))
+    return edits
+
+
+def value_bytes(index: ByteIndex, span: Tuple[int, int, bool], text: bytes) -> Tuple[int, int, bytes]:
+    """Splice for one <value>: replaces the text, or expands an empty <value/> tag."""
+    start, end, empty = span
+    if empty:
+        return start, end, index.fill_empty(start, end, 'value', text)
+    return start, end, text
+
+
+def splice(raw: bytes, edits: List[Tuple[int, int, bytes]]) -> bytes:
+    """Applies non-overlapping (start, end, replacement) edits; work is proportional to len(edits)."""
+    parts = []
+    pos = 0
+    for start, end, data in sorted(edits, key=lambda e: (e[0], e[1])):
+        parts.append(raw[pos:start])
+        parts.append(data)
+        pos = end
+    parts.append(raw[pos:])
+    return b"".join(parts)
+
+
+def render_tuples(index: ByteIndex, origins: np.ndarray, cell_texts: Dict[str, Dict[int, bytes]],
+                  new_rows: Dict[int, Dict[str, bytes]], template: int) -> List[Tuple[int, int, bytes]]:
+    """
+    Edits that turn the indexed tuples into the current table.
+
+    origins[i] is the tuple row i came from (-1 for new rows). cell_texts[code][row] holds the
+    new text of edited cells of original rows, new_rows[row][code] the texts of added rows,
+    which are rendered from tuple `template`. If the kept rows are still in file order, only
+    edited values, deleted tuples and insertions are spliced. Otherwise the tuple region is
+    reassembled from the original tuple bytes in the new order.
+    """
+    origins = np.asarray(origins, dtype=np.int64)
+    kept_rows = np.flatnonzero(origins >= 0)
+    kept = origins[kept_rows]
+
+    def value_edits():
+        """(tuple, edit) for every edited cell of an original row."""
+        out = []
+        for code, texts in cell_texts.items():
+            spans = index.values.get(code)
+            if spans is None:
+                continue
+            for row, text in texts.items():
+                o = int(origins[row])
+                if spans[o] is not None:
+                    out.append((o, value_bytes(index, spans[o], text)))
+        return out
+
+    def new_tuple(row):
+        base = index.tuple_start[template]
+        local = []
+        for code, text in new_rows[row].items():
+            spans = index.values.get(code)
+            if spans is not None and spans[template] is not None:
+                s, e, data = value_bytes(index, spans[template], text)
+                local.append((s - base, e - base, data))
+        return index.lead_bytes(template) + splice(index.tuple_bytes(template), local)
+
+    if kept.size < 2 or bool(np.all(np.diff(kept) > 0)):
+        edits = [edit for _, edit in value_edits()]
+
+        # Tuples without a row left in the table are cut out together with their leading whitespace
+        present = np.zeros(len(index), dtype=bool)
+        present[kept] = True
+        for t in np.flatnonzero(~present).tolist():
+            edits.append((index.tuple_lead[t], index.tuple_end[t], b''))
+
+        # New rows go in front of the next kept tuple, or after the last tuple
+        added = np.flatnonzero(origins < 0)
+        if added.size:
+            slot = np.searchsorted(kept_rows, added)
+            for group in np.split(np.arange(added.size), np.flatnonzero(np.diff(slot)) + 1):
+                k = slot[group[0]]
+                pos = index.tuple_lead[kept[k]] if k < kept.size else index.tuple_end[-1]
+                edits.append((pos, pos, b"".join(new_tuple(int(r)) for r in added[group])))
+        return edits
+
+    # Rows were reordered: rebuild the tuple region from the original tuple bytes
+    by_tuple = {}
+    for o, edit in value_edits():
+        by_tuple.setdefault(o, []).append(edit)
+    body = []
+    for row, o in enumerate(origins.tolist()):
+        if o < 0:
+            body.append(new_tuple(row))
+            continue
+        base = index.tuple_start[o]
+        local = [(s - base, e - base, d) for s, e, d in by_tuple.get(o, [])]
+        body.append(index.lead_bytes(o) + splice(index.tuple_bytes(o), local))
+    return [(index.tuple_lead[0], index.tuple_end[-1], b"".join(body))]
@@ -0,0 +1,245 @@
+import numpy as np
+import pandas as pd
+from typing import Dict, List, Mapping, Optional, Union
+
+from .schema import fits_float32
+
+
+def _fits(values: np.ndarray, dtype: np.dtype) -> bool:
+    """True if numeric values can be stored in dtype without changing them."""
+    if values.size == 0 or dtype == np.float64:
+        return True
+    if dtype.kind in 'iu':
+        if values.dtype.kind == 'f' and not (np.isfinite(values).all() and np.array_equal(values, np.round(values))):
+            return False
+        info = np.iinfo(dtype)
+        return bool(values.min() >= info.min and values.max() <= info.max)
+    if dtype == np.float32:
+        return fits_float32(values)
+    return False
+
+
+class ColumnBuffer:
+    """
+    Growable columnar table: one NumPy array per column with spare capacity
+    and a logical length. Appends grow the capacity geometrically, so adding
+    rows one at a time is O(1) amortized instead of copying the whole table.
+    A pandas DataFrame is only materialized (and cached) when asked for.
+    Every row also carries its origin: the row number it had in the source file,
+    or -1 for rows added later. Deletes and reorders move origins with their rows.
+    """
+
+    GROWTH_FACTOR = 1.5
+    MIN_CAPACITY = 16
+
+    def __init__(self, columns: List[str], dtypes: Optional[Dict[str, np.dtype]] = None, capacity: int = 0):
+        self._columns = list(columns)
+        dtypes = dtypes or {}
+        capacity = max(capacity, self.MIN_CAPACITY)
+        self._arrays = {col: np.empty(capacity, dtype=dtypes.get(col, object)) for col in self._columns}
+        self._origins = np.full(capacity, -1, dtype=np.int64)
+        self._capacity = capacity
+        self._length = 0
+        self._frame = None # Cached DataFrame, dropped on every mutation
+
+    @classmethod
+    def from_frame(cls, df: pd.DataFrame, origins: Optional[np.ndarray] = None) -> "ColumnBuffer":
+        buf = cls(df.columns.tolist(), capacity=len(df))
+        if origins is not None:
+            buf._origins[:len(df)] = origins
+        for col in buf._columns:
+            values = _to_numpy(df[col])
+            arr = np.empty(buf._capacity, dtype=values.dtype)
+            arr[:len(df)] = values
+            buf._arrays[col] = arr
+        buf._length = len(df)
+        return buf
+
+    # --- Shape ---
+
+    def __len__(self):
+        return self._length
+
+    @property
+    def columns(self) -> List[str]:
+        return list(self._columns)
+
+    @property
+    def capacity(self) -> int:
+        return self._capacity
+
+    def dtype(self, column: str) -> np.dtype:
+        return self._arrays[column].dtype
+
+    # --- Read access ---
+
+    def column(self, column: str) -> np.ndarray:
+        """Read-only view of the logical part of a column."""
+        view = self._arrays[column][:self._length]
+        view.flags.writeable = False
+        return view
+
+    def origins(self) -> np.ndarray:
+        """Read-only view of the source row number of every row (-1 for added rows)."""
+        view = self._origins[:self._length]
+        view.flags.writeable = False
+        return view
+
+    def value(self, row: int, col_idx: int):
+        return self._arrays[self._columns[col_idx]][row]
+
+    def argsort(self, columns: List[str], ascending: Optional[List[bool]] = None) -> np.ndarray:
+        """
+        Stable permutation that sorts the rows by columns (first column = primary key),
+        computed with one np.lexsort over the column arrays. Missing values sort last
+        ascending and first descending.
+        """
+        ascending = [True] * len(columns) if ascending is None else list(ascending)
+        keys = []
+        for col, asc in zip(columns, ascending):
+            values = self._arrays[col][:self._length]
+            if values.dtype == object:
+                codes, _ = pd.factorize(values, sort=True, use_na_sentinel=False)
+                key = codes
+            elif asc:
+                key = values
+            else:
+                key = np.unique(values, return_inverse=True)[1]
+            keys.append(key if asc else -key)
+        # np.lexsort treats the last key as the primary one
+        return np.lexsort(keys[::-1]) if keys else np.arange(self._length)
+
+    def to_frame(self) -> pd.DataFrame:
+        """
+        Materializes the buffer as a DataFrame (cached until the next mutation).
+        Callers get a shallow copy, so assigning to it never changes the cached frame.
+        """
+        if self._frame is None:
+            self._frame = pd.DataFrame({col: self._arrays[col][:self._length].copy() for col in self._columns},
+                                       columns=self._columns)
+        return self._frame.copy(deep=False)
+
+    # --- Mutation ---
+
+    def _reserve(self, needed: int):
+        if needed <= self._capacity:
+            return
+        new_capacity = max(needed, int(self._capacity * self.GROWTH_FACTOR) + 1, self.MIN_CAPACITY)
+        for col in self._columns:
+            arr = np.empty(new_capacity, dtype=self._arrays[col].dtype)
+            arr[:self._length] = self._arrays[col][:self._length]
+            self._arrays[col] = arr
+        origins = np.full(new_capacity, -1, dtype=np.int64)
+        origins[:self._length] = self._origins[:self._length]
+        self._origins = origins
+        self._capacity = new_capacity
+
+    def _fit_dtype(self, column: str, values: np.ndarray):
+        """
+        Promotes a column's storage dtype if the incoming values would not fit losslessly.
+        Values that do fit keep the compact type (an edited float32 bound or int8 id stays
+        float32 / int8, although edits usually arrive as float64 or int64).
+        """
+        arr = self._arrays[column]
+        if arr.dtype == values.dtype or arr.dtype == object:
+            return
+        if arr.dtype.kind in 'biuf' and values.dtype.kind in 'biuf':
+            if _fits(values, arr.dtype):
+                return
+            if arr.dtype.kind in 'iu' and values.dtype.kind == 'f':
+                target = np.float64
+            else:
+                target = np.result_type(arr.dtype, values.dtype)
+        else:
+            target = object
+        if target != arr.dtype:
+            self._arrays[column] = arr.astype(target)
+
+    def append(self, rows: Union[pd.DataFrame, Mapping[str, object]]) -> int:
+        """
+        Appends rows given as a DataFrame or a mapping of column -> sequence.
+        Missing columns are filled with NaN/None. Returns the number of rows added.
+        """
+        if isinstance(rows, pd.DataFrame):
+            data = {col: _to_numpy(rows[col]) for col in rows.columns}
+            count = len(rows)
+        else:
+            data = {col: np.asarray(values) for col, values in rows.items()}
+            count = len(next(iter(data.values()))) if data else 0
+        if count == 0:
+            return 0
+
+        start = self._length
+        self._reserve(start + count)
+        for col in self._columns:
+            if col in data:
+                values = data[col]
+                self._fit_dtype(col, values)
+                self._arrays[col][start:start + count] = values
+            else:
+                arr = self._arrays[col]
+                if arr.dtype.kind in 'iu':
+                    self._arrays[col] = arr = arr.astype(np.float64)
+                arr[start:start + count] = np.nan if arr.dtype.kind == 'f' else None
+        self._origins[start:start + count] = -1
+        self._length += count
+        self._frame = None
+        return count
+
+    def delete(self, mask: np.ndarray):
+        """Removes rows where mask is True, compacting each column in place in one pass."""
+        keep = np.flatnonzero(~np.asarray(mask, dtype=bool)[:self._length])
+        for col in self._columns:
+            arr = self._arrays[col]
+            arr[:keep.size] = arr[keep]
+            if arr.dtype == object:
+                arr[keep.size:self._length] = None # Release references
+        self._origins[:keep.size] = self._origins[keep]
+        self._length = keep.size
+        self._frame = None
+
+    def delete_range(self, start: int, end: int):
+        """Removes the contiguous rows start..end (inclusive), moving the rows below them up."""
+        count = end - start + 1
+        tail = slice(end + 1, self._length)
+        for col in self._columns:
+            arr = self._arrays[col]
+            arr[start:self._length - count] = arr[tail]
+            if arr.dtype == object:
+                arr[self._length - count:self._length] = None # Release references
+        self._origins[start:self._length - count] = self._origins[tail]
+        self._length -= count
+        self._frame = None
+
+    def permute(self, order: np.ndarray):
+        """Reorders the rows so that new row i is old row order[i]; origins move with them."""
+        order = np.asarray(order, dtype=np.int64)
+        for col in self._columns:
+            arr = self._arrays[col]
+            arr[:self._length] = arr[order]
+        self._origins[:self._length] = self._origins[order]
+        self._frame = None
+
+    def set_column(self, column: str, values):
+        values = np.asarray(values)
+        if values.ndim == 0:
+            values = np.full(self._length, values.item())
+        self._fit_dtype(column, values)
+        self._arrays[column][:self._length] = values
+        self._frame = None
+
+    def set_cells(self, column: str, rows: np.ndarray, values):
+        values = np.asarray(values)
+        self._fit_dtype(column, values.reshape(-1))
+        self._arrays[column][np.asarray(rows, dtype=np.int64)] = values
+        self._frame = None
+
+
+def _to_numpy(series: pd.Series) -> np.ndarray:
+    """Converts a Series to a NumPy array, keeping text columns as plain Python objects."""
+    if pd.api.types.is_numeric_dtype(series) or pd.api.types.is_bool_dtype(series):
+        try:
+            return series.to_numpy()
+        except (TypeError, ValueError):
+            pass
+    return series.to_numpy(dtype=object)
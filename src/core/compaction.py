@@ -0,0 +1,130 @@
+import numpy as np
+import pandas as pd
+from typing import List, Optional
+
+from .generator import quantity_column
+from .rating import BracketRater
+
+
+class CompactionResult:
+    """Compacted table plus, per compacted row, the original row it was merged from first."""
+
+    def __init__(self, frame: pd.DataFrame, keep: np.ndarray, original_rows: int):
+        self.frame = frame
+        self.keep = keep
+        self.original_rows = original_rows
+
+    @property
+    def merged(self) -> int:
+        """Number of rows removed by merging."""
+        return self.original_rows - len(self.frame)
+
+    def summary(self) -> str:
+        return f"{self.original_rows} Zeilen zu {len(self.frame)} zusammengefasst ({self.merged} entfernt)."
+
+
+def _codes(values: np.ndarray) -> np.ndarray:
+    codes, _ = pd.factorize(values, use_na_sentinel=False)
+    return codes
+
+
+def _merge_runs(df: pd.DataFrame, lo_col: str, hi_col: str):
+    """
+    One axis: rows that agree in every column except lo_col/hi_col and whose brackets
+    touch (hi of one == lo of the next) are merged into one bracket. Sorting by all other
+    columns and then lo makes each mergeable run contiguous; runs start wherever a key
+    changes or the brackets do not touch. Returns (first row of each run, merged hi).
+    """
+    others = [c for c in df.columns if c not in (lo_col, hi_col)]
+    lo = df[lo_col].to_numpy()
+    hi = df[hi_col].to_numpy()
+    keys = [_codes(df[c].to_numpy()) for c in others]
+    order = np.lexsort([lo] + keys[::-1]) # Last key is the primary one
+
+    start = np.ones(order.size, dtype=bool)
+    if order.size > 1:
+        same = np.ones(order.size - 1, dtype=bool)
+        for key in keys:
+            k = key[order]
+            same &= k[1:] == k[:-1]
+        start[1:] = ~(same & (lo[order][1:] == hi[order][:-1]))
+    first = np.flatnonzero(start)
+    last = np.append(first[1:] - 1, order.size - 1)
+    return order[first], hi[order][last]
+
+
+def compact_brackets(df: pd.DataFrame, axis: str = 'both', distance_column: str = 'maxDistance',
+                     quantity_col: Optional[str] = None) -> CompactionResult:
+    """
+    Merges neighbouring brackets with identical price, rate, ids and every other value:
+    along the quantity axis (weight/volume brackets of one distance bracket), then along
+    the distance axis (brackets with the same quantity range), or only one of them
+    (axis = 'quantity' / 'distance'). The compacted rows keep the order of the first
+    original row of their run. Pricing is unchanged as long as the brackets do not
+    overlap; verify_compaction() checks it.
+    """
+    quantity_col = quantity_col or quantity_column(df.columns.tolist(), distance_column)
+    passes = {'quantity': [quantity_col], 'distance': [distance_column],
+              'both': [quantity_col, distance_column]}.get(axis)
+    if passes is None:
+        raise ValueError(f"Unbekannte Achse: {axis}")
+    for hi_col in passes:
+        lo_col = 'min' + (hi_col or '')[3:]
+        if hi_col not in df.columns or lo_col not in df.columns:
+            raise ValueError(f"Zum Zusammenfassen werden die Spalten '{lo_col}' und '{hi_col}' benötigt.")
+
+    keep = np.arange(len(df))
+    frame = df.reset_index(drop=True)
+    for hi_col in passes:
+        first, hi = _merge_runs(frame, 'min' + hi_col[3:], hi_col)
+        order = np.argsort(keep[first], kind='stable') # Back to table order
+        first, hi = first[order], hi[order]
+        frame = frame.iloc[first].reset_index(drop=True)
+        frame[hi_col] = hi
+        keep = keep[first]
+    return CompactionResult(frame, keep, len(df))
+
+
+def _probes(keys: np.ndarray) -> np.ndarray:
+    """Every key, the midpoint of every interval between keys and points below/above all keys."""
+    if keys.size == 0:
+        return np.zeros(1)
+    mids = (keys[1:] + keys[:-1]) / 2
+    return np.concatenate(([keys[0] - 1], keys, mids, [keys[-1] + 1]))
+
+
+def verify_compaction(original: pd.DataFrame, compacted: pd.DataFrame, distance_column: str = 'maxDistance',
+                      quantity_col: Optional[str] = None, value_columns: Optional[List[str]] = None) -> int:
+    """
+    Number of probe shipments the two tables price differently (0 = identical pricing).
+    Both tables are constant between the bounds of the original, so probing every bound
+    and every midpoint between neighbouring bounds, on both axes and per order kind,
+    covers every case. A probe matches when both tables leave it unrated or the rows
+    they pick agree in every value column (all columns except the bracket bounds).
+    """
+    before = BracketRater(original, distance_column, quantity_col)
+    after = BracketRater(compacted, distance_column, before.quantity_column)
+    bounds = {distance_column, 'min' + distance_column[3:], before.quantity_column,
+              'min' + before.quantity_column[3:]}
+    value_columns = value_columns or [c for c in original.columns if c not in bounds]
+
+    mismatches = 0
+    for kind in before.order_kinds or [None]:
+        d_keys, q_keys = before.bracket_keys(kind)
+        d, q = np.meshgrid(_probes(d_keys), _probes(q_keys), indexing='ij')
+        d, q = d.reshape(-1), q.reshape(-1)
+        rows_before = before.lookup(d, q, kind)
+        rows_after = after.lookup(d, q, kind)
+        same = (rows_before >= 0) == (rows_after >= 0)
+        both = np.flatnonzero(same & (rows_before >= 0))
+        for col in value_columns:
+            a = original[col].to_numpy()[rows_before[both]]
+            b = compacted[col].to_numpy()[rows_after[both]]
+            equal = a == b
+            if a.dtype.kind == 'f' and b.dtype.kind == 'f':
+                equal |= np.isnan(a) & np.isnan(b)
+            same[both[~equal]] = False
+        mismatches += int(np.count_nonzero(~same))
+    # An order kind only the compacted table prices is a change as well
+    mismatches += len(set(after.order_kinds) - set(before.order_kinds))
+    return mismatches
@@ -0,0 +1,128 @@
+import gzip
+import io
+import os
+import re
+from contextlib import contextmanager
+from typing import Optional
+
+from .atomic_io import atomic_write
+
+# Default levels: gzip 6 and zstd 3 are the usual speed/size compromises of both tools
+DEFAULT_LEVELS = {'gzip': 6, 'zstd': 3}
+LEVEL_RANGES = {'gzip': (1, 9), 'zstd': (1, 22)}
+TARIFF_SUFFIXES = ('.xml', '.xml.gz', '.xml.zst')
+# File dialog filter for saving tariffs; the chosen suffix selects the compression
+XML_SAVE_FILTER = "XML Files (*.xml);;XML gzip (*.xml.gz);;XML zstd (*.xml.zst)"
+
+_GZIP_MAGIC = b'\x1f\x8b'
+_ZSTD_MAGIC = b'\x28\xb5\x2f\xfd'
+_READ_BLOCK = 1 << 20
+
+
+def compression_of(path: str) -> Optional[str]:
+    """'gzip' or 'zstd' for a .gz / .zst file name, None for plain files."""
+    lower = path.lower()
+    if lower.endswith('.gz'):
+        return 'gzip'
+    if lower.endswith('.zst'):
+        return 'zstd'
+    return None
+
+
+def check_level(path: str, level: Optional[int]):
+    """Raises ValueError if level is not a valid compression level for path's format."""
+    compression = compression_of(path)
+    if compression is None or level is None:
+        return
+    low, high = LEVEL_RANGES[compression]
+    if not low <= level <= high:
+        raise ValueError(f"Kompressionsstufe {level} ist für {compression} ungültig (erlaubt {low}-{high}).")
+
+
+def with_filter_suffix(path: str, selected_filter: str) -> str:
+    """
+    path with the suffix of the file dialog filter the user picked (see XML_SAVE_FILTER),
+    so choosing "XML gzip" for the proposed "name.xml" saves "name.xml.gz". A .gz or
+    .zst suffix the user typed is kept.
+    """
+    match = re.search(r'\(\*(\.[^)\s]+)\)', selected_filter or "")
+    if match is None or compression_of(path) is not None:
+        return path
+    suffix = match.group(1)
+    if path.lower().endswith(suffix):
+        return path
+    if path.lower().endswith('.xml'):
+        path = path[:-len('.xml')]
+    return path + suffix
+
+
+def is_tariff_file(path: str) -> bool:
+    return path.lower().endswith(TARIFF_SUFFIXES)
+
+
+def tariff_stem(path: str) -> str:
+    """File name without directory, compression suffix and .xml."""
+    name = os.path.basename(path)
+    for suffix in sorted(TARIFF_SUFFIXES, key=len, reverse=True):
+        if name.lower().endswith(suffix):
+            return name[:-len(suffix)]
+    return os.path.splitext(name)[0]
+
+
+def _zstandard():
+    try:
+        import zstandard
+    except ImportError:
+        raise RuntimeError("Für .zst-Dateien wird das Paket 'zstandard' benötigt.")
+    return zstandard
+
+
+def read_bytes(path: str) -> bytes:
+    """
+    Contents of a plain, gzip or zstd file, decompressed as a stream straight into memory
+    (no temporary decompressed copy). The format is taken from the first bytes, so a
+    compressed file is read correctly whatever its name.
+    """
+    with open(path, 'rb') as f:
+        magic = f.read(4)
+        f.seek(0)
+        if magic.startswith(_GZIP_MAGIC):
+            with gzip.GzipFile(fileobj=f, mode='rb') as stream:
+                return stream.read()
+        if magic == _ZSTD_MAGIC:
+            reader = _zstandard().ZstdDecompressor().stream_reader(f)
+            return b"".join(iter(lambda: reader.read(_READ_BLOCK), b""))
+        return f.read()
+
+
+@contextmanager
+def atomic_write_compressed(path: str, mode: str = 'wb', encoding: str = None, level: Optional[int] = None):
+    """
+    atomic_write that compresses on the fly when path ends in .gz or .zst, with the given
+    level (default: DEFAULT_LEVELS). The compressor writes straight into the temp file, so
+    the uncompressed text never exists on disk. Plain paths behave exactly like atomic_write.
+    """
+    compression = compression_of(path)
+    if compression is None:
+        with atomic_write(path, mode, encoding=encoding) as f:
+            yield f
+        return
+    check_level(path, level)
+    level = DEFAULT_LEVELS[compression] if level is None else level
+    zstandard = _zstandard() if compression == 'zstd' else None # Fail before creating the temp file
+
+    with atomic_write(path, 'wb') as raw:
+        if compression == 'gzip':
+            # mtime=0 keeps the output identical for identical content
+            stream = gzip.GzipFile(filename=tariff_stem(path) + '.xml', mode='wb', fileobj=raw,
+                                   compresslevel=level, mtime=0)
+        else:
+            stream = zstandard.ZstdCompressor(level=level).stream_writer(raw, closefd=False)
+        # Closing the stream (and a text wrapper around it) ends the compressed frame but leaves raw open
+        with (io.TextIOWrapper(stream, encoding=encoding) if 'b' not in mode else stream) as f:
+            yield f
+
+
+def write_bytes_compressed(path: str, data: bytes, level: Optional[int] = None):
+    with atomic_write_compressed(path, 'wb', level=level) as f:
+        f.write(data)
@@ -0,0 +1,211 @@
+import xml.parsers.expat
+from typing import Dict, List, Optional, Tuple
+
+from .byte_index import splice
+from .compressed_io import read_bytes, write_bytes_compressed
+
+
+class TariffItemRef:
+    """Position and header data of one tariff_item inside a comtec document."""
+
+    def __init__(self, tariff: int, item: int):
+        self.tariff = tariff # Index of the resource_tariff
+        self.item = item     # Index of the tariff_item within that tariff
+        self.name = ""
+        self.spec = ""
+        self.start = 0       # Byte span of the <tariff_item> element
+        self.end = 0
+        self.tuple_count = 0
+
+    @property
+    def key(self) -> Tuple[int, int]:
+        return self.tariff, self.item
+
+
+class ResourceTariffRef:
+    """Position and header data of one resource_tariff and its items."""
+
+    def __init__(self, index: int):
+        self.index = index
+        self.id = ""
+        self.name = ""
+        self.start = 0      # Byte span of the <resource_tariff> element
+        self.end = 0
+        self.items: List[TariffItemRef] = []
+
+    @property
+    def head_span(self) -> Tuple[int, int]:
+        """Bytes before the first item: the tariff's own fields and the <tariff_items> tag."""
+        return self.start, self.items[0].start
+
+    @property
+    def tail_span(self) -> Tuple[int, int]:
+        """Bytes after the last item up to the end of the resource_tariff."""
+        return self.items[-1].end, self.end
+
+
+class ComtecDocument:
+    """
+    A comtec file with any number of resource_tariffs, each with any number of tariff_items.
+
+    Opening it runs one expat pass that only records where every tariff and item lives
+    (tuple contents are counted, not stored). An item is materialized on demand as a
+    small standalone comtec document (its tariff's header plus just that item), which
+    TariffEngine.load_bytes can edit like a single-item file. Edited items are put back
+    with replace_item; save() then writes the original bytes with the replaced spans
+    spliced in, so items that were never opened are copied without being parsed again.
+    """
+
+    def __init__(self, raw: bytes, path: Optional[str] = None):
+        self.raw = raw
+        self.path = path
+        self.tariffs: List[ResourceTariffRef] = []
+        self.root_content_start = 0 # End of the <comtec ...> start tag
+        self.root_close_start = 0   # Start of </comtec>
+        self._replaced: Dict[Tuple[int, int], Tuple[bytes, bytes, bytes]] = {} # key -> (head, item, tail)
+        self._index()
+
+    @classmethod
+    def open(cls, path: str) -> "ComtecDocument":
+        return cls(read_bytes(path), path)
+
+    # --- Indexing pass ---
+
+    def _index(self):
+        raw = self.raw
+        parser = xml.parsers.expat.ParserCreate()
+        parser.buffer_text = True
+        parser.buffer_size = 1 << 20
+
+        depth = 0
+        text: List[str] = []
+        current = {'tariff': None, 'item': None}
+
+        def tag_end(pos):
+            return raw.index(b'>', pos) + 1
+
+        def element_end(pos):
+            return pos if raw[pos - 2:pos] == b'/>' else tag_end(pos)
+
+        def start(name, attrs):
+            nonlocal depth
+            depth += 1
+            pos = parser.CurrentByteIndex
+            if depth == 1:
+                self.root_content_start = tag_end(pos)
+            elif depth == 2 and name == 'resource_tariff':
+                tariff = ResourceTariffRef(len(self.tariffs))
+                tariff.start = pos
+                self.tariffs.append(tariff)
+                current['tariff'] = tariff
+            elif depth == 4 and name == 'tariff_item' and current['tariff'] is not None:
+                tariff = current['tariff']
+                item = TariffItemRef(tariff.index, len(tariff.items))
+                item.start = pos
+                tariff.items.append(item)
+                current['item'] = item
+            elif depth == 6 and name == 'parameter_tuple' and current['item'] is not None:
+                current['item'].tuple_count += 1
+            if depth in (3, 5):
+                text.clear()
+
+        def chars(data):
+            if depth in (3, 5):
+                text.append(data)
+
+        def end(name):
+            nonlocal depth
+            pos = parser.CurrentByteIndex
+            tariff, item = current['tariff'], current['item']
+            if depth == 1:
+                self.root_close_start = pos
+            elif depth == 2 and tariff is not None:
+                tariff.end = element_end(pos)
+                current['tariff'] = None
+            elif depth == 3 and tariff is not None and name in ('id', 'name'):
+                setattr(tariff, name, "".join(text).strip())
+            elif depth == 4 and item is not None and name == 'tariff_item':
+                item.end = element_end(pos)
+                current['item'] = None
+            elif depth == 5 and item is not None:
+                if name == 'name':
+                    item.name = "".join(text).strip()
+                elif name == 'tariff_item_spec':
+                    item.spec = "".join(text).strip()
+            depth -= 1
+
+        parser.StartElementHandler = start
+        parser.EndElementHandler = end
+        parser.CharacterDataHandler = chars
+        parser.Parse(raw, True)
+
+        # Tariffs without items cannot be edited here; they are copied through on save
+        self.tariffs = [t for t in self.tariffs if t.items]
+
+    # --- Items ---
+
+    def items(self) -> List[TariffItemRef]:
+        return [item for tariff in self.tariffs for item in tariff.items]
+
+    def __len__(self):
+        return sum(len(t.items) for t in self.tariffs)
+
+    def label(self, item: TariffItemRef) -> str:
+        tariff = self.tariffs[item.tariff]
+        name = item.name or item.spec or f"Position {item.item + 1}"
+        return f"{tariff.name or tariff.id} / {name} ({item.tuple_count} Zeilen)"
+
+    def _parts(self, item: TariffItemRef) -> Tuple[bytes, bytes, bytes]:
+        """(tariff head, item, tariff tail) bytes, including earlier replacements."""
+        if item.key in self._replaced:
+            return self._replaced[item.key]
+        tariff = self.tariffs[item.tariff]
+        # Another item of the same tariff may have changed the shared header already
+        for other in tariff.items:
+            if other.key in self._replaced:
+                head, _, tail = self._replaced[other.key]
+                return head, self.raw[item.start:item.end], tail
+        return (self.raw[slice(*tariff.head_span)], self.raw[item.start:item.end],
+                self.raw[slice(*tariff.tail_span)])
+
+    def item_document(self, item: TariffItemRef) -> bytes:
+        """Standalone comtec document holding the item's tariff header and only this item."""
+        head, body, tail = self._parts(item)
+        return b"".join([self.raw[:self.root_content_start], b"\n", head, body, tail, b"\n",
+                         self.raw[self.root_close_start:]])
+
+    def replace_item(self, item: TariffItemRef, document: bytes):
+        """
+        Takes back an item document produced by item_document (after editing and
+        rendering it) and keeps its tariff header, item and tail for the next save.
+        """
+        edited = ComtecDocument(document)
+        if len(edited.tariffs) != 1 or len(edited.tariffs[0].items) != 1:
+            raise ValueError("Erwartet genau einen Tarif mit einer Position.")
+        tariff = edited.tariffs[0]
+        new_item = tariff.items[0]
+        self._replaced[item.key] = (document[slice(*tariff.head_span)], document[new_item.start:new_item.end],
+                                    document[slice(*tariff.tail_span)])
+        item.tuple_count = new_item.tuple_count
+
+    def is_modified(self) -> bool:
+        return bool(self._replaced)
+
+    # --- Save ---
+
+    def render(self) -> bytes:
+        """The whole document: original bytes with replaced items and tariff headers spliced in."""
+        edits = []
+        for tariff in self.tariffs:
+            replaced = [item for item in tariff.items if item.key in self._replaced]
+            if not replaced:
+                continue
+            head, _, tail = self._replaced[replaced[-1].key]
+            edits.append((*tariff.head_span, head))
+            edits.append((*tariff.tail_span, tail))
+            for item in replaced:
+                edits.append((item.start, item.end, self._replaced[item.key][1]))
+        return splice(self.raw, edits)
+
+    def save(self, output_path: str, level: Optional[int] = None):
+        write_bytes_compressed(output_path, self.render(), level)
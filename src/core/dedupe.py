@@ -0,0 +1,119 @@
+import numpy as np
+import pandas as pd
+from typing import List, Optional
+
+
+def bracket_key_columns(columns: List[str]) -> List[str]:
+    """Columns that identify a bracket: the min*/max* bounds and the order kind."""
+    return [c for c in columns if c.startswith('min') or c.startswith('max') or c == 'id_orderkind']
+
+
+def _equal(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    equal = a == b
+    if a.dtype.kind == 'f':
+        equal |= np.isnan(a) & np.isnan(b)
+    elif a.dtype == object:
+        equal |= pd.isna(a) & pd.isna(b)
+    return np.asarray(equal, dtype=bool)
+
+
+def _groups(df: pd.DataFrame, columns: List[str]) -> np.ndarray:
+    """
+    Group id per row for equal values in columns, or -1 for a row that is alone in its
+    group. Rows are grouped by a 64-bit hash of their values (pd.util.hash_pandas_object,
+    then pd.factorize, both hash based and linear); every row is then compared with the
+    first row of its group, so a hash collision never merges different rows.
+    """
+    n = len(df)
+    if n == 0 or not columns:
+        return np.full(n, -1, dtype=np.int64)
+    hashes = pd.util.hash_pandas_object(df[columns], index=False).to_numpy()
+    codes, uniques = pd.factorize(hashes)
+    first = np.full(len(uniques), n, dtype=np.int64)
+    np.minimum.at(first, codes, np.arange(n))
+    leader = first[codes]
+    same = np.ones(n, dtype=bool)
+    for col in columns:
+        values = df[col].to_numpy()
+        same &= _equal(values, values[leader])
+    # Collided rows (same hash, different values) become groups of their own
+    groups = np.where(same, leader, np.arange(n))
+    sizes = np.bincount(groups, minlength=n)
+    return np.where(sizes[groups] > 1, groups, -1)
+
+
+class DuplicateReport:
+    """
+    Result of find_duplicates. Positions are row numbers of the table:
+    exact      rows equal in every column to an earlier row
+    conflicts  rows that share their bracket key with an earlier row but differ in a value
+               (e.g. the same bracket with another price), excluding exact duplicates
+    Key groups are identified by the position of their first row.
+    """
+
+    def __init__(self, key_columns: List[str], key_group: np.ndarray, row_group: np.ndarray):
+        self.key_columns = key_columns
+        self.key_group = key_group # First row of the bracket key group, -1 if the key is unique
+        self.row_group = row_group # First row of the identical-row group, -1 if the row is unique
+        positions = np.arange(key_group.size)
+        self.exact = np.flatnonzero((row_group >= 0) & (row_group != positions))
+        later = (key_group >= 0) & (key_group != positions)
+        self.conflicts = np.flatnonzero(later & ~((row_group >= 0) & (row_group != positions)))
+        # Key groups holding more than one distinct row
+        distinct = (key_group >= 0) & ((row_group < 0) | (row_group == positions))
+        variants = np.bincount(key_group[distinct], minlength=key_group.size)
+        self.conflict_groups = int(np.count_nonzero(variants > 1))
+
+    @property
+    def is_clean(self) -> bool:
+        return self.exact.size == 0 and self.conflicts.size == 0
+
+    def conflict_rows(self) -> np.ndarray:
+        """Every row of a key group with conflicting values, including the first one."""
+        groups = np.unique(self.key_group[self.conflicts])
+        return np.flatnonzero(np.isin(self.key_group, groups))
+
+    def removal_mask(self, conflicts: Optional[str] = None) -> np.ndarray:
+        """
+        Rows to delete: exact duplicates (the first occurrence stays) and, with
+        conflicts = 'first' or 'last', every row of a conflicting key group but the
+        first or the last one. conflicts = None leaves conflicting rows in place.
+        """
+        n = self.key_group.size
+        if conflicts is None:
+            mask = np.zeros(n, dtype=bool)
+            mask[self.exact] = True
+            return mask
+        if conflicts not in ('first', 'last'):
+            raise ValueError(f"Unbekannte Auflösung für Konflikte: {conflicts}")
+        # Exact duplicates share their key, so keeping one row per key removes them too
+        in_group = self.key_group >= 0
+        if conflicts == 'first':
+            return in_group & (self.key_group != np.arange(n))
+        last = np.full(n, -1, dtype=np.int64)
+        np.maximum.at(last, self.key_group[in_group], np.flatnonzero(in_group))
+        return in_group & (last[np.maximum(self.key_group, 0)] != np.arange(n))
+
+    def summary_lines(self, limit: int = 10, table: Optional[pd.DataFrame] = None) -> List[str]:
+        """Plain text report shared by the duplicates dialog and the CLI."""
+        lines = [f"Schlüsselspalten: {', '.join(self.key_columns)}",
+                 f"Exakte Duplikate: {self.exact.size}",
+                 f"Konflikte (gleiche Stufe, andere Werte): {self.conflicts.size} Zeilen in "
+                 f"{self.conflict_groups} Stufen"]
+        if table is not None and self.conflicts.size:
+            for row in self.conflicts[:limit].tolist():
+                first = int(self.key_group[row])
+                key = ", ".join(f"{c} {table[c].iat[row]}" for c in self.key_columns)
+                lines.append(f"  Zeile {row + 1} widerspricht Zeile {first + 1}: {key}")
+            if self.conflicts.size > limit:
+                lines.append(f"  … und {self.conflicts.size - limit} weitere")
+        return lines
+
+
+def find_duplicates(df: pd.DataFrame, key_columns: Optional[List[str]] = None) -> DuplicateReport:
+    """
+    Finds exact duplicate rows and bracket key conflicts in linear time.
+    key_columns defaults to the bracket bounds and the order kind.
+    """
+    key_columns = key_columns or bracket_key_columns(df.columns.tolist())
+    return DuplicateReport(key_columns, _groups(df, key_columns), _groups(df, df.columns.tolist()))
@@ -0,0 +1,224 @@
+import json
+import os
+from typing import Dict, List, Optional, Tuple
+
+from .schema import SUPPORTED_DTYPES
+from .atomic_io import atomic_write
+
+
+class DefinitionError(ValueError):
+    """Raised when a tariff definition is missing or does not match the expected structure."""
+
+
+def validate_definition(data: Dict) -> Dict:
+    """
+    Checks a parsed TariffDefinitions JSON against the definition schema.
+    Returns the definition unchanged or raises DefinitionError with a readable message.
+    """
+    if not isinstance(data, dict):
+        raise DefinitionError("Definition muss ein JSON-Objekt sein.")
+
+    spec = data.get('spec_name')
+    if not isinstance(spec, str) or not spec.strip():
+        raise DefinitionError("'spec_name' fehlt oder ist leer.")
+
+    for key in ('description', 'unit_code', 'currency_code'):
+        if key in data and not isinstance(data[key], str):
+            raise DefinitionError(f"'{key}' muss ein Text sein.")
+
+    if 'id_orderkind_default' in data and not isinstance(data['id_orderkind_default'], int):
+        raise DefinitionError("'id_orderkind_default' muss eine ganze Zahl sein.")
+
+    columns = data.get('columns')
+    if not isinstance(columns, list) or not columns:
+        raise DefinitionError("'columns' muss eine nicht-leere Liste sein.")
+    if not all(isinstance(c, str) and c.strip() for c in columns):
+        raise DefinitionError("Spaltennamen müssen nicht-leere Texte sein.")
+    if len(set(columns)) != len(columns):
+        raise DefinitionError("Spaltennamen müssen eindeutig sein.")
+
+    defaults = data.get('defaults', {})
+    if not isinstance(defaults, dict):
+        raise DefinitionError("'defaults' muss ein JSON-Objekt sein.")
+    for col, val in defaults.items():
+        if col not in columns:
+            raise DefinitionError(f"Standardwert für unbekannte Spalte '{col}'.")
+        if not isinstance(val, (int, float, str)) or isinstance(val, bool):
+            raise DefinitionError(f"Ungültiger Standardwert für Spalte '{col}'.")
+
+    dtypes = data.get('dtypes', {})
+    if not isinstance(dtypes, dict):
+        raise DefinitionError("'dtypes' muss ein JSON-Objekt sein.")
+    for col, kind in dtypes.items():
+        if col not in columns:
+            raise DefinitionError(f"Datentyp für unbekannte Spalte '{col}'.")
+        if kind not in SUPPORTED_DTYPES:
+            raise DefinitionError(f"Unbekannter Datentyp '{kind}' für Spalte '{col}'.")
+
+    return data
+
+
+class DefinitionRegistry:
+    """
+    Cache of the JSON definitions in the TariffDefinitions folder.
+    Every file is parsed and validated once and indexed by filename and spec_name.
+    Entries are revalidated through mtime checks: listing costs one directory stat,
+    a lookup one file stat. The UI can call invalidate() from a QFileSystemWatcher
+    to force a rescan.
+    """
+
+    def __init__(self, folder: str):
+        self.folder = folder
+        self._entries: Dict[str, Tuple[int, int, Optional[Dict], Optional[str]]] = {} # name -> (mtime_ns, size, definition, error)
+        self._by_spec: Dict[str, str] = {}
+        self._by_signature: Dict[frozenset, str] = {} # Column set -> filename
+        self._filenames: List[str] = []
+        self._dir_mtime = None
+        self._dirty = True
+
+    # --- Cache maintenance ---
+
+    def invalidate(self, path: Optional[str] = None):
+        """Marks the folder (or one file) as changed; the next access rescans it."""
+        if path is not None:
+            self._entries.pop(os.path.basename(path), None)
+        self._dirty = True
+
+    def _stat_dir(self):
+        try:
+            return os.stat(self.folder).st_mtime_ns
+        except OSError:
+            return None
+
+    def refresh(self, force: bool = False):
+        """Rescans the folder if its mtime changed (or force), reparsing only changed files."""
+        dir_mtime = self._stat_dir()
+        if not force and not self._dirty and dir_mtime == self._dir_mtime:
+            return
+        self._dir_mtime = dir_mtime
+        self._dirty = False
+
+        if dir_mtime is None:
+            self._entries.clear()
+            self._by_spec.clear()
+            self._by_signature.clear()
+            self._filenames = []
+            return
+
+        names = sorted(f for f in os.listdir(self.folder) if f.endswith('.json'))
+        for stale in set(self._entries) - set(names):
+            del self._entries[stale]
+        for name in names:
+            self._load_entry(name)
+        self._rebuild_index()
+
+    def _load_entry(self, name: str):
+        """(Re)parses one file if its mtime or size differs from the cached entry."""
+        path = os.path.join(self.folder, name)
+        try:
+            st = os.stat(path)
+        except OSError:
+            self._entries.pop(name, None)
+            return None
+        cached = self._entries.get(name)
+        if cached is not None and cached[0] == st.st_mtime_ns and cached[1] == st.st_size:
+            return cached
+
+        definition, error = None, None
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                definition = validate_definition(json.load(f))
+        except (OSError, ValueError) as e:
+            # json.JSONDecodeError and DefinitionError are both ValueErrors
+            error = str(e)
+        entry = (st.st_mtime_ns, st.st_size, definition, error)
+        self._entries[name] = entry
+        return entry
+
+    def _rebuild_index(self):
+        self._filenames = [name for name, entry in sorted(self._entries.items()) if entry[2] is not None]
+        self._by_spec = {}
+        self._by_signature = {}
+        for name in self._filenames:
+            definition = self._entries[name][2]
+            self._by_spec.setdefault(definition['spec_name'], name)
+            self._by_signature.setdefault(frozenset(definition['columns']), name)
+
+    # --- Queries ---
+
+    def filenames(self) -> List[str]:
+        """Valid definition files, sorted. O(1) after warm-up unless the folder changed."""
+        self.refresh()
+        return list(self._filenames)
+
+    def errors(self) -> Dict[str, str]:
+        """Definition files that failed to parse or validate, with the reason."""
+        self.refresh()
+        return {name: entry[3] for name, entry in self._entries.items() if entry[3] is not None}
+
+    def get(self, filename: str) -> Dict:
+        """Parsed definition by filename. The returned dict is shared, do not modify it."""
+        self.refresh()
+        entry = self._load_entry(filename)
+        if entry is None:
+            raise DefinitionError(f"Definition '{filename}' nicht gefunden.")
+        if entry[3] is not None:
+            raise DefinitionError(f"Definition '{filename}' ist ungültig: {entry[3]}")
+        if entry[2]['spec_name'] not in self._by_spec:
+            self._rebuild_index()
+        return entry[2]
+
+    def by_spec(self, spec_name: str) -> Optional[Dict]:
+        """Definition whose spec_name matches, or None."""
+        self.refresh()
+        name = self._by_spec.get(spec_name)
+        if name is None:
+            return None
+        entry = self._load_entry(name)
+        if entry is None or entry[2] is None or entry[2]['spec_name'] != spec_name:
+            # File changed underneath us, rebuild and try once more
+            self.refresh(force=True)
+            name = self._by_spec.get(spec_name)
+            return self._entries[name][2] if name else None
+        return entry[2]
+
+    def resolve(self, spec_name: Optional[str], columns: Optional[List[str]] = None) -> Optional[Tuple[str, Dict]]:
+        """
+        Finds the definition for a loaded tariff as (filename, definition), or None.
+        A spec_name match whose columns also match wins, then a definition with the
+        same column set, then the spec_name match alone. Both lookups are dict hits.
+        """
+        self.refresh()
+        signature = frozenset(columns) if columns else None
+        by_spec = self._by_spec.get(spec_name) if spec_name else None
+        by_columns = self._by_signature.get(signature) if signature else None
+
+        if by_spec is not None and (signature is None or frozenset(self._entries[by_spec][2]['columns']) == signature):
+            name = by_spec
+        else:
+            name = by_columns or by_spec
+        if name is None:
+            return None
+        entry = self._load_entry(name)
+        if entry is None or entry[2] is None:
+            self.refresh(force=True)
+            return self.resolve(spec_name, columns)
+        return name, entry[2]
+
+    def load_path(self, path: str) -> Dict:
+        """Definition from any path; files inside the registry folder come from the cache."""
+        if os.path.dirname(os.path.abspath(path)) == os.path.abspath(self.folder):
+            return self.get(os.path.basename(path))
+        with open(path, 'r', encoding='utf-8') as f:
+            return validate_definition(json.load(f))
+
+    def save(self, data: Dict, filename: str) -> str:
+        """Validates and writes a definition, then updates the cache entry for it."""
+        validate_definition(data)
+        if not filename.endswith('.json'):
+            filename += '.json'
+        path = os.path.join(self.folder, filename)
+        with atomic_write(path, 'w', encoding='utf-8') as f:
+            json.dump(data, f, indent=4)
+        self.invalidate(path)
+        return path
@@ -0,0 +1,286 @@
+import glob
+import json
+import os
+import shutil
+import uuid
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from .column_buffer import ColumnBuffer
+
+
+def _plain(values):
+    """JSON-ready form of a scalar or array (NumPy types become Python types)."""
+    if isinstance(values, np.ndarray):
+        return values.tolist()
+    if isinstance(values, np.generic):
+        return values.item()
+    if isinstance(values, (list, tuple)):
+        return [_plain(v) for v in values]
+    return values
+
+
+def _lock(path: str):
+    """
+    Opens path and takes an exclusive, non-blocking OS lock on it; returns the open file,
+    or None if another process holds the lock. The OS drops the lock when the process
+    ends, so a journal whose lock can be taken belongs to a session that is gone.
+    """
+    f = open(path, 'a+b')
+    try:
+        if os.name == 'nt':
+            import msvcrt
+            f.seek(0)
+            msvcrt.locking(f.fileno(), msvcrt.LK_NBLCK, 1)
+        else:
+            import fcntl
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        f.close()
+        return None
+    return f
+
+
+class EditJournal:
+    """
+    Append-only JSONL log of table edits since the last clean save.
+
+    The first line names the base the edits apply to (a saved or loaded file, optionally
+    one of its tariff items, or a definition for a new tariff); every further line is one
+    delta: cells set, a column replaced, rows appended, deleted or sorted, header fields changed.
+    Records are written and flushed as they happen, but not fsynced, so a record costs one
+    small write. After a crash, replay() rebuilds the table by applying the deltas to the
+    reloaded base. A wholesale table replacement (generator, matrix import) is the only
+    record that carries the full table; its numeric columns go to an .npz file next to
+    the journal.
+
+    Every session writes its own journal (for_session) and holds a lock on it while
+    running, so several windows never share one; journals left unlocked by sessions that
+    did not end cleanly are found with orphans().
+    """
+    PREFIX = "autosave_journal"
+
+    def __init__(self, path: str):
+        self.path = path
+        self._file = None
+        self._lock = None # Open lock file while this process owns the journal
+        self._frames = 0 # Number of .npz table snapshots written for 'frame' records
+
+    @classmethod
+    def for_session(cls, folder: str) -> "EditJournal":
+        """A journal with a name of its own for this process; locked when started."""
+        return cls(os.path.join(folder, f"{cls.PREFIX}-{os.getpid()}-{uuid.uuid4().hex[:8]}.jsonl"))
+
+    @classmethod
+    def orphans(cls, folder: str) -> List["EditJournal"]:
+        """
+        Journals in folder whose session has ended without discarding them, newest first.
+        Each is claimed (locked) for the caller, who must discard() or release() it.
+        """
+        paths = glob.glob(os.path.join(glob.escape(folder), f"{cls.PREFIX}*.jsonl"))
+        journals = []
+        for path in sorted(paths, key=lambda p: os.path.getmtime(p) if os.path.exists(p) else 0, reverse=True):
+            journal = cls(path)
+            if journal.claim():
+                journals.append(journal)
+        return journals
+
+    def claim(self) -> bool:
+        """Takes the journal's lock; False if a running session holds it."""
+        if self._lock is None:
+            self._lock = _lock(self.path + ".lock")
+        return self._lock is not None
+
+    def release(self):
+        """Closes the journal and gives up its lock, leaving the files in place."""
+        self.close()
+        if self._lock is not None:
+            self._lock.close()
+            self._lock = None
+
+    # --- Writing ---
+
+    def start(self, source: Optional[str] = None, item: Optional[int] = None,
+              definition: Optional[str] = None) -> "EditJournal":
+        """
+        Truncates the journal and records the base that following edits apply to. The frames
+        of the previous segment are deleted once the new base is on disk, so a session that
+        saves often does not keep every generated table until it exits.
+        """
+        self.close()
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        if not self.claim():
+            raise OSError(f"Journal '{self.path}' is in use by another session")
+        self._file = open(self.path, 'w', encoding='utf-8')
+        self._write({'op': 'base', 'source': source, 'item': item, 'definition': definition})
+        os.fsync(self._file.fileno())
+        self._remove_frames()
+        self._frames = 0
+        return self
+
+    @property
+    def is_open(self) -> bool:
+        return self._file is not None
+
+    def adopt(self, journal: "EditJournal", records: List[Dict[str, Any]]):
+        """
+        Appends the edits recovered from another journal, copying its table snapshots,
+        so the other journal can be discarded once its records are replayed.
+        """
+        if self._file is None:
+            return
+        for record in records:
+            if record.get('op') == 'frame' and record.get('file'):
+                self._frames += 1
+                frame_path = f"{self.path}.{self._frames}.npz"
+                shutil.copyfile(os.path.join(os.path.dirname(os.path.abspath(journal.path)), record['file']),
+                                frame_path)
+                record = dict(record, file=os.path.basename(frame_path))
+            self._write(record)
+
+    def _write(self, record: Dict[str, Any]):
+        if self._file is None:
+            return
+        self._file.write(json.dumps(record, ensure_ascii=False, separators=(',', ':')) + "\n")
+        self._file.flush()
+
+    def record_cells(self, column: str, rows, values):
+        self._write({'op': 'set', 'column': column, 'rows': _plain(np.asarray(rows)),
+                     'values': _plain(np.asarray(values))})
+
+    def record_column(self, column: str, values):
+        self._write({'op': 'column', 'column': column, 'values': _plain(values)})
+
+    def record_append(self, rows):
+        if isinstance(rows, pd.DataFrame):
+            rows = {col: rows[col].to_numpy() for col in rows.columns}
+        self._write({'op': 'append', 'rows': {col: _plain(np.asarray(v)) for col, v in rows.items()}})
+
+    def record_delete(self, starts, ends):
+        """Deleted rows as inclusive runs [start, end] (positions before the delete)."""
+        self._write({'op': 'delete', 'runs': [[int(s), int(e)] for s, e in zip(starts, ends)]})
+
+    def record_sort(self, columns: List[str], ascending: List[bool]):
+        """A reorder, recorded by its keys: replaying the stable sort gives the same order."""
+        self._write({'op': 'sort', 'columns': list(columns), 'ascending': [bool(a) for a in ascending]})
+
+    def record_frame(self, df: pd.DataFrame):
+        """
+        A whole new table. Numeric columns go to a .npz file next to the journal, which is
+        far cheaper to write than JSON for large generated tables; text columns stay inline.
+        """
+        if self._file is None:
+            return
+        self._frames += 1
+        frame_path = f"{self.path}.{self._frames}.npz"
+        arrays = {col: df[col].to_numpy() for col in df.columns}
+        # By kind, as pandas may hold text as 'str' rather than object
+        numeric = {col: values for col, values in arrays.items() if values.dtype.kind in 'biuf'}
+        with open(frame_path, 'wb') as f:
+            np.savez(f, **numeric)
+        self._write({'op': 'frame', 'columns': df.columns.tolist(), 'file': os.path.basename(frame_path),
+                     'rows': {col: _plain(values) for col, values in arrays.items() if col not in numeric}})
+
+    def record_metadata(self, meta: Dict[str, Any]):
+        self._write({'op': 'meta', 'meta': meta})
+
+    def sync(self):
+        """fsyncs what was recorded so far; meant for a debounced background job, not every edit."""
+        f = self._file
+        if f is None:
+            return
+        try:
+            os.fsync(f.fileno())
+        except (OSError, ValueError):
+            pass # Closed or restarted meanwhile
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def discard(self):
+        """Closes and deletes the journal, its frames and lock (clean exit, nothing to recover)."""
+        self.close()
+        self._remove_frames()
+        for path in (self.path, self.path + ".lock"):
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+        self.release()
+
+    def _remove_frames(self):
+        """Deletes the frame files of this journal."""
+        folder = os.path.dirname(os.path.abspath(self.path))
+        prefix = os.path.basename(self.path) + "."
+        if not os.path.isdir(folder):
+            return
+        for name in os.listdir(folder):
+            if name.startswith(prefix) and name.endswith(".npz"):
+                try:
+                    os.remove(os.path.join(folder, name))
+                except OSError:
+                    pass
+
+    # --- Recovery ---
+
+    @staticmethod
+    def read(path: str) -> Tuple[Optional[Dict[str, Any]], List[Dict[str, Any]]]:
+        """
+        (base record, edit records) of a journal, or (None, []) if there is none.
+        A torn last line from a crash mid-write is ignored.
+        """
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                lines = f.readlines()
+        except OSError:
+            return None, []
+        records = []
+        for line in lines:
+            try:
+                records.append(json.loads(line))
+            except ValueError:
+                break
+        if not records or records[0].get('op') != 'base':
+            return None, []
+        return records[0], records[1:]
+
+    def replay(self, records: List[Dict[str, Any]], buf: ColumnBuffer) -> Tuple[ColumnBuffer, Dict[str, Any]]:
+        """
+        Applies edit records to buf in order. Returns the resulting buffer (a new one if a
+        record replaced the whole table) and the last recorded header fields.
+        """
+        def typed(column, values):
+            # JSON widens float32/int8 to Python floats/ints; store them in the column's dtype again
+            dtype = buf.dtype(column) if column in buf.columns else object
+            return np.asarray(values, dtype=None if dtype == object else dtype)
+
+        meta = {}
+        for record in records:
+            op = record.get('op')
+            if op == 'set':
+                buf.set_cells(record['column'], record['rows'], typed(record['column'], record['values']))
+            elif op == 'column':
+                buf.set_column(record['column'], typed(record['column'], record['values']))
+            elif op == 'append':
+                buf.append({col: typed(col, v) for col, v in record['rows'].items()})
+            elif op == 'delete':
+                mask = np.zeros(len(buf), dtype=bool)
+                for start, end in record['runs']:
+                    mask[start:end + 1] = True
+                buf.delete(mask)
+            elif op == 'sort':
+                buf.permute(buf.argsort(record['columns'], record['ascending']))
+            elif op == 'frame':
+                data = dict(record['rows'])
+                if record.get('file'):
+                    folder = os.path.dirname(os.path.abspath(self.path))
+                    with np.load(os.path.join(folder, record['file'])) as arrays:
+                        data.update({col: arrays[col] for col in arrays.files})
+                buf = ColumnBuffer.from_frame(pd.DataFrame(data, columns=record['columns']))
+            elif op == 'meta':
+                meta = record['meta']
+        return buf, meta
@@ -0,0 +1,172 @@
+import re
+import numpy as np
+import pandas as pd
+from typing import Dict, List, Optional, Any, Tuple
+
+from .schema import TariffSchema
+from .money import ROUND_HALF_UP, euros_to_cents
+
+
+class GeneratorError(ValueError):
+    """Raised for unusable breakpoints, anchor grids or target columns."""
+
+
+def _to_float(text: str) -> float:
+    """Number as typed in German or English notation ("1.234,5", "1234.5")."""
+    text = text.strip()
+    if ',' in text:
+        text = text.replace('.', '').replace(',', '.')
+    try:
+        return float(text)
+    except ValueError:
+        raise GeneratorError(f"Ungültige Zahl: '{text}'")
+
+
+def parse_number_list(text: str) -> np.ndarray:
+    """
+    Parses breakpoints typed or pasted by the user, e.g. "50; 100; 250,5" or one per line.
+    Separators are semicolons, tabs or whitespace; a comma is read as decimal separator.
+    """
+    parts = [p for p in re.split(r'[;\s]+', text.strip()) if p]
+    return np.array([_to_float(p) for p in parts], dtype=np.float64)
+
+
+def parse_anchor_grid(text: str) -> "AnchorGridPricing":
+    """
+    Anchor grid pasted from Excel in the matrix import layout: first row quantities
+    (after an empty corner cell), first column distances, prices in between.
+    """
+    rows = [line.split('\t') for line in text.splitlines() if line.strip()]
+    if len(rows) < 2 or len(rows[0]) < 2:
+        raise GeneratorError("Ankerraster braucht mindestens eine Kopfzeile und eine Datenzeile.")
+    quantities = [_to_float(v) for v in rows[0][1:] if v.strip()]
+    distances = [_to_float(r[0]) for r in rows[1:]]
+    prices = [[_to_float(v) for v in r[1:len(quantities) + 1]] for r in rows[1:]]
+    if any(len(p) != len(quantities) for p in prices):
+        raise GeneratorError("Ankerraster ist nicht rechteckig.")
+    return AnchorGridPricing(distances, quantities, prices)
+
+
+def bracket_bounds(breakpoints) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Stepped brackets from upper breakpoints: [50, 100, 250] -> min [0, 50, 100], max [50, 100, 250].
+    Breakpoints are sorted and deduplicated; they must be positive.
+    """
+    maxs = np.unique(np.asarray(breakpoints, dtype=np.float64))
+    if maxs.size == 0:
+        raise GeneratorError("Mindestens ein Stufenwert ist erforderlich.")
+    if not np.isfinite(maxs).all() or maxs[0] <= 0:
+        raise GeneratorError("Stufenwerte müssen positive Zahlen sein.")
+    mins = np.concatenate(([0.0], maxs[:-1]))
+    return mins, maxs
+
+
+class LinearPricing:
+    """Price in euros = base + per_distance * distance + per_quantity * quantity, at the bracket's upper bound."""
+
+    def __init__(self, base: float = 0.0, per_distance: float = 0.0, per_quantity: float = 0.0):
+        self.base = float(base)
+        self.per_distance = float(per_distance)
+        self.per_quantity = float(per_quantity)
+
+    def grid(self, distances: np.ndarray, quantities: np.ndarray) -> np.ndarray:
+        """(len(distances), len(quantities)) price matrix by broadcasting the two axes."""
+        return (self.base
+                + self.per_distance * np.asarray(distances, dtype=np.float64)[:, None]
+                + self.per_quantity * np.asarray(quantities, dtype=np.float64)[None, :])
+
+
+class AnchorGridPricing:
+    """
+    Prices looked up in a small anchor grid (rows = distances, columns = quantities)
+    and bilinearly interpolated in between. Points outside the anchors are clamped
+    to the nearest anchor edge.
+    """
+
+    def __init__(self, distances, quantities, prices):
+        self.distances = np.asarray(distances, dtype=np.float64)
+        self.quantities = np.asarray(quantities, dtype=np.float64)
+        self.prices = np.asarray(prices, dtype=np.float64)
+        if self.prices.shape != (self.distances.size, self.quantities.size):
+            raise GeneratorError("Ankerraster: Preismatrix passt nicht zu den Achsenwerten.")
+        if self.distances.size == 0 or self.quantities.size == 0:
+            raise GeneratorError("Ankerraster ist leer.")
+        if (np.diff(self.distances) <= 0).any() or (np.diff(self.quantities) <= 0).any():
+            raise GeneratorError("Ankerwerte müssen streng aufsteigend sein.")
+
+    @staticmethod
+    def _weights(anchors: np.ndarray, points: np.ndarray):
+        """Lower anchor index and interpolation weight towards the upper anchor, per point."""
+        if anchors.size == 1:
+            zeros = np.zeros(points.size, dtype=np.int64)
+            return zeros, zeros, np.zeros(points.size)
+        upper = np.clip(np.searchsorted(anchors, points), 1, anchors.size - 1)
+        lower = upper - 1
+        t = (points - anchors[lower]) / (anchors[upper] - anchors[lower])
+        return lower, upper, np.clip(t, 0.0, 1.0)
+
+    def grid(self, distances: np.ndarray, quantities: np.ndarray) -> np.ndarray:
+        d0, d1, td = self._weights(self.distances, np.asarray(distances, dtype=np.float64))
+        q0, q1, tq = self._weights(self.quantities, np.asarray(quantities, dtype=np.float64))
+        # Interpolate along quantities for every anchor row, then along distances
+        along_q = self.prices[:, q0] * (1 - tq) + self.prices[:, q1] * tq
+        return along_q[d0] * (1 - td)[:, None] + along_q[d1] * td[:, None]
+
+
+def quantity_column(columns: List[str], distance_column: str = 'maxDistance') -> Optional[str]:
+    """The second bracket axis of a definition (maxWeight, maxVolume, ...)."""
+    for col in columns:
+        if col.startswith('max') and col != distance_column:
+            return col
+    return None
+
+
+def generate_grid(schema: TariffSchema, distance_breakpoints, quantity_breakpoints, pricing,
+                  defaults: Optional[Dict[str, Any]] = None, rounding: str = ROUND_HALF_UP,
+                  distance_column: str = 'maxDistance', quantity_col: Optional[str] = None,
+                  price_column: str = 'price') -> pd.DataFrame:
+    """
+    Full stepped bracket table for a schema: one row per (distance bracket, quantity bracket),
+    distances outer, quantities inner (the order the matrix import produces). Bracket columns
+    are built with np.repeat/np.tile, prices by broadcasting the pricing function over both
+    axes; every other column is filled with its default. Returns a DataFrame in storage dtypes.
+    """
+    quantity_col = quantity_col or quantity_column(schema.columns, distance_column)
+    for col in (distance_column, quantity_col, price_column):
+        if col is None or col not in schema.columns:
+            raise GeneratorError(f"Spalte '{col}' ist in der Tarif-Definition nicht vorhanden.")
+
+    d_min, d_max = bracket_bounds(distance_breakpoints)
+    q_min, q_max = bracket_bounds(quantity_breakpoints)
+    n_d, n_q = d_max.size, q_max.size
+    n = n_d * n_q
+
+    prices = np.asarray(pricing.grid(d_max, q_max), dtype=np.float64)
+    if prices.shape != (n_d, n_q):
+        raise GeneratorError("Preisfunktion liefert keine Matrix passend zu den Stufen.")
+
+    generated = {
+        distance_column: np.repeat(d_max, n_q),
+        quantity_col: np.tile(q_max, n_d),
+    }
+    d_min_col = distance_column.replace('max', 'min', 1)
+    q_min_col = quantity_col.replace('max', 'min', 1)
+    if d_min_col in schema.columns:
+        generated[d_min_col] = np.repeat(d_min, n_q)
+    if q_min_col in schema.columns:
+        generated[q_min_col] = np.tile(q_min, n_d)
+
+    defaults = {**schema.defaults, **(defaults or {})}
+    data = {}
+    for col in schema.columns:
+        if col == price_column and schema.is_money(col):
+            data[col] = euros_to_cents(prices.reshape(-1), rounding)
+        elif col == price_column:
+            data[col] = schema.coerce_column(col, prices.reshape(-1))
+        elif col in generated:
+            data[col] = schema.coerce_column(col, generated[col])
+        else:
+            # Constant column: coerce the default once, then broadcast it
+            value = schema.coerce_column(col, np.array([defaults.get(col, 0)], dtype=object))
+            data[col] = np.full(n, value[0], dtype=value.dtype)
+    return pd.DataFrame(data, columns=schema.columns)
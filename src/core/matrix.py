@@ -0,0 +1,152 @@
+import csv
+import numpy as np
+from typing import Iterator, List, Optional
+
+from .generator import quantity_column
+from .schema import format_cents
+from .atomic_io import atomic_write
+
+
+class MatrixLayout:
+    """
+    Pivot of long-format tariff rows onto a grid: one grid row per distinct value of
+    the row key (e.g. maxDistance), one grid column per distinct value of the column
+    key (e.g. maxWeight). Built with np.unique on both keys; cell_rows[i, j] is the
+    table row that holds cell (i, j), or -1 if the combination does not exist.
+    rows optionally restricts the grid to some table rows (e.g. one order kind, since
+    every kind has its own bracket grid); cell_rows still holds table row numbers.
+    """
+
+    def __init__(self, row_values, col_values, rows=None):
+        row_values = np.asarray(row_values)
+        col_values = np.asarray(col_values)
+        if rows is None:
+            rows = np.arange(row_values.size)
+        else:
+            rows = np.asarray(rows, dtype=np.int64)
+            row_values, col_values = row_values[rows], col_values[rows]
+        self.row_keys, row_pos = np.unique(row_values, return_inverse=True)
+        self.col_keys, col_pos = np.unique(col_values, return_inverse=True)
+        self.cell_rows = np.full((self.row_keys.size, self.col_keys.size), -1, dtype=np.int64)
+        self.cell_rows[row_pos.reshape(-1), col_pos.reshape(-1)] = rows
+        # Table rows that share a cell with another row; only one of them is shown
+        self.duplicates = rows.size - int(np.count_nonzero(self.cell_rows >= 0))
+
+    @property
+    def shape(self):
+        return self.cell_rows.shape
+
+    def cell_values(self, column_values, missing=np.nan) -> np.ndarray:
+        """Grid of one column's values (e.g. price); cells without a row get `missing`."""
+        column_values = np.asarray(column_values)
+        dtype = np.result_type(column_values.dtype, np.asarray(missing).dtype)
+        grid = np.full(self.shape, missing, dtype=dtype)
+        present = self.cell_rows >= 0
+        grid[present] = column_values[self.cell_rows[present]]
+        return grid
+
+
+def bracket_axes(columns: List[str], distance_column: str = 'maxDistance') -> Optional[tuple]:
+    """Default (row key, column key) for a grid: distance down, the other max column across."""
+    quantity = quantity_column(columns, distance_column)
+    if distance_column not in columns or quantity is None:
+        return None
+    return distance_column, quantity
+
+
+# --- Export (the inverse of MatrixImportDialog.process_import) ---
+
+def decimal_texts(values) -> np.ndarray:
+    """
+    Numbers as text that the matrix import reads back to the same value: shortest
+    round-trip digits (of float32 values, if stored as float32), decimal comma, no
+    thousands separator.
+    """
+    values = np.asarray(values)
+    if values.dtype.kind in 'iub':
+        return values.astype(np.int64).astype(str).astype(object)
+    texts = [np.format_float_positional(v, trim='-').replace('.', ',') for v in values]
+    return np.array(texts, dtype=object)
+
+
+def grid_texts(layout: MatrixLayout, values, money: bool = False) -> np.ndarray:
+    """Cell texts of the grid (object array of layout.shape); empty cells are ""."""
+    values = np.asarray(values)
+    texts = np.full(layout.shape, "", dtype=object)
+    present = layout.cell_rows >= 0
+    cells = values[layout.cell_rows[present]]
+    if money:
+        formatted = np.char.replace(format_cents(cells).astype(str), '.', ',').astype(object)
+    else:
+        # Format each distinct value once
+        uniques, inverse = np.unique(cells, return_inverse=True)
+        formatted = decimal_texts(uniques)[inverse.reshape(-1)]
+    texts[present] = formatted
+    return texts
+
+
+def matrix_rows(layout: MatrixLayout, texts: np.ndarray) -> Iterator[List[str]]:
+    """
+    Rows of the import layout: an empty corner, the column keys across the top,
+    then per grid row its key followed by the cell texts. Generated lazily.
+    """
+    yield [""] + decimal_texts(layout.col_keys).tolist()
+    row_heads = decimal_texts(layout.row_keys)
+    for i in range(layout.shape[0]):
+        yield [row_heads[i]] + texts[i].tolist()
+
+
+def matrix_tsv(layout: MatrixLayout, texts: np.ndarray) -> str:
+    """Tab separated grid as Excel puts it on the clipboard."""
+    return "\n".join("\t".join(row) for row in matrix_rows(layout, texts)) + "\n"
+
+
+def write_matrix_csv(path: str, layout: MatrixLayout, texts: np.ndarray, delimiter: str = ';'):
+    """CSV for German Excel (semicolons, decimal comma, BOM), written row by row."""
+    with atomic_write(path, 'w', encoding='utf-8-sig') as f:
+        writer = csv.writer(f, delimiter=delimiter, lineterminator='\n')
+        writer.writerows(matrix_rows(layout, texts))
+
+
+def write_matrix_xlsx(path: str, layout: MatrixLayout, values, money: bool = False):
+    """
+    Excel workbook with numeric cells, streamed through openpyxl's write-only mode.
+    Bracket keys are written as the decimal the user sees (not the float32 value), and
+    money cells as euros with two decimals, so copying the sheet back imports exactly.
+    """
+    try:
+        from openpyxl import Workbook
+        from openpyxl.cell import WriteOnlyCell
+    except ImportError:
+        raise RuntimeError("Für den Excel-Export wird das Paket 'openpyxl' benötigt.")
+
+    def number(text):
+        return float(text.replace(',', '.'))
+
+    texts = grid_texts(layout, values, money)
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet("Tarif")
+    ws.append([None] + [number(t) for t in decimal_texts(layout.col_keys)])
+    row_heads = decimal_texts(layout.row_keys)
+    for i in range(layout.shape[0]):
+        row = [number(row_heads[i])]
+        for text in texts[i].tolist():
+            if not text:
+                row.append(None)
+            elif money:
+                cell = WriteOnlyCell(ws, value=number(text))
+                cell.number_format = '0.00'
+                row.append(cell)
+            else:
+                row.append(number(text))
+        ws.append(row)
+    with atomic_write(path, 'wb') as f:
+        wb.save(f)
+
+
+def export_matrix(path: str, layout: MatrixLayout, values, money: bool = False):
+    """Writes the grid to .xlsx or .csv, chosen by the file extension."""
+    if path.lower().endswith('.xlsx'):
+        write_matrix_xlsx(path, layout, values, money)
+    else:
+        write_matrix_csv(path, layout, grid_texts(layout, values, money))
@@ -0,0 +1,143 @@
+from decimal import Decimal, ROUND_HALF_UP as DEC_HALF_UP, ROUND_HALF_EVEN as DEC_HALF_EVEN, localcontext
+from fractions import Fraction
+import math
+
+import numpy as np
+
+# Rounding modes for money held as int64 cents
+ROUND_HALF_UP = 'half_up'      # Kaufmännisch: ties away from zero
+ROUND_HALF_EVEN = 'half_even'  # Banker's rounding: ties to the even cent
+
+ROUNDING_MODES = {
+    ROUND_HALF_UP: "Kaufmännisch (0,5 aufrunden)",
+    ROUND_HALF_EVEN: "Banker's Rounding (0,5 zur geraden Zahl)",
+}
+
+_DECIMAL_MODES = {ROUND_HALF_UP: DEC_HALF_UP, ROUND_HALF_EVEN: DEC_HALF_EVEN}
+
+# Largest magnitude that int64 intermediates may reach before we switch to Python ints
+_INT64_SAFE = 2 ** 62
+
+
+def _check_mode(mode: str):
+    if mode not in ROUNDING_MODES:
+        raise ValueError(f"Unbekannter Rundungsmodus: '{mode}'")
+
+
+def to_fraction(value) -> Fraction:
+    """Exact decimal value of a number as typed (1.035 -> 207/200, not the binary float)."""
+    if isinstance(value, Fraction):
+        return value
+    return Fraction(Decimal(str(value)))
+
+
+def round_divide(numerator: np.ndarray, denominator: int, mode: str) -> np.ndarray:
+    """
+    Integer division numerator / denominator rounded to the nearest integer with the given mode.
+    Works element-wise on int64 (or Python int object) arrays without any float step.
+    """
+    _check_mode(mode)
+    if denominator == 1:
+        return numerator
+    sign = np.where(numerator < 0, -1, 1)
+    magnitude = np.abs(numerator)
+    quotient = magnitude // denominator
+    twice_remainder = 2 * (magnitude - quotient * denominator)
+    if mode == ROUND_HALF_UP:
+        round_up = twice_remainder >= denominator
+    else:
+        round_up = (twice_remainder > denominator) | ((twice_remainder == denominator) & (quotient % 2 == 1))
+    return sign * (quotient + round_up)
+
+
+def affine_cents(cents, factor=1, offset_euros=0, mode: str = ROUND_HALF_UP, step: int = 1) -> np.ndarray:
+    """
+    Exact cents * factor + offset (offset in euros), rounded once to a multiple of step
+    cents (1 = whole cents, 100 = whole euros). Factor and offset are taken as exact
+    decimals, so repeated uplifts do not drift.
+    """
+    factor = to_fraction(factor)
+    offset = to_fraction(offset_euros) * 100
+    denominator = factor.denominator * offset.denominator // math.gcd(factor.denominator, offset.denominator)
+    scale = factor.numerator * (denominator // factor.denominator)
+    shift = offset.numerator * (denominator // offset.denominator)
+
+    cents = np.asarray(cents, dtype=np.int64)
+    peak = int(np.abs(cents).max()) if cents.size else 0
+    step = max(int(step), 1)
+    if peak * abs(scale) + abs(shift) < _INT64_SAFE and denominator * step < _INT64_SAFE:
+        numerator = cents * np.int64(scale) + np.int64(shift)
+        return round_divide(numerator, denominator * step, mode).astype(np.int64) * step
+
+    # Intermediates would overflow int64, fall back to exact Python integers
+    numerator = cents.astype(object) * scale + shift
+    return round_divide(numerator, denominator * step, mode).astype(np.int64) * step
+
+
+def scale_cents(cents, factor, mode: str = ROUND_HALF_UP) -> np.ndarray:
+    """Exact cents * factor, e.g. factor 1.035 for a 3.5 % uplift."""
+    return affine_cents(cents, factor, 0, mode)
+
+
+def percentage_factor(percentage) -> Fraction:
+    """1 + percentage / 100 as an exact fraction."""
+    return 1 + to_fraction(percentage) / 100
+
+
+def round_cents_to_step(cents, step: int, mode: str = ROUND_HALF_UP) -> np.ndarray:
+    """Rounds cents to a multiple of step (e.g. step 100 for whole euros)."""
+    if step <= 1:
+        return np.asarray(cents, dtype=np.int64)
+    return round_divide(np.asarray(cents, dtype=np.int64), step, mode) * step
+
+
+def euros_to_cents(values, mode: str = ROUND_HALF_UP, step: int = 1) -> np.ndarray:
+    """
+    Rounds float euro amounts (results of general formulas) to int64 cents, or in one
+    step to a multiple of step cents. Values within 1e-9 step of a tie are treated as
+    ties, so binary float noise (e.g. 1.005 stored as 1.00499999...) is resolved by the
+    rounding mode, not by chance.
+    """
+    _check_mode(mode)
+    step = max(int(step), 1)
+    scaled = np.asarray(values, dtype=np.float64) * 100 / step
+    scaled = np.nan_to_num(scaled)
+    sign = np.where(scaled < 0, -1, 1)
+    magnitude = np.abs(scaled)
+    base = np.floor(magnitude)
+    fraction = magnitude - base
+    tie = np.abs(fraction - 0.5) < 1e-9
+    nearest = np.where(fraction > 0.5, base + 1, base)
+    if mode == ROUND_HALF_UP:
+        tied = base + 1
+    else:
+        tied = np.where(base % 2 == 1, base + 1, base)
+    return (sign * np.where(tie, tied, nearest)).astype(np.int64) * step
+
+
+def reference_affine_cents(cents, factor=1, offset_euros=0, mode: str = ROUND_HALF_UP, step: int = 1) -> np.ndarray:
+    """
+    Slow per-value Decimal reference for affine_cents, used to verify the vectorized path.
+    Each value is divided out once with 60 significant digits, so a factor such as
+    Fraction(1, 3) keeps its ties (45 cents / 3 is exactly 15) instead of becoming 14.99...
+    """
+    _check_mode(mode)
+    rounding = _DECIMAL_MODES[mode]
+    factor = to_fraction(factor)
+    offset_cents = to_fraction(offset_euros) * 100
+    step = max(int(step), 1)
+    result = []
+    with localcontext() as context:
+        context.prec = 60
+        for c in np.asarray(cents, dtype=np.int64).tolist():
+            steps = (c * factor + offset_cents) / step
+            value = Decimal(steps.numerator) / Decimal(steps.denominator)
+            result.append(int(value.quantize(Decimal(1), rounding=rounding)) * step)
+    return np.array(result, dtype=np.int64)
+
+
+def verify_affine(cents, factor=1, offset_euros=0, mode: str = ROUND_HALF_UP, step: int = 1) -> int:
+    """Returns the number of values where the vectorized result differs from the Decimal reference."""
+    fast = affine_cents(cents, factor, offset_euros, mode, step)
+    reference = reference_affine_cents(cents, factor, offset_euros, mode, step)
+    return int(np.count_nonzero(fast != reference))
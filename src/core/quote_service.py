@@ -0,0 +1,310 @@
+import asyncio
+import json
+import os
+import threading
+import traceback
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from .comtec_document import ComtecDocument
+from .compressed_io import is_tariff_file, tariff_stem
+from .rating import BracketRater
+from .tariff_engine import TariffEngine
+
+
+class QuoteError(ValueError):
+    """Raised for malformed quote requests; answered with HTTP 400."""
+
+
+class LoadedTariff:
+    """One tariff item held in memory for quoting."""
+
+    def __init__(self, name: str, path: str, rater: BracketRater, money: bool, metadata: Dict[str, str]):
+        self.name = name
+        self.path = path
+        self.rater = rater
+        self.money = money # Prices are int64 cents
+        self.metadata = metadata
+
+    def info(self) -> Dict[str, Any]:
+        return {'name': self.name, 'file': os.path.basename(self.path), 'rows': len(self.rater),
+                'quantity_column': self.rater.quantity_column, 'order_kinds': self.rater.order_kinds,
+                'max_distance': self.rater.max_distance, 'max_quantity': self.rater.max_quantity,
+                'tariff_id': self.metadata.get('id'), 'valid_from': self.metadata.get('valid_from'),
+                'valid_to': self.metadata.get('valid_to')}
+
+
+class TariffStore:
+    """
+    Tariff XML files (given directly or as folders) loaded into BracketRaters.
+    refresh() reloads files whose mtime or size changed and drops deleted ones; the
+    name -> tariff mapping and the load errors are replaced as a whole, so readers on
+    other threads always see a complete set. A file with one item is named after the file; items of a
+    multi-item document are named "file:1", "file:2", ... with "file" for the first.
+    """
+
+    def __init__(self, paths: List[str]):
+        self.paths = list(paths)
+        self._files: Dict[str, Tuple[int, int, List[LoadedTariff]]] = {} # path -> (mtime_ns, size, tariffs)
+        self._tariffs: Dict[str, LoadedTariff] = {}
+        self.errors: Dict[str, str] = {} # path -> message of the last failed load; never changed in place
+        self._lock = threading.Lock() # One refresh at a time
+
+    def _scan(self) -> Dict[str, os.stat_result]:
+        found = {}
+        for path in self.paths:
+            if os.path.isdir(path):
+                names = [os.path.join(path, n) for n in sorted(os.listdir(path)) if is_tariff_file(n)]
+            else:
+                names = [path]
+            for name in names:
+                try:
+                    found[os.path.abspath(name)] = os.stat(name)
+                except OSError:
+                    pass
+        return found
+
+    @staticmethod
+    def _load_file(path: str) -> List[LoadedTariff]:
+        document = ComtecDocument.open(path)
+        stem = tariff_stem(path)
+        items = document.items()
+        engine = TariffEngine()
+        loaded = []
+        for position, item in enumerate(items):
+            success, msg = engine.load_bytes(document.item_document(item), path)
+            if not success:
+                raise ValueError(msg)
+            rater = BracketRater(engine.load_table())
+            name = stem if len(items) == 1 else f"{stem}:{position + 1}"
+            loaded.append(LoadedTariff(name, path, rater, engine.schema.is_money(rater.price_column),
+                                       engine.get_metadata()))
+        return loaded
+
+    def refresh(self) -> List[str]:
+        """Reloads changed files; returns the paths that were (re)loaded or removed."""
+        with self._lock:
+            found = self._scan()
+            changed = [p for p in self._files if p not in found]
+            files = {p: entry for p, entry in self._files.items() if p in found}
+            errors = {p: message for p, message in self.errors.items() if p in found}
+            for path, st in found.items():
+                cached = files.get(path)
+                if cached is not None and cached[0] == st.st_mtime_ns and cached[1] == st.st_size:
+                    continue
+                try:
+                    files[path] = (st.st_mtime_ns, st.st_size, self._load_file(path))
+                    errors.pop(path, None)
+                except Exception as e:
+                    # Keep serving the previous version (e.g. a file caught mid-write)
+                    errors[path] = str(e)
+                    continue
+                changed.append(path)
+
+            tariffs = {}
+            for _, _, loaded in files.values():
+                for tariff in loaded:
+                    tariffs[tariff.name] = tariff
+                    if tariff.name.endswith(':1'):
+                        tariffs.setdefault(tariff.name[:-2], tariff)
+            self._files = files
+            self._tariffs, self.errors = tariffs, errors
+            return changed
+
+    def get(self, name: str) -> Optional[LoadedTariff]:
+        return self._tariffs.get(name)
+
+    def tariffs(self) -> List[LoadedTariff]:
+        return [t for name, t in sorted(self._tariffs.items()) if name == t.name]
+
+
+def _column(payload: Dict[str, Any], key: str, count: Optional[int] = None) -> Optional[np.ndarray]:
+    values = payload.get(key)
+    if values is None:
+        return None
+    try:
+        array = np.asarray(values, dtype=np.float64)
+    except (TypeError, ValueError):
+        raise QuoteError(f"'{key}' muss eine Zahl oder eine Liste von Zahlen sein.")
+    if count is not None and array.ndim == 1 and array.size != count:
+        raise QuoteError(f"'{key}' hat {array.size} Werte, erwartet {count}.")
+    return array
+
+
+def quote(store: TariffStore, payload: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Answers one batch quote request. Shipments are given column-wise
+        {"tariff": "...", "distance": [...], "quantity": [...], "order_kind": 2}
+    or as a list of objects
+        {"tariff": "...", "shipments": [{"distance": 120, "quantity": 300}, ...]}
+    order_kind may be a single value, one value per shipment, or left out for
+    tariffs with one order kind. Prices are euros; uncovered shipments get null.
+    """
+    if not isinstance(payload, dict):
+        raise QuoteError("Anfrage muss ein JSON-Objekt sein.")
+    if not isinstance(payload.get('tariff'), str):
+        raise QuoteError("'tariff' muss der Name eines Tarifs sein.")
+    tariff = store.get(payload['tariff'])
+    if tariff is None:
+        raise QuoteError(f"Unbekannter Tarif: {payload.get('tariff')!r}")
+
+    shipments = payload.get('shipments')
+    if shipments is not None:
+        if not isinstance(shipments, list) or not all(isinstance(s, dict) for s in shipments):
+            raise QuoteError("'shipments' muss eine Liste von Objekten sein.")
+        payload = {'distance': [s.get('distance') for s in shipments],
+                   'quantity': [s.get('quantity') for s in shipments],
+                   'order_kind': ([s.get('order_kind', payload.get('order_kind')) for s in shipments]
+                                  if any('order_kind' in s for s in shipments) else payload.get('order_kind'))}
+    distances = _column(payload, 'distance')
+    if distances is None:
+        raise QuoteError("'distance' fehlt.")
+    distances = distances.reshape(-1)
+    quantities = _column(payload, 'quantity', distances.size)
+    if quantities is None:
+        raise QuoteError("'quantity' fehlt.")
+    kinds = _column(payload, 'order_kind', distances.size)
+
+    try:
+        prices, rated = tariff.rater.quote(distances, np.broadcast_to(quantities, distances.shape),
+                                           None if kinds is None else np.nan_to_num(kinds, nan=-1))
+    except ValueError as e:
+        raise QuoteError(str(e))
+    values = prices / 100 if tariff.money else prices
+    return {'tariff': tariff.name,
+            'prices': [v if r else None for v, r in zip(values.tolist(), rated.tolist())],
+            'unrated': int(rated.size - np.count_nonzero(rated))}
+
+
+class QuoteServer:
+    """
+    Minimal asyncio HTTP/1.1 server (keep-alive, JSON only) in front of a TariffStore:
+        POST /quote     batch quote, see quote()
+        GET  /tariffs   loaded tariffs
+        GET  /health    liveness
+    A background task polls the tariff files every reload_interval seconds and swaps in
+    changed tariffs without interrupting requests. Meant for local use behind the TMS;
+    there is no TLS or authentication.
+    """
+
+    MAX_BODY = 64 * 1024 * 1024
+
+    def __init__(self, store: TariffStore, host: str = '127.0.0.1', port: int = 8765,
+                 reload_interval: float = 2.0, log=print):
+        self.store = store
+        self.host = host
+        self.port = port
+        self.reload_interval = reload_interval
+        self.log = log
+        self._server = None
+
+    async def serve(self):
+        loop = asyncio.get_running_loop()
+        for path in await loop.run_in_executor(None, self.store.refresh):
+            self.log(f"Geladen: {path}")
+        for path, error in self.store.errors.items():
+            self.log(f"Fehler in {path}: {error}")
+        self._server = await asyncio.start_server(self._handle_client, self.host, self.port)
+        self.log(f"Preisauskunft auf http://{self.host}:{self.port} ({len(self.store.tariffs())} Tarife)")
+        reloader = asyncio.create_task(self._reload_loop())
+        try:
+            async with self._server:
+                await self._server.serve_forever()
+        finally:
+            reloader.cancel()
+
+    def close(self):
+        if self._server is not None:
+            self._server.close()
+
+    async def _reload_loop(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            await asyncio.sleep(self.reload_interval)
+            try:
+                changed = await loop.run_in_executor(None, self.store.refresh)
+            except Exception:
+                traceback.print_exc()
+                continue
+            for path in changed:
+                self.log(f"Aktualisiert: {path}")
+
+    async def _handle_client(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            while True:
+                try:
+                    head = await reader.readuntil(b"\r\n\r\n")
+                except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, ConnectionError):
+                    break
+                lines = head.decode('latin-1').split("\r\n")
+                parts = lines[0].split(" ")
+                if len(parts) != 3:
+                    await self._respond(writer, 400, {'error': "Ungültige Anfragezeile."}, False)
+                    break
+                method, target, version = parts
+                headers = {}
+                for line in lines[1:]:
+                    name, sep, value = line.partition(":")
+                    if sep:
+                        headers[name.strip().lower()] = value.strip()
+                keep_alive = (headers.get('connection', '').lower() != 'close'
+                              if version == 'HTTP/1.1' else headers.get('connection', '').lower() == 'keep-alive')
+
+                try:
+                    length = int(headers.get('content-length', 0))
+                except ValueError:
+                    length = -1
+                if length < 0 or length > self.MAX_BODY:
+                    await self._respond(writer, 413 if length > 0 else 400,
+                                        {'error': "Ungültige Content-Length."}, False)
+                    break
+                try:
+                    body = await reader.readexactly(length) if length else b""
+                except (asyncio.IncompleteReadError, ConnectionError):
+                    break
+
+                try:
+                    status, result = self._dispatch(method, target.split('?', 1)[0], body)
+                except Exception as e:
+                    # A bug costs this one request, not the connection and the requests queued on it
+                    traceback.print_exc()
+                    status, result = 500, {'error': f"Interner Fehler: {e}"}
+                await self._respond(writer, status, result, keep_alive)
+                if not keep_alive:
+                    break
+        finally:
+            writer.close()
+
+    def _dispatch(self, method: str, path: str, body: bytes) -> Tuple[int, Dict[str, Any]]:
+        if path == '/quote':
+            if method != 'POST':
+                return 405, {'error': "Nur POST."}
+            try:
+                return 200, quote(self.store, json.loads(body))
+            except ValueError as e:
+                # QuoteError and json.JSONDecodeError
+                return 400, {'error': str(e)}
+        if method != 'GET':
+            return 405, {'error': "Nur GET."}
+        if path == '/tariffs':
+            return 200, {'tariffs': [t.info() for t in self.store.tariffs()],
+                         'errors': self.store.errors}
+        if path == '/health':
+            return 200, {'status': 'ok', 'tariffs': len(self.store.tariffs())}
+        return 404, {'error': f"Unbekannter Pfad: {path}"}
+
+    @staticmethod
+    async def _respond(writer: asyncio.StreamWriter, status: int, result: Dict[str, Any], keep_alive: bool):
+        reasons = {200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed",
+                   413: "Payload Too Large", 500: "Internal Server Error"}
+        body = json.dumps(result, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+        head = (f"HTTP/1.1 {status} {reasons.get(status, '')}\r\n"
+                f"Content-Type: application/json; charset=utf-8\r\n"
+                f"Content-Length: {len(body)}\r\n"
+                f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n").encode('latin-1')
+        writer.write(head + body)
+        try:
+            await writer.drain()
+        except ConnectionError:
+            pass
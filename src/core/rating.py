@@ -0,0 +1,178 @@
+import numpy as np
+import pandas as pd
+from typing import Dict, Optional, Tuple
+
+from .generator import quantity_column
+
+
+def _decimal_keys(values: np.ndarray) -> np.ndarray:
+    """
+    Bracket bounds as float64 of the decimal the user sees. float32 0.7 is 0.69999999,
+    so a shipment of exactly 0.7 would otherwise fall into the next bracket.
+    """
+    values = np.asarray(values)
+    if values.dtype == np.float32:
+        return values.astype(str).astype(np.float64)
+    return values.astype(np.float64)
+
+
+class _KindGrid:
+    """
+    The brackets of one order kind over the elementary intervals between all bracket
+    bounds: interval i of an axis holds the values in (keys[i-1], keys[i]]. Each table
+    row covers a rectangle of intervals; where rectangles overlap the bracket with the
+    smaller (max distance, max quantity) wins, as for a plain lookup of the smallest
+    bracket whose upper bounds are >= the shipment. Full grids and tables whose
+    neighbouring brackets were merged (see core.compaction) are indexed the same way.
+    """
+
+    def __init__(self, rows: np.ndarray, d_min, d_max, q_min, q_max):
+        d_lo, d_hi, q_lo, q_hi = d_min[rows], d_max[rows], q_min[rows], q_max[rows]
+        self.d_keys = np.unique(np.concatenate((d_lo, d_hi)))
+        self.q_keys = np.unique(np.concatenate((q_lo, q_hi)))
+        # Interval ranges [first, last] per row; the first interval also covers a lower bound
+        # equal to the smallest key, so the lowest bracket includes its minimum (e.g. 0)
+        d_first = np.searchsorted(self.d_keys, d_lo, side='left') + 1
+        d_first[d_first == 1] = 0
+        d_last = np.searchsorted(self.d_keys, d_hi, side='right') - 1
+        q_first = np.searchsorted(self.q_keys, q_lo, side='left') + 1
+        q_first[q_first == 1] = 0
+        q_last = np.searchsorted(self.q_keys, q_hi, side='right') - 1
+
+        # Rank of each row in lookup precedence; every cell keeps the lowest covering rank.
+        # One trailing interval per axis stays empty for values above the last key.
+        order = np.lexsort((q_hi, d_hi))
+        rank = np.empty(rows.size, dtype=np.int64)
+        rank[order] = np.arange(rows.size)
+        none = rows.size
+        ranks = np.full((self.d_keys.size + 1, self.q_keys.size + 1), none, dtype=np.int64)
+        single = (d_first == d_last) & (q_first == q_last)
+        np.minimum.at(ranks, (d_first[single], q_first[single]), rank[single])
+        for r in np.flatnonzero(~single & (d_first <= d_last) & (q_first <= q_last)).tolist():
+            cells = ranks[d_first[r]:d_last[r] + 1, q_first[r]:q_last[r] + 1]
+            np.minimum(cells, rank[r], out=cells)
+        self.cells = np.append(rows[order], -1)[ranks]
+        self.d_min = d_min
+        self.q_min = q_min
+
+    def lookup(self, distances: np.ndarray, quantities: np.ndarray) -> np.ndarray:
+        # Elementary interval of each value on both axes
+        i = np.searchsorted(self.d_keys, distances, side='left')
+        j = np.searchsorted(self.q_keys, quantities, side='left')
+        rows = self.cells[i, j]
+        # Values below the lowest bracket's minimum have no price; the comparisons also rule out NaN
+        safe = np.maximum(rows, 0)
+        hit = ((rows >= 0) & (distances >= self.d_min[safe]) & (quantities >= self.q_min[safe])
+               & (distances >= 0) & (quantities >= 0))
+        return np.where(hit, rows, -1)
+
+
+class BracketRater:
+    """
+    Prices shipments against a stepped tariff table (distance × weight/volume brackets,
+    optionally per order kind). The table is indexed once as one interval grid per order
+    kind; lookups are two np.searchsorted calls over the bracket bounds plus a grid
+    gather, so millions of shipments are priced in one vectorized pass.
+    """
+
+    def __init__(self, df: pd.DataFrame, distance_column: str = 'maxDistance',
+                 quantity_col: Optional[str] = None, price_column: str = 'price',
+                 order_kind_column: str = 'id_orderkind'):
+        columns = df.columns.tolist()
+        quantity_col = quantity_col or quantity_column(columns, distance_column)
+        for col in (distance_column, quantity_col, price_column):
+            if col is None or col not in columns:
+                raise ValueError(f"Spalte '{col}' ist im Tarif nicht vorhanden.")
+        self.quantity_column = quantity_col
+        self.price_column = price_column
+
+        d_max = df[distance_column].to_numpy()
+        q_max = df[quantity_col].to_numpy()
+        d_min = self._lower(df, distance_column, d_max)
+        q_min = self._lower(df, quantity_col, q_max)
+        d_max, q_max = _decimal_keys(d_max), _decimal_keys(q_max)
+        self.prices = df[price_column].to_numpy()
+        # Largest bracket bounds, e.g. to tell callers the covered range
+        self.max_distance = float(d_max.max()) if d_max.size else 0.0
+        self.max_quantity = float(q_max.max()) if q_max.size else 0.0
+        self.default_kind = None
+        self._grids: Dict[Optional[int], _KindGrid] = {}
+        if order_kind_column in columns:
+            kinds = df[order_kind_column].to_numpy().astype(np.int64)
+            for kind in np.unique(kinds):
+                rows = np.flatnonzero(kinds == kind)
+                self._grids[int(kind)] = _KindGrid(rows, d_min, d_max, q_min, q_max)
+            if len(self._grids) == 1:
+                self.default_kind = next(iter(self._grids))
+        else:
+            self._grids[None] = _KindGrid(np.arange(len(df)), d_min, d_max, q_min, q_max)
+
+    @staticmethod
+    def _lower(df: pd.DataFrame, max_column: str, max_values: np.ndarray) -> np.ndarray:
+        """Lower bounds from the matching min* column; 0 if the table has none."""
+        min_column = 'min' + max_column[3:]
+        if min_column in df.columns:
+            return _decimal_keys(df[min_column].to_numpy())
+        return np.zeros(max_values.size, dtype=np.float64)
+
+    def __len__(self):
+        return self.prices.size
+
+    @property
+    def order_kinds(self):
+        return [k for k in self._grids if k is not None]
+
+    def bracket_keys(self, order_kind: Optional[int] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """Sorted distinct (distance, quantity) bracket bounds of one order kind."""
+        grid = self._grids.get(order_kind if order_kind in self._grids else self.default_kind)
+        if grid is None:
+            empty = np.empty(0, dtype=np.float64)
+            return empty, empty
+        return grid.d_keys, grid.q_keys
+
+    def lookup(self, distances, quantities, order_kinds=None) -> np.ndarray:
+        """
+        Table row that prices each shipment, or -1 if no bracket covers it. order_kinds is
+        a scalar or one kind per shipment; it may be omitted for single-kind tariffs.
+        """
+        distances = np.asarray(distances, dtype=np.float64).reshape(-1)
+        quantities = np.asarray(quantities, dtype=np.float64).reshape(-1)
+        if distances.size != quantities.size:
+            raise ValueError("Entfernungen und Mengen müssen gleich viele Werte haben.")
+        if None in self._grids:
+            return self._grids[None].lookup(distances, quantities)
+        if order_kinds is None:
+            if self.default_kind is None:
+                raise ValueError("Tarif enthält mehrere Auftragsarten, bitte eine angeben.")
+            order_kinds = self.default_kind
+
+        kinds = np.asarray(order_kinds, dtype=np.int64)
+        if kinds.ndim == 0:
+            grid = self._grids.get(int(kinds))
+            if grid is None:
+                return np.full(distances.size, -1, dtype=np.int64)
+            return grid.lookup(distances, quantities)
+        kinds = kinds.reshape(-1)
+        rows = np.full(distances.size, -1, dtype=np.int64)
+        for kind in np.unique(kinds):
+            grid = self._grids.get(int(kind))
+            if grid is not None:
+                mask = kinds == kind
+                rows[mask] = grid.lookup(distances[mask], quantities[mask])
+        return rows
+
+    def price_rows(self, rows: np.ndarray, prices: Optional[np.ndarray] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        (prices, rated mask) for looked-up rows, in the price column's storage units
+        (cents for money columns). Unrated shipments get 0. prices may replace the
+        table's own price column, e.g. with a proposed bulk change.
+        """
+        prices = self.prices if prices is None else np.asarray(prices)
+        rated = rows >= 0
+        if prices.size == 0:
+            return np.zeros(rows.size, dtype=prices.dtype), rated
+        return np.where(rated, prices[np.where(rated, rows, 0)], 0), rated
+
+    def quote(self, distances, quantities, order_kinds=None) -> Tuple[np.ndarray, np.ndarray]:
+        """(prices, rated mask) per shipment; see lookup and price_rows."""
+        return self.price_rows(self.lookup(distances, quantities, order_kinds))
@@ -0,0 +1,177 @@
+import numpy as np
+import pandas as pd
+from typing import List, Optional
+
+from .rating import BracketRater
+
+
+class ShipmentFileError(ValueError):
+    """Raised when a shipment history cannot be read or lacks a required column."""
+
+
+def _pick(columns: List[str], candidates: List[str]) -> Optional[str]:
+    """First candidate present in columns, matched case-insensitively."""
+    lower = {c.lower(): c for c in columns}
+    for name in candidates:
+        if name and name.lower() in lower:
+            return lower[name.lower()]
+    return None
+
+
+def load_shipments(path: str, quantity_column: str = 'maxWeight', distance: Optional[str] = None,
+                   quantity: Optional[str] = None, order_kind: Optional[str] = None) -> pd.DataFrame:
+    """
+    Historical shipments from CSV or Parquet as a DataFrame with float64 'distance' and
+    'quantity' columns and, if the file has one, an int64 'order_kind' column. Column
+    names are matched case-insensitively; the quantity defaults to the tariff's axis
+    ('weight' for maxWeight, 'volume' for maxVolume) or 'quantity'. Only these columns
+    are read, so large files stay cheap. CSV files written by German Excel (semicolons,
+    decimal comma) are detected from the header line.
+    """
+    axis = quantity_column[3:] if quantity_column.startswith('max') else quantity_column
+    wanted = {'distance': [distance, 'distance', 'km', 'entfernung'],
+              'quantity': [quantity, axis, 'quantity', 'menge'],
+              'order_kind': [order_kind, 'order_kind', 'id_orderkind', 'orderkind']}
+
+    if path.lower().endswith(('.parquet', '.pq')):
+        try:
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise RuntimeError("Für Parquet-Dateien wird das Paket 'pyarrow' benötigt.")
+        columns = pq.read_schema(path).names
+        picked = {key: _pick(columns, names) for key, names in wanted.items()}
+        read = lambda cols: pd.read_parquet(path, columns=cols)
+    else:
+        try:
+            with open(path, 'r', encoding='utf-8-sig') as f:
+                header = f.readline()
+        except OSError as e:
+            raise ShipmentFileError(str(e))
+        german = header.count(';') > header.count(',')
+        sep = ';' if german else ','
+        columns = [c.strip().strip('"') for c in header.strip().split(sep)]
+        picked = {key: _pick(columns, names) for key, names in wanted.items()}
+        read = lambda cols: pd.read_csv(path, sep=sep, decimal=',' if german else '.', usecols=cols,
+                                        encoding='utf-8-sig', low_memory=False)
+
+    for key in ('distance', 'quantity'):
+        if picked[key] is None:
+            raise ShipmentFileError(f"Spalte für '{key}' nicht gefunden (vorhanden: {', '.join(columns)}).")
+    try:
+        raw = read([c for c in picked.values() if c is not None])
+    except (OSError, ValueError) as e:
+        raise ShipmentFileError(str(e))
+
+    data = {key: pd.to_numeric(raw[picked[key]], errors='coerce').to_numpy(dtype=np.float64, na_value=np.nan)
+            for key in ('distance', 'quantity')}
+    if picked['order_kind'] is not None:
+        kinds = pd.to_numeric(raw[picked['order_kind']], errors='coerce')
+        data['order_kind'] = kinds.fillna(-1).to_numpy().astype(np.int64)
+    return pd.DataFrame(data)
+
+
+class RevenueImpact:
+    """
+    Revenue of a shipment history under the current and a proposed price column.
+    Every shipment is looked up once; since all shipments of a bracket pay that
+    bracket's price, revenue per bracket is shipment count × price, computed with
+    one np.bincount in exact integer units (cents for money columns).
+    """
+
+    def __init__(self, table: pd.DataFrame, counts: np.ndarray, current: np.ndarray, proposed: np.ndarray,
+                 shipments: int, money: bool = True, bracket_columns: Optional[List[str]] = None):
+        self.table = table
+        self.counts = counts
+        self.current = current
+        self.proposed = proposed
+        self.shipments = shipments
+        self.rated = int(counts.sum())
+        self.money = money
+        self.bracket_columns = bracket_columns or []
+
+    def _units(self, values):
+        return np.asarray(values) / 100 if self.money else np.asarray(values, dtype=np.float64)
+
+    @property
+    def unrated(self) -> int:
+        return self.shipments - self.rated
+
+    @property
+    def current_revenue(self) -> np.ndarray:
+        """Revenue per table row (bracket) under the current prices."""
+        return self.counts * self.current
+
+    @property
+    def proposed_revenue(self) -> np.ndarray:
+        return self.counts * self.proposed
+
+    @property
+    def current_total(self) -> float:
+        return float(self._units(self.current_revenue.sum()))
+
+    @property
+    def proposed_total(self) -> float:
+        return float(self._units(self.proposed_revenue.sum()))
+
+    @property
+    def delta_total(self) -> float:
+        return float(self._units(self.proposed_revenue.sum() - self.current_revenue.sum()))
+
+    def bracket_frame(self) -> pd.DataFrame:
+        """Per-bracket report (brackets with at least one shipment), in table order."""
+        used = np.flatnonzero(self.counts)
+        frame = self.table.iloc[used][self.bracket_columns].reset_index(drop=True)
+        current, proposed = self.current_revenue[used], self.proposed_revenue[used]
+        frame['shipments'] = self.counts[used]
+        frame['price'] = self._units(self.current[used])
+        frame['new_price'] = self._units(self.proposed[used])
+        frame['revenue'] = self._units(current)
+        frame['new_revenue'] = self._units(proposed)
+        frame['delta'] = self._units(proposed - current) # Subtracted in exact units, then converted
+        return frame
+
+    def summary_lines(self, top: int = 10) -> List[str]:
+        """Plain text report shared by the bulk update dialog and the CLI."""
+        lines = [f"Sendungen: {self.shipments} (davon ohne passende Stufe: {self.unrated})"]
+        if self.rated == 0:
+            return lines
+        current, proposed, delta = self.current_total, self.proposed_total, self.delta_total
+        share = f" ({delta / current * 100:+.2f} %)" if current else ""
+        lines.append(f"Umsatz aktuell: {current:.2f}")
+        lines.append(f"Umsatz neu:     {proposed:.2f}")
+        lines.append(f"Differenz:      {delta:+.2f}{share}")
+
+        frame = self.bracket_frame()
+        frame = frame[frame['delta'] != 0]
+        if frame.empty:
+            return lines
+        lines.append(f"Größte Änderungen je Stufe ({len(frame)} Stufen betroffen):")
+        order = np.argsort(-np.abs(frame['delta'].to_numpy()), kind='stable')[:top]
+        for _, row in frame.iloc[order].iterrows():
+            bracket = ", ".join(f"{col} {row[col]:g}" for col in self.bracket_columns)
+            lines.append(f"  {bracket}: {int(row['shipments'])} Sendungen, {row['delta']:+.2f}")
+        return lines
+
+
+def simulate_revenue(table: pd.DataFrame, shipments: pd.DataFrame, proposed_prices,
+                     price_column: str = 'price', money: bool = True,
+                     rater: Optional[BracketRater] = None) -> RevenueImpact:
+    """
+    Prices the shipments (see load_shipments) against the table's price column and
+    against proposed_prices (the same column after a bulk change, one value per table
+    row). rater may be passed in to reuse an index built for the same table.
+    """
+    rater = rater or BracketRater(table, price_column=price_column)
+    # Shipments of an order kind the tariff does not price count as unrated
+    kinds = shipments['order_kind'].to_numpy() if 'order_kind' in shipments.columns else None
+    rows = rater.lookup(shipments['distance'].to_numpy(), shipments['quantity'].to_numpy(), kinds)
+    counts = np.bincount(rows[rows >= 0], minlength=len(rater)).astype(np.int64)
+
+    current = np.asarray(rater.prices)
+    proposed = np.asarray(proposed_prices)
+    if money:
+        current, proposed = current.astype(np.int64), proposed.astype(np.int64)
+    bracket_columns = [c for c in ('id_orderkind', 'minDistance', 'maxDistance',
+                                   'min' + rater.quantity_column[3:], rater.quantity_column)
+                       if c in table.columns]
+    return RevenueImpact(table, counts, current, proposed, len(shipments), money, bracket_columns)
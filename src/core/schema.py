@@ -0,0 +1,173 @@
+import numpy as np
+import pandas as pd
+from typing import Dict, List, Optional, Any
+
+# Storage types a definition may declare per column ("dtypes" in TariffDefinitions/*.json).
+# 'cents' is fixed-point money: int64 hundredths, formatted exactly as "123.45".
+SUPPORTED_DTYPES = {
+    'int8': np.int8,
+    'int16': np.int16,
+    'int32': np.int32,
+    'int64': np.int64,
+    'float32': np.float32,
+    'float64': np.float64,
+    'cents': np.int64,
+    'text': object,
+}
+
+MONEY_DTYPE = 'cents'
+
+# ".00" .. ".99", indexed by cents % 100
+_CENT_SUFFIXES = np.array([f".{i:02d}" for i in range(100)])
+
+
+def fits_float32(values: np.ndarray) -> bool:
+    """
+    True if every value keeps its two-decimal text as float32. float32 has about seven
+    significant digits, so bounds above ~1e5 lose cents (999999.99 becomes 999999.94).
+    """
+    values = np.asarray(values, dtype=np.float64)
+    finite = values[np.isfinite(values)]
+    narrowed = finite.astype(np.float32).astype(np.float64)
+    return bool(np.array_equal(np.round(narrowed * 100), np.round(finite * 100)))
+
+
+def infer_dtype(column: str) -> str:
+    """Fallback storage type for columns without a declared dtype, based on the naming conventions."""
+    lower = column.lower()
+    if column.startswith('id_'):
+        return 'int8'
+    if 'price' in lower or lower == 'rate':
+        return MONEY_DTYPE
+    if column.startswith('min') or column.startswith('max'):
+        return 'float32'
+    return 'float64'
+
+
+def to_cents(values) -> np.ndarray:
+    """Converts euro amounts (floats, numeric strings) to int64 cents. Unparseable values become 0."""
+    euros = pd.to_numeric(pd.Series(np.asarray(values, dtype=object).reshape(-1)), errors='coerce')
+    euros = euros.to_numpy(dtype=np.float64, na_value=np.nan)
+    return np.nan_to_num(np.round(euros * 100)).astype(np.int64)
+
+
+def format_cents(cents) -> np.ndarray:
+    """Exact integer formatting of cents as "123.45" strings, no float rounding involved."""
+    cents = np.asarray(cents, dtype=np.int64)
+    if cents.size == 0:
+        return np.empty(0, dtype=object)
+    magnitude = np.abs(cents)
+    text = np.char.add((magnitude // 100).astype(str), _CENT_SUFFIXES[magnitude % 100])
+    if (cents < 0).any():
+        text = np.where(cents < 0, np.char.add('-', text), text)
+    return text.astype(object)
+
+
+class TariffSchema:
+    """
+    Column layout of a tariff table with one storage dtype per column.
+    Built from a TariffDefinitions JSON (its optional "dtypes" map) or inferred from column names.
+    Money columns are held as int64 cents; everything the engine loads, imports or
+    bulk-updates goes through coerce_frame so the table keeps these compact types.
+    """
+
+    def __init__(self, columns: List[str], dtypes: Optional[Dict[str, str]] = None,
+                 defaults: Optional[Dict[str, Any]] = None):
+        self.columns = list(columns)
+        dtypes = dtypes or {}
+        self.dtypes = {}
+        for col in self.columns:
+            kind = dtypes.get(col) or infer_dtype(col)
+            if kind not in SUPPORTED_DTYPES:
+                raise ValueError(f"Unbekannter Datentyp '{kind}' für Spalte '{col}'")
+            self.dtypes[col] = kind
+        self.defaults = dict(defaults or {})
+
+    @classmethod
+    def from_definition(cls, definition: Dict, columns: Optional[List[str]] = None) -> "TariffSchema":
+        """Schema from a definition; columns (e.g. from a loaded XML) may override the column order."""
+        return cls(columns if columns is not None else definition.get('columns', []),
+                   definition.get('dtypes', {}), definition.get('defaults', {}))
+
+    def is_money(self, column: str) -> bool:
+        return self.dtypes.get(column) == MONEY_DTYPE
+
+    def numpy_dtype(self, column: str):
+        return SUPPORTED_DTYPES[self.dtypes.get(column) or infer_dtype(column)]
+
+    def coerce_column(self, column: str, values) -> np.ndarray:
+        """Converts values given in user units (euros for money) to the column's storage array."""
+        kind = self.dtypes.get(column) or infer_dtype(column)
+        values = np.asarray(values, dtype=object) if not isinstance(values, np.ndarray) else values
+        if kind == MONEY_DTYPE:
+            return to_cents(values)
+        if kind == 'text':
+            return np.array(['' if v is None else str(v) for v in values.reshape(-1)], dtype=object)
+
+        numeric = pd.to_numeric(pd.Series(values.reshape(-1)), errors='coerce').to_numpy(dtype=np.float64, na_value=np.nan)
+        target = SUPPORTED_DTYPES[kind]
+        if np.dtype(target).kind == 'i':
+            numeric = np.nan_to_num(np.round(numeric))
+            info = np.iinfo(target)
+            if numeric.size and (numeric.min() < info.min or numeric.max() > info.max):
+                target = np.int64 # Value range exceeds the declared id type, widen rather than wrap
+        elif target == np.float32 and not fits_float32(numeric):
+            target = np.float64 # Widen rather than change the bounds the file states
+        return numeric.astype(target)
+
+    def coerce_frame(self, df: pd.DataFrame) -> pd.DataFrame:
+        """Returns a DataFrame with every schema column stored in its declared dtype."""
+        data = {}
+        for col in df.columns:
+            data[col] = self.coerce_column(col, df[col].to_numpy()) if col in self.dtypes else df[col].to_numpy()
+        return pd.DataFrame(data, columns=df.columns)
+
+    def empty_frame(self) -> pd.DataFrame:
+        return pd.DataFrame({col: np.empty(0, dtype=self.numpy_dtype(col)) for col in self.columns},
+                            columns=self.columns)
+
+    def to_user_units(self, column: str, values) -> np.ndarray:
+        """Storage values as plain float64 user units (cents -> euros) for arithmetic."""
+        values = np.asarray(values)
+        if self.is_money(column):
+            return values.astype(np.float64) / 100
+        return pd.to_numeric(pd.Series(values.reshape(-1)), errors='coerce').to_numpy(dtype=np.float64, na_value=np.nan)
+
+    def format_column(self, column: str, values) -> np.ndarray:
+        """Vectorized XML text for a column: exact cents, integer ids, two decimals otherwise."""
+        values = np.asarray(values)
+        if values.dtype != object and values.size > 1024:
+            # Bracket and id columns repeat a handful of values; format each distinct value once
+            unique, inverse = np.unique(values, return_inverse=True)
+            if unique.size * 4 <= values.size:
+                return self._format_values(column, unique)[inverse.reshape(-1)]
+        return self._format_values(column, values)
+
+    def _format_values(self, column: str, values: np.ndarray) -> np.ndarray:
+        kind = self.dtypes.get(column) or infer_dtype(column)
+        if kind == MONEY_DTYPE:
+            return format_cents(values)
+        if kind == 'text' or values.dtype == object:
+            return np.array([_format_scalar(column, v) for v in values], dtype=object)
+        if values.dtype.kind in 'iu' and column.startswith('id_'):
+            return values.astype(str).astype(object)
+        return np.char.mod('%.2f', values.astype(np.float64)).astype(object)
+
+    def user_value(self, column: str, stored):
+        """Single stored value in user units (euros for money)."""
+        if self.is_money(column):
+            return int(stored) / 100
+        return stored
+
+    def memory_per_row(self) -> int:
+        """Bytes per row for the fixed-width columns (text columns count as one pointer)."""
+        return sum(np.dtype(self.numpy_dtype(col)).itemsize for col in self.columns)
+
+
+def _format_scalar(column: str, value) -> str:
+    """Formatting used by update_tuples for values in untyped (object) columns."""
+    if isinstance(value, (int, float, np.number)) and not isinstance(value, bool):
+        if column.startswith('id_'):
+            return str(int(value))
+        return f"{value:.2f}"
+    return str(value)
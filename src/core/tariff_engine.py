@@ -1,4 +1,5 @@
 import xml.etree.ElementTree as ET
+import numpy as np
 import pandas as pd
 from typing import List, Dict, Optional, Any
 import json
@@ -6,7 +7,15 @@ import datetime
 import os
 import copy
 
-from .utils import get_resource_path
+from .utils import get_resource_path, row_positions
+from .bulk_expression import BulkPreview, compile_bulk_expression
+from .schema import TariffSchema
+from .definition_registry import DefinitionRegistry
+from .money import ROUND_HALF_UP, percentage_factor, scale_cents
+from .generator import generate_grid
+from . import xml_stream
+from .byte_index import ByteIndex, leaf_text_edits, render_tuples, splice
+from .compressed_io import atomic_write_compressed, read_bytes, write_bytes_compressed
 
 class TariffEngine:
     def __init__(self):
@@ -16,21 +25,29 @@ class TariffEngine:
         self.namespace = None
         # Use utils to get path
         self.definitions_folder = get_resource_path("TariffDefinitions")
+        self.definitions = DefinitionRegistry(self.definitions_folder) # Parsed + validated JSON, cached by mtime
         self.parameter_template = None # XML Element to use as template for new rows
+        self.schema = None # TariffSchema with the storage dtype of every column
+        self.definition = None # Definition the current tariff was created from or resolved to
+        self.definition_name = None
+        self._defaults = None # get_parameter_defaults cache, reset whenever template or definition change
+        self._source_bytes = None # Raw bytes of the loaded file, kept for lossless saves
+        self._byte_index = None # ByteIndex over _source_bytes, built on the first lossless save
+        self._loaded_table = None # Table as loaded, to find which cells were edited
+        self.rounding_mode = ROUND_HALF_UP # Applied to money columns at every bulk step
+        self.compression_level = None # gzip/zstd level for .xml.gz / .xml.zst saves (None = default)
 
     def get_available_definitions(self) -> List[str]:
-        """Returns a list of available JSON definition files."""
-        if not os.path.exists(self.definitions_folder):
-            return []
-        return [f for f in os.listdir(self.definitions_folder) if f.endswith('.json')]
+        """Returns a list of available (valid) JSON definition files."""
+        return self.definitions.filenames()
 
     def create_from_definition(self, definition_filename: str) -> Dict:
         """
         Creates a new in-memory XML and DataFrame based on a JSON definition.
         """
-        def_path = os.path.join(self.definitions_folder, definition_filename)
-        with open(def_path, 'r', encoding='utf-8') as f:
-            definition = json.load(f)
+        definition = self.definitions.get(definition_filename)
+        self.definition, self.definition_name = definition, definition_filename
+        self._source_bytes, self._byte_index, self._loaded_table = None, None, None
 
         # 1. Create Basic XML Structure
         # Root <comtec>
@@ -83,9 +100,11 @@ class TariffEngine:
         # Actually create_from_definition sets up 'seed_tuple' in XML.
         # We should capture it as template.
         self.parameter_template = copy.deepcopy(seed_tuple)
+        self.schema = TariffSchema.from_definition(definition)
+        self._defaults = None
         
-        # Return EMPTY DataFrame
-        df = pd.DataFrame(columns=columns)
+        # Return EMPTY DataFrame, typed as declared in the definition
+        df = self.schema.empty_frame()
         
         # Ensure we construct the XML parameter_tuple structure correctly immediately
         self.update_tuples(df)
@@ -94,27 +113,88 @@ class TariffEngine:
 
 
     def load_template(self, file_path: str):
-        """Loads an XML template and parses it."""
+        """Loads an XML template (plain, .xml.gz or .xml.zst) and parses it."""
+        try:
+            raw = read_bytes(file_path)
+        except (OSError, RuntimeError) as e:
+            return False, f"Error loading template: {str(e)}"
+        return self.load_bytes(raw, file_path)
+
+    def load_bytes(self, raw: bytes, file_path: Optional[str] = None):
+        """Loads a comtec XML document given as bytes (a file, or one tariff item of a ComtecDocument)."""
         try:
             self.current_file_path = file_path
-            self.tree = ET.parse(file_path)
-            self.root = self.tree.getroot()
+            self.root = ET.fromstring(raw)
+            self.tree = ET.ElementTree(self.root)
+            self._source_bytes, self._byte_index, self._loaded_table = raw, None, None
             
             # Detect namespace if present (often comtec xmls have attributes but no explicit xmlns, 
             # but sometimes they might. For this specific file structure, standard parsing seems fine
             # as seen in the view_file output, it's just <comtec version="2014"> without xmlns)
             
             # Capture template if possible
+            self.parameter_template = None
             tuples_container = self.root.find('.//tariff_item/parameter_tuples')
             if tuples_container is not None:
                 first = tuples_container.find('parameter_tuple')
                 if first is not None:
                     self.parameter_template = copy.deepcopy(first)
 
+            self.schema = self._resolve_schema()
+            self._defaults = None
+
             return True, "Template loaded successfully."
         except Exception as e:
             return False, f"Error loading template: {str(e)}"
 
+    def _resolve_schema(self) -> TariffSchema:
+        """
+        Schema for the loaded XML. The tariff is matched to its definition by spec_name
+        and column signature; that definition then supplies dtypes and defaults.
+        """
+        columns = []
+        if self.parameter_template is not None:
+            columns = [p.findtext('code') for p in self.parameter_template.findall('parameter') if p.findtext('code')]
+        spec = self.root.findtext('.//tariff_item/tariff_item_spec', '') if self.root is not None else ''
+        match = self.definitions.resolve(spec, columns)
+        if match is None:
+            self.definition, self.definition_name = None, None
+            return TariffSchema(columns)
+        self.definition_name, self.definition = match
+        return TariffSchema.from_definition(self.definition, columns)
+
+    def definition_issues(self) -> List[str]:
+        """Differences between the loaded tariff and its definition (empty if it matches)."""
+        if self.definition is None:
+            return ["Keine passende Tarif-Definition gefunden."]
+        issues = []
+        columns = self.schema.columns if self.schema is not None else []
+        missing = [c for c in self.definition['columns'] if c not in columns]
+        extra = [c for c in columns if c not in self.definition['columns']]
+        if missing:
+            issues.append(f"Fehlende Spalten: {', '.join(missing)}")
+        if extra:
+            issues.append(f"Zusätzliche Spalten: {', '.join(extra)}")
+        spec = self.root.findtext('.//tariff_item/tariff_item_spec', '') if self.root is not None else ''
+        if spec and spec != self.definition['spec_name']:
+            issues.append(f"Spezifikation '{spec}' weicht von '{self.definition['spec_name']}' ab.")
+        return issues
+
+    def coerce_frame(self, df: pd.DataFrame) -> pd.DataFrame:
+        """Converts a DataFrame in user units (euros, plain floats) to the schema's storage dtypes."""
+        if self.schema is None:
+            self.schema = TariffSchema(df.columns.tolist())
+        return self.schema.coerce_frame(df)
+
+    def load_table(self) -> pd.DataFrame:
+        """Extracts the tuples of the loaded XML as a typed DataFrame."""
+        result = self.extract_tuples_check_schema()
+        df = pd.DataFrame(result['data'], columns=result['schema'])
+        df = self.coerce_frame(df)
+        if self._source_bytes is not None:
+            self._loaded_table = df.copy()
+        return df
+
     def get_metadata(self) -> Dict[str, str]:
         """Extracts high-level metadata like ID, Name, Validity."""
         if not self.root:
@@ -244,6 +324,7 @@ class TariffEngine:
         elif all_tuples:
             template_tuple = copy.deepcopy(all_tuples[0])
             self.parameter_template = template_tuple # cache it
+            self._defaults = None
         else:
             return
         
@@ -253,8 +334,12 @@ class TariffEngine:
         for child in list(tuples_container):
             tuples_container.remove(child)
 
+        schema = self._sync_schema(df.columns.tolist())
+
         # 3. Rebuild based on DataFrame
-        for _, row in df.iterrows():
+        # Values are formatted column-wise up front (exact cents for money columns)
+        formatted = {col: schema.format_column(col, df[col].to_numpy()) for col in df.columns}
+        for i in range(len(df)):
             # Create a new tuple from template
             new_tuple = copy.deepcopy(template_tuple)
             
@@ -263,46 +348,156 @@ class TariffEngine:
                 code = param.findtext('code')
                 val_elem = param.find('value')
                 
-                if code in row and val_elem is not None:
-                    new_val = row[code]
-                    if isinstance(new_val, (int, float)):
-                        # Special handling for IDs or clean integers
-                        if code.startswith('id_'):
-                            val_elem.text = str(int(new_val))
-                        elif isinstance(new_val, float) and new_val.is_integer() and 'price' not in code.lower():
-                             # Optional: also strip .00 for other non-price integer-like floats if desired
-                             # But user specifically mentioned IDs. Let's stick to IDs being strict ints.
-                             # Actually, let's just properly format based on value if it's not a price/rate might be risky.
-                             # Safer: Explicit checks for known int columns? Or just id_ prefix.
-                             # Let's trust id_ prefix for now as it's standard here.
-                             val_elem.text = f"{new_val:.2f}"
-                        else:
-                            val_elem.text = f"{new_val:.2f}"
-                    else:
-                        val_elem.text = str(new_val)
+                if code in formatted and val_elem is not None:
+                    val_elem.text = formatted[code][i]
             
             # Append to container
             tuples_container.append(new_tuple)
 
+    def _sync_schema(self, columns: List[str]) -> TariffSchema:
+        """Keeps the cached schema in step with the table's columns."""
+        if self.schema is None or self.schema.columns != columns:
+            known = self.schema.dtypes if self.schema is not None else {}
+            defaults = self.schema.defaults if self.schema is not None else {}
+            self.schema = TariffSchema(columns, {c: known[c] for c in columns if c in known}, defaults)
+        return self.schema
+
+    def save_streaming(self, df: pd.DataFrame, output_path: str, chunk_rows: int = 20_000):
+        """
+        Writes the tariff with the rows of df straight to disk. Unlike update_tuples +
+        save_to_file no element is built per row: the template tuple becomes a text
+        pattern and the column-formatted values are written chunk by chunk.
+        The in-memory tree keeps its previous tuples.
+        """
+        if not self.root:
+            return
+        template = self.parameter_template
+        if template is None:
+            template = self.root.find('.//tariff_item/parameter_tuples/parameter_tuple')
+        if template is None:
+            raise ValueError("Keine Parameter-Vorlage vorhanden.")
+
+        schema = self._sync_schema(df.columns.tolist())
+        head, tail, level = xml_stream.split_skeleton(self.root)
+        pattern, order = xml_stream.tuple_format(template, df.columns.tolist(), level)
+        arrays = [df[col].to_numpy() for col in order]
+
+        def chunks():
+            for start in range(0, len(df), chunk_rows):
+                stop = min(start + chunk_rows, len(df))
+                formatted = []
+                for col, values in zip(order, arrays):
+                    text = schema.format_column(col, values[start:stop])
+                    if schema.dtypes.get(col) == 'text':
+                        text = xml_stream.escape_column(text)
+                    formatted.append(text)
+                yield formatted
+
+        with atomic_write_compressed(output_path, "w", encoding="utf-8", level=self.compression_level) as f:
+            xml_stream.write_stream(f, head, tail, pattern, chunks())
+
+    def can_save_lossless(self) -> bool:
+        """True if the table came from a file whose tuples can be spliced (see save_lossless)."""
+        if self._source_bytes is None or self._loaded_table is None:
+            return False
+        if self._byte_index is None:
+            self._byte_index = ByteIndex(self._source_bytes)
+        return len(self._byte_index) > 0
+
+    def save_lossless(self, df: pd.DataFrame, origins: np.ndarray, output_path: str):
+        """Writes render_lossless(df, origins) to output_path."""
+        write_bytes_compressed(output_path, self.render_lossless(df, origins), self.compression_level)
+
+    def render_lossless(self, df: pd.DataFrame, origins: np.ndarray) -> bytes:
+        """
+        Copies the loaded file byte for byte and splices in only what changed:
+        edited parameter values, deleted and added tuples and edited metadata texts.
+        Whitespace, comments and unknown elements everywhere else stay untouched, and
+        the work is proportional to the number of edits. origins gives, per row of df,
+        the tuple it was loaded from (-1 for new rows).
+        """
+        if not self.can_save_lossless():
+            raise ValueError("Verlustfreies Speichern ist nur für geladene Dateien mit Tupeln möglich.")
+        index = self._byte_index
+        loaded = self._loaded_table
+        schema = self._sync_schema(df.columns.tolist())
+        origins = np.asarray(origins, dtype=np.int64)
+
+        def encode(col, values):
+            texts = schema.format_column(col, values)
+            return [index.encode_text(str(t)) for t in texts]
+
+        # Edited cells of loaded rows, found by comparing against the table as loaded
+        cell_texts = {}
+        rows = np.flatnonzero(origins >= 0)
+        for col in df.columns:
+            if col not in loaded.columns or col not in index.values:
+                continue
+            current = df[col].to_numpy()[rows]
+            original = loaded[col].to_numpy()[origins[rows]]
+            changed = current != original
+            if current.dtype.kind == 'f' and original.dtype.kind == 'f':
+                changed &= ~(np.isnan(current) & np.isnan(original))
+            changed_rows = rows[changed]
+            if changed_rows.size:
+                cell_texts[col] = dict(zip(changed_rows.tolist(), encode(col, current[changed])))
+
+        # Added rows are rendered from the last tuple of the file
+        new_rows = {}
+        added = np.flatnonzero(origins < 0)
+        if added.size:
+            columns = {col: encode(col, df[col].to_numpy()[added]) for col in df.columns}
+            for i, row in enumerate(added.tolist()):
+                new_rows[row] = {col: texts[i] for col, texts in columns.items()}
+
+        edits = render_tuples(index, origins, cell_texts, new_rows, len(index) - 1)
+        edits += leaf_text_edits(index, self.root)
+        return splice(index.raw, edits)
+
+    def generate_grid(self, distance_breakpoints, quantity_breakpoints, pricing, order_kind: Optional[int] = None,
+                      quantity_col: Optional[str] = None) -> pd.DataFrame:
+        """Stepped bracket table for the current schema, see core.generator.generate_grid."""
+        if self.schema is None:
+            raise ValueError("Kein Tarif geladen.")
+        defaults = self.get_parameter_defaults()
+        if order_kind is not None:
+            defaults['id_orderkind'] = order_kind
+        return generate_grid(self.schema, distance_breakpoints, quantity_breakpoints, pricing,
+                             defaults, self.rounding_mode, quantity_col=quantity_col)
+
+    def render_xml(self) -> str:
+        """The tree as pretty printed XML text (what save_to_file writes)."""
+        # Use minidom to pretty print
+        import xml.dom.minidom
+        xml_str = ET.tostring(self.root, encoding='utf-8')
+        parsed = xml.dom.minidom.parseString(xml_str)
+        pretty_xml = parsed.toprettyxml(indent="  ")
+        
+        # Remove extra newlines sometimes caused by toprettyxml on text nodes
+        # A simple way is to filter empty lines if they are problematic, 
+        # but usually standard pretty print is enough.
+        # However, minidom adds declaration <?xml ... ?> automatically.
+        return pretty_xml
+
     def save_to_file(self, output_path: str):
-        """Saves the modified tree to a new XML file with pretty printing."""
+        """
+        Saves the modified tree to a new XML file with pretty printing.
+        Like every save, it goes to a temp file that replaces output_path only once complete;
+        a .xml.gz / .xml.zst path is compressed on the way (see core.compressed_io).
+        """
         if self.root:
-            # Use minidom to pretty print
-            import xml.dom.minidom
-            xml_str = ET.tostring(self.root, encoding='utf-8')
-            parsed = xml.dom.minidom.parseString(xml_str)
-            pretty_xml = parsed.toprettyxml(indent="  ")
-            
-            # Remove extra newlines sometimes caused by toprettyxml on text nodes
-            # A simple way is to filter empty lines if they are problematic, 
-            # but usually standard pretty print is enough.
-            # However, minidom adds declaration <?xml ... ?> automatically.
-            
-            with open(output_path, "w", encoding="utf-8") as f:
+            pretty_xml = self.render_xml()
+            with atomic_write_compressed(output_path, "w", encoding="utf-8", level=self.compression_level) as f:
                 f.write(pretty_xml)
 
-    def apply_bulk_change(self, df: pd.DataFrame, column: str, percentage: float, rows: List[int] = None) -> pd.DataFrame:
-        """Applies a percentage change to a column in the DataFrame, optionally only on specific rows."""
+    def apply_bulk_change(self, df: pd.DataFrame, column: str, percentage: float, rows=None,
+                          rounding: Optional[str] = None) -> pd.DataFrame:
+        """
+        Applies a percentage change to a column in the DataFrame, optionally only on specific rows.
+        rows may be a boolean mask or an array of positional row numbers (sorted int64 from the view).
+        Money columns are scaled exactly in integer cents and rounded with the rounding mode
+        (defaults to self.rounding_mode).
+        """
         if column in df.columns:
             # Attempt to convert to numeric (coercing errors to NaN, then we can check)
             # This fixes issues where 'Object' columns contain numbers but were initialized as strings
@@ -321,24 +516,54 @@ class TariffEngine:
             if pd.api.types.is_numeric_dtype(df[column]):
                 multiplier = (1 + percentage / 100)
                 if rows is not None and len(rows) > 0:
-                    # Apply only to specific rows
-                    # Use df.loc[rows, column] to update specific cells
-                    # Ensure rows are valid indices
-                    valid_rows = [r for r in rows if r in df.index]
-                    if valid_rows:
-                        df.loc[valid_rows, column] = df.loc[valid_rows, column] * multiplier
+                    # Apply only to specific rows, positionally and in one vectorized step
+                    positions = row_positions(rows, len(df))
                 else:
                     # Apply to all
-                    df[column] = df[column] * multiplier
+                    positions = np.arange(len(df))
+                if positions.size:
+                    # Calculate in user units (euros) and store back in the column's dtype (cents)
+                    schema = self.schema or TariffSchema(df.columns.tolist())
+                    stored = df[column].to_numpy()
+                    if schema.is_money(column):
+                        changed = scale_cents(stored[positions], percentage_factor(percentage),
+                                              rounding or self.rounding_mode)
+                    else:
+                        changed = schema.coerce_column(column, schema.to_user_units(column, stored[positions]) * multiplier)
+                    values = stored.astype(np.result_type(stored.dtype, changed.dtype))
+                    values[positions] = changed
+                    df[column] = values
         return df
 
+    def preview_bulk_expression(self, df: pd.DataFrame, expression: str, rows=None,
+                                rounding: Optional[str] = None) -> BulkPreview:
+        """
+        Dry-run of an expression-based bulk update, e.g.
+        'price = price * 1.035 + 0.5 where maxDistance > 200 round 2 min 10'.
+        Returns the affected rows and per-row deltas without touching the DataFrame.
+        """
+        rule = compile_bulk_expression(expression, df.columns.tolist())
+        return rule.evaluate(df, rows, self.schema, rounding or self.rounding_mode)
+
+    def apply_bulk_expression(self, df: pd.DataFrame, expression: str, rows=None,
+                              rounding: Optional[str] = None) -> pd.DataFrame:
+        """Applies an expression-based bulk update in a single vectorized pass."""
+        preview = self.preview_bulk_expression(df, expression, rows, rounding)
+        return preview.apply(df)
+
     def get_current_schema(self) -> List[str]:
-        """Returns the list of columns for the current tariff."""
-        res = self.extract_tuples_check_schema()
-        return res.get('schema', [])
+        """Returns the list of columns for the current tariff (from the cached schema, no tree walk)."""
+        return list(self.schema.columns) if self.schema is not None else []
 
     def get_parameter_defaults(self) -> Dict[str, Any]:
-        """Returns default values from the current parameter template."""
+        """
+        Default values for new rows: the matched definition's defaults,
+        falling back to the values of the XML parameter template.
+        Computed once per template/definition and cached.
+        """
+        if self._defaults is not None:
+            return dict(self._defaults)
+
         defaults = {}
         if self.parameter_template:
             for param in self.parameter_template.findall('parameter'):
@@ -350,21 +575,23 @@ class TariffEngine:
                         defaults[code] = float(val_text)
                     except (ValueError, TypeError):
                         defaults[code] = val_text if val_text else ""
-        return defaults
+        if self.definition is not None:
+            template_kind = defaults.get('id_orderkind')
+            defaults.update(self.definition.get('defaults', {}))
+            if template_kind is not None:
+                # The order kind belongs to the tariff (Distribution/Return), not to the definition
+                defaults['id_orderkind'] = template_kind
+        self._defaults = defaults
+        return dict(defaults)
+
     def set_order_kind(self, df: pd.DataFrame, order_kind_value: int):
-        """Sets the id_orderkind for all rows."""
+        """Copy of df with id_orderkind set for all rows; df itself is left unchanged."""
         if 'id_orderkind' in df.columns:
-             df['id_orderkind'] = order_kind_value
+            return df.assign(id_orderkind=order_kind_value)
         return df
 
     def save_definition(self, data: Dict, filename: str) -> str:
-        """Saves a new tariff definition JSON file."""
-        if not filename.endswith('.json'):
-            filename += '.json'
-        
-        path = os.path.join(self.definitions_folder, filename)
-        with open(path, 'w', encoding='utf-8') as f:
-            json.dump(data, f, indent=4)
-        return path
+        """Validates and saves a new tariff definition JSON file."""
+        return self.definitions.save(data, filename)
 
 
@@ -0,0 +1,389 @@
+import datetime
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import zlib
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from .compressed_io import tariff_stem
+from .comtec_document import ComtecDocument
+from .dedupe import bracket_key_columns
+from .rating import BracketRater
+from .schema import MONEY_DTYPE, TariffSchema, infer_dtype
+from .tariff_engine import TariffEngine
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS chunks (
+    hash TEXT PRIMARY KEY,
+    size INTEGER NOT NULL,
+    data BLOB NOT NULL
+);
+CREATE TABLE IF NOT EXISTS versions (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    tariff TEXT NOT NULL,
+    label TEXT,
+    valid_from TEXT,
+    source TEXT,
+    added TEXT NOT NULL,
+    rows INTEGER NOT NULL,
+    skeleton TEXT NOT NULL,
+    manifest TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS versions_tariff ON versions (tariff, valid_from, id);
+"""
+
+_YEAR_SUFFIX = re.compile(r'[_\- ]?(?:19|20)\d{2}$')
+_ITEM_START = re.compile(rb'<tariff_item[\s/>]')
+
+
+class HistoryError(ValueError):
+    """Raised for unknown tariffs, versions or brackets in the history store."""
+
+
+def tariff_name(path: str) -> str:
+    """History name of a tariff file: the file name without extension and trailing year."""
+    stem = tariff_stem(path)
+    return _YEAR_SUFFIX.sub('', stem) or stem
+
+
+def chunk_bounds(df: pd.DataFrame, target_rows: int = 1024, max_rows: int = 8192) -> np.ndarray:
+    """
+    Row positions where chunks end. A chunk ends after every row whose bracket key hashes
+    to 0 modulo target_rows (and after max_rows rows without such a row), so boundaries
+    depend on the bracket content, not on row positions: inserting or deleting brackets
+    only changes the chunks around the edit, and an uplift of the price column leaves the
+    chunks of every other column unchanged. All columns share the same boundaries.
+    """
+    n = len(df)
+    keys = bracket_key_columns(df.columns.tolist()) or df.columns.tolist()
+    if n == 0:
+        return np.zeros(0, dtype=np.int64)
+    hashes = pd.util.hash_pandas_object(df[keys], index=False).to_numpy()
+    cuts = np.flatnonzero(hashes % np.uint64(target_rows) == 0) + 1
+    bounds = []
+    last = 0
+    for cut in np.append(cuts[cuts < n], n).tolist():
+        while cut - last > max_rows:
+            last += max_rows
+            bounds.append(last)
+        bounds.append(cut)
+        last = cut
+    return np.array(bounds, dtype=np.int64)
+
+
+def encode_column(values: np.ndarray) -> Tuple[str, bytes]:
+    """(dtype tag, bytes) of one column chunk: raw little-endian numbers or a JSON list of texts."""
+    if values.dtype == object:
+        return 'text', json.dumps(['' if v is None else str(v) for v in values.tolist()]).encode('utf-8')
+    values = values.astype(values.dtype.newbyteorder('<'), copy=False)
+    return values.dtype.str, np.ascontiguousarray(values).tobytes()
+
+
+def decode_column(dtype: str, payload: bytes) -> np.ndarray:
+    if dtype == 'text':
+        return np.array(json.loads(payload.decode('utf-8')), dtype=object)
+    return np.frombuffer(payload, dtype=np.dtype(dtype)).astype(np.dtype(dtype).newbyteorder('='))
+
+
+def tuple_skeleton(raw: bytes) -> bytes:
+    """
+    The file (a single tariff item) without its tuples except the first, which is kept as
+    the template for new rows. A byte search for the first and last closing tag is enough
+    here and much cheaper than a ByteIndex pass over every tuple; it would cut out whole
+    items of a multi-item file, which is therefore refused (split it with item_document).
+    """
+    if len(_ITEM_START.findall(raw)) > 1:
+        raise ValueError("Mehrere Tarifpositionen in einem Dokument, bitte einzeln übergeben.")
+    first = raw.find(b'</parameter_tuple>')
+    last = raw.rfind(b'</parameter_tuple>')
+    if first < 0 or first == last:
+        return raw
+    return raw[:first] + raw[last:]
+
+
+def _chunk_hashes(skeleton: str, manifest: Dict[str, Any]) -> List[str]:
+    return [skeleton] + [h for c in manifest['columns'] for h in c['chunks']]
+
+
+class TariffVersion:
+    """One stored version of a tariff (a row of the versions table)."""
+
+    def __init__(self, row: sqlite3.Row):
+        self.id = row['id']
+        self.tariff = row['tariff']
+        self.label = row['label']
+        self.valid_from = row['valid_from']
+        self.source = row['source']
+        self.added = row['added']
+        self.rows = row['rows']
+        self.skeleton = row['skeleton']
+        self.manifest = json.loads(row['manifest'])
+
+    @property
+    def columns(self) -> List[str]:
+        return [c['name'] for c in self.manifest['columns']]
+
+    def is_money(self, column: str) -> bool:
+        entry = next((c for c in self.manifest['columns'] if c['name'] == column), {})
+        return entry.get('kind', infer_dtype(column)) == MONEY_DTYPE
+
+    def chunk_hashes(self) -> List[str]:
+        return _chunk_hashes(self.skeleton, self.manifest)
+
+    def summary_line(self) -> str:
+        return (f"{self.id:>5}  {self.tariff}  {self.label or '-'}  gültig ab {self.valid_from or '-'}  "
+                f"{self.rows} Zeilen  ({os.path.basename(self.source or '') or 'ohne Quelle'}, {self.added})")
+
+
+class TariffHistory:
+    """
+    Versions of tariff tables in one SQLite file. Every version is split into column
+    chunks along content-defined row boundaries (see chunk_bounds); a chunk is stored
+    zlib-compressed under the SHA-256 of its dtype and bytes, so chunks that did not
+    change between two yearly versions (ids, bounds, untouched price columns) are stored
+    once. The tariff file without its tuples is stored the same way. A version is a small
+    JSON manifest listing the chunk hashes of each column.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._conn = sqlite3.connect(path)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.executescript(_SCHEMA)
+        self._cache: Dict[str, np.ndarray] = {} # Decoded chunks of the current query
+
+    def close(self):
+        self._conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    # --- Writing ---
+
+    def _put(self, dtype: str, payload: bytes) -> Tuple[str, int]:
+        """Stores a chunk unless it exists; returns (hash, bytes added to the store)."""
+        digest = hashlib.sha256(dtype.encode('ascii') + b'\0' + payload).hexdigest()
+        if self._conn.execute("SELECT 1 FROM chunks WHERE hash = ?", (digest,)).fetchone():
+            return digest, 0
+        data = zlib.compress(payload, 6)
+        self._conn.execute("INSERT INTO chunks (hash, size, data) VALUES (?, ?, ?)", (digest, len(payload), data))
+        return digest, len(data)
+
+    def add(self, df: pd.DataFrame, skeleton: bytes, tariff: str, label: Optional[str] = None,
+            valid_from: Optional[str] = None, source: Optional[str] = None,
+            schema: Optional[TariffSchema] = None) -> Tuple[int, int]:
+        """
+        Stores a table as a new version; returns (version id, compressed bytes added).
+        The schema's column kinds are kept so money columns are recognized when reading.
+        """
+        schema = schema or TariffSchema(df.columns.tolist())
+        bounds = chunk_bounds(df)
+        starts = np.concatenate(([0], bounds[:-1])).tolist()
+        added = 0
+        with self._conn:
+            skeleton_hash, size = self._put('xml', skeleton)
+            added += size
+            columns = []
+            for col in df.columns:
+                values = df[col].to_numpy()
+                hashes = []
+                for start, stop in zip(starts, bounds.tolist()):
+                    dtype, payload = encode_column(values[start:stop])
+                    digest, size = self._put(dtype, payload)
+                    hashes.append(digest)
+                    added += size
+                columns.append({'name': col, 'dtype': encode_column(values[:0])[0], 'chunks': hashes,
+                                'kind': schema.dtypes.get(col) or infer_dtype(col)})
+            manifest = {'columns': columns}
+            cursor = self._conn.execute(
+                "INSERT INTO versions (tariff, label, valid_from, source, added, rows, skeleton, manifest) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (tariff, label, valid_from, source, datetime.datetime.now().isoformat(timespec='seconds'),
+                 len(df), skeleton_hash, json.dumps(manifest)))
+        return cursor.lastrowid, added
+
+    def add_file(self, path: str, tariff: Optional[str] = None,
+                 label: Optional[str] = None) -> List[Tuple[str, int, int]]:
+        """
+        Stores a tariff XML file as a new version of tariff (default: the file name without
+        its year, so ..._TARIF_2024.xml and ..._TARIF_2025.xml are versions of one tariff).
+        Each item of a multi-item file is a tariff of its own, named "tariff:1", "tariff:2", ...
+        as in the quote service and the repository. The label defaults to the year in the
+        file name or the tariff's valid_from date. Returns (tariff, version id, compressed
+        bytes added) per item.
+        """
+        document = ComtecDocument.open(path)
+        items = document.items()
+        if not items:
+            raise HistoryError(f"{path} enthält keine Tarifposition.")
+        tariff = tariff or tariff_name(path)
+        year = _YEAR_SUFFIX.search(tariff_stem(path))
+        engine = TariffEngine()
+        loaded = []
+        for position, item in enumerate(items):
+            # A single item is the file itself; item_document would reformat the whitespace around it
+            raw = document.raw if len(items) == 1 else document.item_document(item)
+            success, msg = engine.load_bytes(raw, path)
+            if not success:
+                raise HistoryError(msg)
+            meta = engine.get_metadata()
+            name = tariff if len(items) == 1 else f"{tariff}:{position + 1}"
+            loaded.append((name, engine.load_table(), tuple_skeleton(raw), meta, engine.schema))
+
+        # Parse every item first, so a broken item stores nothing
+        added = []
+        for name, df, skeleton, meta, schema in loaded:
+            item_label = label or (year.group(0).lstrip('_- ') if year else meta.get('valid_from'))
+            version_id, size = self.add(df, skeleton, name, item_label, meta.get('valid_from') or None,
+                                        os.path.abspath(path), schema)
+            added.append((name, version_id, size))
+        return added
+
+    def delete(self, version_id: int):
+        """Removes a version and every chunk no other version uses."""
+        version = self.version(version_id)
+        with self._conn:
+            self._conn.execute("DELETE FROM versions WHERE id = ?", (version.id,))
+            used = set()
+            for row in self._conn.execute("SELECT skeleton, manifest FROM versions"):
+                used.update(_chunk_hashes(row['skeleton'], json.loads(row['manifest'])))
+            orphans = [(h,) for h in set(version.chunk_hashes()) - used]
+            self._conn.executemany("DELETE FROM chunks WHERE hash = ?", orphans)
+
+    # --- Reading ---
+
+    def tariffs(self) -> List[str]:
+        return [r[0] for r in self._conn.execute("SELECT DISTINCT tariff FROM versions ORDER BY tariff")]
+
+    def versions(self, tariff: Optional[str] = None) -> List[TariffVersion]:
+        """Versions of one or all tariffs, oldest first (by valid_from, then by insertion)."""
+        if tariff is None:
+            rows = self._conn.execute("SELECT * FROM versions ORDER BY tariff, valid_from, id")
+        else:
+            rows = self._conn.execute("SELECT * FROM versions WHERE tariff = ? ORDER BY valid_from, id", (tariff,))
+        return [TariffVersion(r) for r in rows]
+
+    def version(self, version_id: int) -> TariffVersion:
+        row = self._conn.execute("SELECT * FROM versions WHERE id = ?", (int(version_id),)).fetchone()
+        if row is None:
+            raise HistoryError(f"Version {version_id} ist nicht im Archiv.")
+        return TariffVersion(row)
+
+    def _chunks(self, dtype: str, hashes: List[str]) -> List[np.ndarray]:
+        missing = [h for h in dict.fromkeys(hashes) if h not in self._cache]
+        for start in range(0, len(missing), 500): # SQLite limits the number of parameters
+            batch = missing[start:start + 500]
+            rows = self._conn.execute(f"SELECT hash, data FROM chunks WHERE hash IN ({','.join('?' * len(batch))})",
+                                      batch)
+            for digest, data in rows:
+                self._cache[digest] = decode_column(dtype, zlib.decompress(data))
+        return [self._cache[h] for h in hashes]
+
+    def _column(self, version: TariffVersion, column: str) -> np.ndarray:
+        entry = next((c for c in version.manifest['columns'] if c['name'] == column), None)
+        if entry is None:
+            raise HistoryError(f"Spalte '{column}' fehlt in Version {version.id}.")
+        parts = self._chunks(entry['dtype'], entry['chunks'])
+        if not parts:
+            return decode_column(entry['dtype'], b'[]' if entry['dtype'] == 'text' else b'')
+        return np.concatenate(parts)
+
+    def frame(self, version: TariffVersion, columns: Optional[List[str]] = None) -> pd.DataFrame:
+        """The table of a version (or only some of its columns) with its stored dtypes."""
+        columns = columns or version.columns
+        try:
+            return pd.DataFrame({col: self._column(version, col) for col in columns}, columns=columns)
+        finally:
+            self._cache.clear()
+
+    def checkout(self, version_id: int) -> Tuple[TariffEngine, pd.DataFrame]:
+        """
+        A TariffEngine with the version's tariff header loaded plus its table, ready for
+        editing or for save_streaming / update_tuples + save_to_file.
+        """
+        version = self.version(version_id)
+        skeleton = zlib.decompress(self._conn.execute("SELECT data FROM chunks WHERE hash = ?",
+                                                      (version.skeleton,)).fetchone()[0])
+        engine = TariffEngine()
+        success, msg = engine.load_bytes(skeleton, version.source)
+        if not success:
+            raise HistoryError(msg)
+        return engine, self.frame(version)
+
+    def price_history(self, tariff: str, bracket: Optional[Dict[str, float]] = None,
+                      at: Optional[Tuple[float, float]] = None, order_kind: Optional[int] = None,
+                      column: str = 'price') -> pd.DataFrame:
+        """
+        Value of column for one bracket in every version of tariff, oldest first. The bracket
+        is given either by key values (bracket = {'maxDistance': 100, 'maxWeight': 50}; every
+        given column must match exactly one row) or by a shipment at = (distance, quantity)
+        priced with BracketRater, which follows the bracket even if its bounds moved between
+        versions. Only the needed columns are read, and chunks shared between versions are
+        decoded once. Money values are returned in euros; versions without a match get NaN.
+        """
+        versions = self.versions(tariff)
+        if not versions:
+            raise HistoryError(f"Tarif '{tariff}' ist nicht im Archiv.")
+        if (bracket is None) == (at is None):
+            raise HistoryError("Entweder Stufenwerte oder eine Sendung (Entfernung, Menge) angeben.")
+
+        records = []
+        try:
+            for version in versions:
+                if column not in version.columns:
+                    raise HistoryError(f"Spalte '{column}' fehlt in Version {version.id}.")
+                row = -1
+                if bracket is not None:
+                    match = np.ones(version.rows, dtype=bool)
+                    for key, value in bracket.items():
+                        values = self._column(version, key)
+                        match &= values == np.asarray(value).astype(values.dtype)
+                    found = np.flatnonzero(match)
+                    if found.size > 1:
+                        raise HistoryError(f"Die Stufe ist in Version {version.id} nicht eindeutig "
+                                           f"({found.size} Zeilen), weitere Spalten angeben.")
+                    row = int(found[0]) if found.size else -1
+                else:
+                    wanted = [c for c in version.columns if c.startswith(('min', 'max')) or c == 'id_orderkind']
+                    table = pd.DataFrame({c: self._column(version, c) for c in wanted + [column]})
+                    rater = BracketRater(table, price_column=column)
+                    kinds = None if order_kind is None else np.array([order_kind])
+                    row = int(rater.lookup(np.array([at[0]]), np.array([at[1]]), kinds)[0])
+                value = np.nan
+                if row >= 0:
+                    stored = self._column(version, column)[row]
+                    value = int(stored) / 100 if version.is_money(column) else float(stored)
+                records.append({'version': version.id, 'label': version.label, 'valid_from': version.valid_from,
+                                'row': row + 1 if row >= 0 else None, column: value})
+        finally:
+            self._cache.clear()
+        frame = pd.DataFrame(records)
+        previous = frame[column].shift()
+        frame['change_pct'] = (frame[column] / previous - 1) * 100
+        return frame
+
+    def stats(self) -> Dict[str, Any]:
+        """Version count, raw size of all versions and what the store actually holds."""
+        versions = self.versions()
+        sizes = dict(self._conn.execute("SELECT hash, size FROM chunks"))
+        logical = sum(sizes.get(h, 0) for v in versions for h in v.chunk_hashes())
+        stored = self._conn.execute("SELECT COALESCE(SUM(LENGTH(data)), 0) FROM chunks").fetchone()[0]
+        return {'versions': len(versions), 'chunks': len(sizes), 'logical_bytes': logical, 'stored_bytes': stored}
+
+    def summary_lines(self, tariff: Optional[str] = None) -> List[str]:
+        """Plain text listing of the stored versions plus the store's size."""
+        lines = [v.summary_line() for v in self.versions(tariff)]
+        stats = self.stats()
+        ratio = stats['logical_bytes'] / stats['stored_bytes'] if stats['stored_bytes'] else 0
+        lines.append(f"{stats['versions']} Versionen, {stats['chunks']} Blöcke, "
+                     f"{stats['logical_bytes'] / 1e6:.2f} MB Daten in {stats['stored_bytes'] / 1e6:.2f} MB "
+                     f"gespeichert (Faktor {ratio:.1f})")
+        return lines
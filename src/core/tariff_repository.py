@@ -0,0 +1,332 @@
+import os
+import sqlite3
+import zlib
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from .comtec_document import ComtecDocument
+from .compressed_io import is_tariff_file, tariff_stem
+from .generator import quantity_column
+from .rating import _decimal_keys
+from .schema import to_cents
+from .tariff_engine import TariffEngine
+from .tariff_history import decode_column, encode_column, tuple_skeleton
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS tariffs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    path TEXT NOT NULL,
+    item INTEGER NOT NULL,
+    name TEXT NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    size INTEGER NOT NULL,
+    tariff_id TEXT,
+    code TEXT,
+    title TEXT,
+    price_kind TEXT,
+    spec TEXT,
+    currency TEXT,
+    valid_from TEXT,
+    valid_to TEXT,
+    rows INTEGER NOT NULL,
+    quantity_column TEXT,
+    skeleton BLOB NOT NULL,
+    UNIQUE (path, item)
+);
+CREATE TABLE IF NOT EXISTS tariff_columns (
+    tariff INTEGER NOT NULL REFERENCES tariffs (id) ON DELETE CASCADE,
+    position INTEGER NOT NULL,
+    name TEXT NOT NULL,
+    dtype TEXT NOT NULL,
+    data BLOB NOT NULL,
+    PRIMARY KEY (tariff, position)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS brackets (
+    id INTEGER PRIMARY KEY,
+    tariff INTEGER NOT NULL REFERENCES tariffs (id) ON DELETE CASCADE,
+    row INTEGER NOT NULL,
+    order_kind INTEGER,
+    min_distance REAL,
+    max_distance REAL,
+    min_quantity REAL,
+    max_quantity REAL,
+    price_cents INTEGER,
+    UNIQUE (tariff, row)
+);
+CREATE INDEX IF NOT EXISTS tariffs_spec ON tariffs (spec);
+CREATE INDEX IF NOT EXISTS tariffs_valid ON tariffs (valid_from, valid_to);
+CREATE INDEX IF NOT EXISTS brackets_bounds ON brackets (max_distance, max_quantity, order_kind);
+CREATE INDEX IF NOT EXISTS brackets_quantity ON brackets (max_quantity);
+-- Lowest bound per tariff and order kind, for shipments on a bracket's minimum
+CREATE INDEX IF NOT EXISTS brackets_lowest_distance ON brackets (tariff, order_kind, min_distance);
+CREATE INDEX IF NOT EXISTS brackets_lowest_quantity ON brackets (tariff, order_kind, min_quantity);
+"""
+
+# R*Tree over the bracket rectangles for "which brackets contain this shipment" (if SQLite has the module)
+_RTREE = """
+CREATE VIRTUAL TABLE IF NOT EXISTS bracket_boxes USING rtree (id, min_distance, max_distance, min_quantity, max_quantity);
+CREATE TRIGGER IF NOT EXISTS brackets_unbox AFTER DELETE ON brackets BEGIN
+    DELETE FROM bracket_boxes WHERE id = old.id;
+END;
+"""
+
+# Columns of a bracket filter and where they live: --bracket "maxDistance=250,maxWeight=1000"
+_BRACKET_FIELDS = {'minDistance': 'b.min_distance', 'maxDistance': 'b.max_distance',
+                   'id_orderkind': 'b.order_kind', 'price': 'b.price_cents'}
+
+
+class RepositoryError(ValueError):
+    """Raised for unknown tariffs or malformed queries against the repository."""
+
+
+def _bracket_rows(tariff: int, df: pd.DataFrame, quantity_col: Optional[str], money: bool) -> List[Tuple]:
+    """One brackets row per tuple: bounds as the decimals shown in the table, price in cents."""
+    n = len(df)
+
+    def bounds(column):
+        if column is None or column not in df.columns:
+            return [None] * n
+        return _decimal_keys(pd.to_numeric(df[column], errors='coerce').to_numpy()).tolist()
+
+    kinds = [None] * n
+    if 'id_orderkind' in df.columns:
+        kinds = pd.to_numeric(df['id_orderkind'], errors='coerce').astype('Int64').tolist()
+    prices = [None] * n
+    if 'price' in df.columns:
+        prices = (df['price'].to_numpy().astype(np.int64) if money else to_cents(df['price'].to_numpy())).tolist()
+    min_quantity = 'min' + quantity_col[3:] if quantity_col else None
+    return list(zip([tariff] * n, range(n), [None if pd.isna(k) else int(k) for k in kinds],
+                    bounds('minDistance'), bounds('maxDistance'), bounds(min_quantity), bounds(quantity_col), prices))
+
+
+class TariffRepository:
+    """
+    Tariff files ingested into one SQLite database for queries across all tariffs.
+
+    Per tariff item the database holds its header fields (resource_tariff id, code, name,
+    price kind, validity, spec), its table as one compressed blob per column, the file
+    without its tuples, and one row per bracket with the distance and quantity bounds,
+    order kind and price. Indexes on spec, validity and the bracket bounds answer
+    questions such as "which tariffs have a bracket maxDistance=250, maxWeight=1000"
+    without opening a single XML file, and open() rebuilds a tariff from one indexed
+    query instead of parsing XML. ingest() skips files whose mtime and size did not
+    change and writes each file in one transaction with executemany.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._conn = sqlite3.connect(path)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA foreign_keys = ON")
+        self._conn.execute("PRAGMA journal_mode = WAL")
+        self._conn.executescript(_SCHEMA)
+        try:
+            self._conn.executescript(_RTREE)
+            self.rtree = True
+        except sqlite3.OperationalError:
+            self.rtree = False # Built without R*Tree: containment queries fall back to the bounds index
+
+    def close(self):
+        self._conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    # --- Ingest ---
+
+    @staticmethod
+    def _scan(paths: List[str]) -> Dict[str, os.stat_result]:
+        found = {}
+        for path in paths:
+            if os.path.isdir(path):
+                names = [os.path.join(root, n) for root, _, files in os.walk(path)
+                         for n in sorted(files) if is_tariff_file(n)]
+            else:
+                names = [path]
+            for name in names:
+                try:
+                    found[os.path.abspath(name)] = os.stat(name)
+                except OSError:
+                    pass
+        return found
+
+    def ingest(self, paths: List[str], prune: bool = False) -> Dict[str, Any]:
+        """
+        Adds or updates the XML files given directly or found in folders (recursively).
+        Returns counts of ingested, unchanged and removed files plus {path: message} of
+        files that failed to load. With prune, tariffs of files that no longer exist are
+        removed.
+        """
+        result = {'ingested': 0, 'unchanged': 0, 'removed': 0, 'errors': {}}
+        known = {row['path']: (row['mtime_ns'], row['size'])
+                 for row in self._conn.execute("SELECT DISTINCT path, mtime_ns, size FROM tariffs")}
+        for path, st in self._scan(paths).items():
+            if known.get(path) == (st.st_mtime_ns, st.st_size):
+                result['unchanged'] += 1
+                continue
+            try:
+                self._ingest_file(path, st)
+                result['ingested'] += 1
+            except Exception as e:
+                result['errors'][path] = str(e)
+        if prune:
+            gone = [(p,) for p in known if not os.path.exists(p)]
+            with self._conn:
+                self._conn.executemany("DELETE FROM tariffs WHERE path = ?", gone)
+            result['removed'] = len(gone)
+        return result
+
+    def _ingest_file(self, path: str, st: os.stat_result):
+        document = ComtecDocument.open(path)
+        stem = tariff_stem(path)
+        items = document.items()
+        engine = TariffEngine()
+        loaded = []
+        for position, item in enumerate(items):
+            raw = document.item_document(item)
+            success, msg = engine.load_bytes(raw, path)
+            if not success:
+                raise ValueError(msg)
+            df = engine.load_table()
+            name = stem if len(items) == 1 else f"{stem}:{position + 1}"
+            resource = engine.root.find('resource_tariff')
+            header = {tag: (resource.findtext(tag) if resource is not None else None)
+                      for tag in ('id', 'code', 'name', 'price_kind_code', 'valid_from_date', 'valid_till_date')}
+            header['spec'] = engine.root.findtext('.//tariff_item/tariff_item_spec')
+            header['currency'] = engine.root.findtext('.//tariff_item/currency_code')
+            quantity_col = quantity_column(df.columns.tolist())
+            money = engine.schema.is_money('price') if 'price' in df.columns else False
+            loaded.append((position, name, header, df, quantity_col, money, tuple_skeleton(raw)))
+
+        # Parse first, then replace the file's tariffs in one transaction
+        with self._conn:
+            self._conn.execute("DELETE FROM tariffs WHERE path = ?", (path,))
+            for position, name, header, df, quantity_col, money, skeleton in loaded:
+                cursor = self._conn.execute(
+                    "INSERT INTO tariffs (path, item, name, mtime_ns, size, tariff_id, code, title, price_kind, spec, "
+                    "currency, valid_from, valid_to, rows, quantity_column, skeleton) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    (path, position, name, st.st_mtime_ns, st.st_size, header['id'], header['code'], header['name'],
+                     header['price_kind_code'], header['spec'], header['currency'],
+                     header['valid_from_date'] or None, header['valid_till_date'] or None, len(df), quantity_col,
+                     zlib.compress(skeleton)))
+                tariff = cursor.lastrowid
+                columns = []
+                for i, col in enumerate(df.columns):
+                    dtype, payload = encode_column(df[col].to_numpy())
+                    columns.append((tariff, i, col, dtype, zlib.compress(payload, 1)))
+                self._conn.executemany("INSERT INTO tariff_columns (tariff, position, name, dtype, data) "
+                                       "VALUES (?, ?, ?, ?, ?)", columns)
+                self._conn.executemany("INSERT INTO brackets (tariff, row, order_kind, min_distance, max_distance, "
+                                       "min_quantity, max_quantity, price_cents) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                                       _bracket_rows(tariff, df, quantity_col, money))
+                if self.rtree:
+                    self._conn.execute("INSERT INTO bracket_boxes SELECT id, min_distance, max_distance, min_quantity, "
+                                       "max_quantity FROM brackets WHERE tariff = ? AND min_distance IS NOT NULL AND "
+                                       "max_distance IS NOT NULL AND min_quantity IS NOT NULL AND "
+                                       "max_quantity IS NOT NULL", (tariff,))
+
+    # --- Queries ---
+
+    @staticmethod
+    def _tariff_filters(spec: Optional[str], valid_on: Optional[str], name: Optional[str]) -> Tuple[List[str], List]:
+        where, params = [], []
+        if spec:
+            where.append("t.spec = ?")
+            params.append(spec)
+        if valid_on:
+            # ISO dates compare correctly as text
+            where.append("(t.valid_from IS NULL OR t.valid_from <= ?) AND (t.valid_to IS NULL OR t.valid_to >= ?)")
+            params += [valid_on, valid_on]
+        if name:
+            where.append("t.name LIKE ?")
+            params.append(f"%{name}%")
+        return where, params
+
+    def tariffs(self, spec: Optional[str] = None, valid_on: Optional[str] = None,
+                name: Optional[str] = None) -> pd.DataFrame:
+        """Ingested tariffs, optionally of one spec, valid on a date (YYYY-MM-DD) or matching a name."""
+        where, params = self._tariff_filters(spec, valid_on, name)
+        sql = ("SELECT t.id, t.name, t.tariff_id, t.spec, t.valid_from, t.valid_to, t.rows, t.path FROM tariffs t"
+               + (" WHERE " + " AND ".join(where) if where else "") + " ORDER BY t.name")
+        return pd.read_sql_query(sql, self._conn, params=params)
+
+    def find_brackets(self, bracket: Optional[Dict[str, float]] = None, at: Optional[Tuple[float, float]] = None,
+                      order_kind: Optional[int] = None, spec: Optional[str] = None, valid_on: Optional[str] = None,
+                      name: Optional[str] = None, limit: int = 1000) -> pd.DataFrame:
+        """
+        Brackets across all tariffs, either with the given bounds (bracket = {'maxDistance': 250,
+        'maxWeight': 1000}; any max*/min* quantity column matches the tariff's quantity axis)
+        or containing a shipment at = (distance, quantity) as BracketRater prices it:
+        min < value <= max on both axes, where the lowest bound of a tariff's order kind is
+        included (a shipment at 0 falls into the first bracket). Prices are in euros.
+        """
+        if (bracket is None) == (at is None):
+            raise RepositoryError("Entweder Stufenwerte oder eine Sendung (Entfernung, Menge) angeben.")
+        where, params = self._tariff_filters(spec, valid_on, name)
+        boxes = ""
+        if bracket is not None:
+            for key, value in bracket.items():
+                if key in _BRACKET_FIELDS:
+                    where.append(f"{_BRACKET_FIELDS[key]} = ?")
+                    params.append(int(round(value * 100)) if key == 'price' else value)
+                elif key.startswith(('min', 'max')):
+                    # maxWeight / maxVolume: the tariff's quantity axis must be that column
+                    where.append(f"b.{key[:3]}_quantity = ? AND t.quantity_column = ?")
+                    params += [value, 'max' + key[3:]]
+                else:
+                    raise RepositoryError(f"Spalte '{key}' ist nicht indiziert (möglich: min*/max*, id_orderkind, price).")
+        else:
+            distance, quantity = at
+            if self.rtree:
+                # The R*Tree (float32 boxes, rounded outwards) narrows down; the exact bounds decide
+                boxes = " JOIN bracket_boxes x ON x.id = b.id"
+                where.append("x.min_distance <= ? AND x.max_distance >= ? AND x.min_quantity <= ? AND x.max_quantity >= ?")
+                params += [distance, distance, quantity, quantity]
+            for axis, value in (('distance', distance), ('quantity', quantity)):
+                # Only evaluated for a value on a bracket's minimum: is that the lowest bound?
+                where.append(f"b.max_{axis} >= ? AND (b.min_{axis} < ? OR (b.min_{axis} = ? AND b.min_{axis} = "
+                             f"(SELECT MIN(l.min_{axis}) FROM brackets l WHERE l.tariff = b.tariff "
+                             f"AND l.order_kind IS b.order_kind)))")
+                params += [value, value, value]
+            if distance < 0 or quantity < 0:
+                where.append("0") # Negative shipments have no price, as in BracketRater
+        if order_kind is not None:
+            where.append("b.order_kind = ?")
+            params.append(order_kind)
+        sql = ("SELECT t.id AS tariff, t.name, t.spec, t.valid_from, t.valid_to, b.row + 1 AS row, "
+               "b.order_kind, b.min_distance, b.max_distance, t.quantity_column, b.min_quantity, b.max_quantity, "
+               "b.price_cents / 100.0 AS price FROM brackets b" + boxes + " JOIN tariffs t ON t.id = b.tariff WHERE "
+               + " AND ".join(where) + " ORDER BY t.name, b.row LIMIT ?")
+        return pd.read_sql_query(sql, self._conn, params=params + [limit])
+
+    def open(self, tariff: int) -> Tuple[TariffEngine, pd.DataFrame]:
+        """
+        A TariffEngine with the tariff's header loaded plus its table in storage dtypes,
+        read with one primary key query (no XML parse of the tuples).
+        """
+        rows = self._conn.execute(
+            "SELECT t.skeleton, t.path, c.name, c.dtype, c.data FROM tariffs t "
+            "LEFT JOIN tariff_columns c ON c.tariff = t.id WHERE t.id = ? ORDER BY c.position", (int(tariff),)).fetchall()
+        if not rows:
+            raise RepositoryError(f"Tarif {tariff} ist nicht im Repository.")
+        engine = TariffEngine()
+        success, msg = engine.load_bytes(zlib.decompress(rows[0]['skeleton']), rows[0]['path'])
+        if not success:
+            raise RepositoryError(msg)
+        columns = [r['name'] for r in rows if r['name'] is not None]
+        df = pd.DataFrame({r['name']: decode_column(r['dtype'], zlib.decompress(r['data']))
+                           for r in rows if r['name'] is not None}, columns=columns)
+        return engine, df
+
+    def summary_lines(self) -> List[str]:
+        counts = self._conn.execute("SELECT COUNT(*), COUNT(DISTINCT path), COALESCE(SUM(rows), 0) FROM tariffs").fetchone()
+        specs = self._conn.execute("SELECT spec, COUNT(*) FROM tariffs GROUP BY spec ORDER BY COUNT(*) DESC").fetchall()
+        lines = [f"{counts[0]} Tarife aus {counts[1]} Dateien, {counts[2]} Stufen"]
+        lines += [f"  {spec or '(ohne Spezifikation)'}: {n}" for spec, n in specs]
+        return lines
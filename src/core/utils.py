@@ -1,5 +1,6 @@
 import sys
 import os
+import numpy as np
 
 def get_base_path():
     """
@@ -24,3 +25,17 @@ def get_resource_path(relative_path):
     """
     base_path = get_base_path()
     return os.path.join(base_path, relative_path)
+
+def row_positions(rows, length):
+    """
+    Normalizes a row selection to a sorted int64 array of positions in [0, length).
+    Accepts a boolean mask of the given length or any sequence/array of row numbers.
+    """
+    rows = np.asarray(rows)
+    if rows.dtype == bool:
+        return np.flatnonzero(rows[:length])
+    rows = rows.astype(np.int64, copy=False)
+    rows = rows[(rows >= 0) & (rows < length)]
+    if rows.size > 1 and np.any(rows[1:] <= rows[:-1]):
+        rows = np.unique(rows)
+    return rows
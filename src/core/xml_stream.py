@@ -0,0 +1,71 @@
+import copy
+import xml.etree.ElementTree as ET
+from xml.sax.saxutils import escape
+from typing import Iterable, List, Tuple
+
+_TUPLES_MARKER = "@@PARAMETER_TUPLES@@"
+_VALUE_MARKER = "@@VALUE_{}@@"
+
+
+def split_skeleton(root: ET.Element, container_path: str = './/tariff_item/parameter_tuples',
+                   indent: str = "  ") -> Tuple[str, str, int]:
+    """
+    Serializes the tariff without its tuples and splits it where the tuples belong.
+    Returns (head, tail, level), level being the nesting depth of a parameter_tuple.
+    The tree itself is not modified.
+    """
+    skeleton = copy.deepcopy(root)
+    container = skeleton.find(container_path)
+    if container is None:
+        raise ValueError("Kein parameter_tuples Container im Tarif gefunden.")
+    for child in list(container):
+        container.remove(child)
+    container.append(ET.Comment(_TUPLES_MARKER))
+    ET.indent(skeleton, space=indent)
+
+    text = ET.tostring(skeleton, encoding='unicode')
+    head, tail = text.split(f"<!--{_TUPLES_MARKER}-->")
+    tuple_indent = head[head.rfind('\n') + 1:]
+    head = head[:len(head) - len(tuple_indent)]
+    return head, tail.lstrip(' ').lstrip('\n'), len(tuple_indent) // len(indent)
+
+
+def tuple_format(template: ET.Element, columns: List[str], level: int, indent: str = "  ") -> Tuple[str, List[str]]:
+    """
+    str.format pattern for one parameter_tuple built from the template: every parameter
+    whose code is a table column gets a positional placeholder, everything else is kept
+    verbatim. Returns (pattern, columns in placeholder order).
+    """
+    tup = copy.deepcopy(template)
+    tup.tail = None
+    order = []
+    for param in tup.findall('parameter'):
+        code = param.findtext('code')
+        value = param.find('value')
+        if code in columns and value is not None and code not in order:
+            value.text = _VALUE_MARKER.format(len(order))
+            order.append(code)
+    ET.indent(tup, space=indent, level=level)
+
+    text = ET.tostring(tup, encoding='unicode').replace('{', '{{').replace('}', '}}')
+    for i in range(len(order)):
+        text = text.replace(_VALUE_MARKER.format(i), '{' + str(i) + '}')
+    return indent * level + text + '\n', order
+
+
+def write_stream(f, head: str, tail: str, pattern: str, chunks: Iterable[List]):
+    """
+    Writes head, one formatted tuple per row and tail. chunks yields lists of equally long
+    string arrays (one per placeholder), so only one chunk of text is held in memory.
+    """
+    f.write('<?xml version="1.0" encoding="utf-8"?>\n')
+    f.write(head)
+    render = pattern.format
+    for columns in chunks:
+        f.write("".join(map(render, *columns)))
+    f.write(tail)
+
+
+def escape_column(values) -> List[str]:
+    """XML-escapes free text values (numbers never need it)."""
+    return [escape(str(v)) for v in values]
@@ -2,3 +2,6 @@ from .filter_dialog import FilterDialog
 from .matrix_import_dialog import MatrixImportDialog
 from .definition_editor_dialog import DefinitionEditorDialog
 from .bulk_update_dialog import BulkUpdateDialog
+from .generator_dialog import GeneratorDialog
+from .matrix_view_dialog import MatrixViewDialog
+from .duplicates_dialog import DuplicatesDialog
@@ -1,25 +1,37 @@
-from PySide6.QtWidgets import (QDialog, QVBoxLayout, QLabel, QComboBox, 
-                               QLineEdit, QDialogButtonBox, QMessageBox)
+from PySide6.QtWidgets import (QDialog, QVBoxLayout, QHBoxLayout, QLabel, QComboBox,
+                               QLineEdit, QDialogButtonBox, QMessageBox, QPushButton,
+                               QStackedWidget, QWidget, QPlainTextEdit, QFileDialog)
+from PySide6.QtGui import QFont
+import os
+import numpy as np
+
+from core.bulk_expression import BulkExpressionError
+from core.money import ROUNDING_MODES
+from core.rating import BracketRater
+from core.revenue import load_shipments, simulate_revenue
+from core.utils import row_positions
+from ..scheduler import TaskScheduler
 
 class BulkUpdateDialog(QDialog):
     def __init__(self, engine, model, selected_rows=None, parent=None):
         super().__init__(parent)
         self.engine = engine
         self.model = model
-        self.selected_rows = selected_rows # List of row indices or None
-        
-        title_suffix = " (Auswahl)" if selected_rows and len(selected_rows) > 0 else " (Alle Zeilen)"
+        self.selected_rows = selected_rows # Sorted int64 array of source rows or None
+
+        has_selection = selected_rows is not None and len(selected_rows) > 0
+        title_suffix = " (Auswahl)" if has_selection else " (Alle Zeilen)"
         self.setWindowTitle(f"Preisanpassung {title_suffix}")
         self.resize(300, 200)
-        
+
         layout = QVBoxLayout(self)
-        
+
         # Info Label
         info_label = QLabel()
         info_label.setWordWrap(True)
         # Determine text and style
-        df_count = len(self.model.getDataFrame())
-        if selected_rows and len(selected_rows) > 0:
+        df_count = self.model.rowCount()
+        if has_selection:
             count = len(selected_rows)
             info_label.setText(f"ℹ️ Anpassung für <b>{count} ausgewählte Zeile(n)</b>.")
             info_label.setStyleSheet("color: #4caf50; font-size: 13px; font-weight: bold; margin-bottom: 10px;")
@@ -28,34 +40,183 @@ class BulkUpdateDialog(QDialog):
             info_label.setStyleSheet("color: #ff9800; font-size: 13px; font-weight: bold; margin-bottom: 10px;")
         layout.addWidget(info_label)
 
-        layout.addWidget(QLabel("Spalte wählen:"))
+        # Mode: simple percentage or expression
+        layout.addWidget(QLabel("Art der Anpassung:"))
+        self.mode_combo = QComboBox()
+        self.mode_combo.addItems(["%-Anpassung", "Formel"])
+        layout.addWidget(self.mode_combo)
+
+        self.mode_stack = QStackedWidget()
+        self.mode_combo.currentIndexChanged.connect(self.on_mode_changed)
+        layout.addWidget(self.mode_stack)
+
+        # --- Percentage Page ---
+        pct_page = QWidget()
+        pct_layout = QVBoxLayout(pct_page)
+        pct_layout.setContentsMargins(0, 0, 0, 0)
+
+        pct_layout.addWidget(QLabel("Spalte wählen:"))
         self.column_combo = QComboBox()
-        
+
         # Populate columns
-        df = self.model.getDataFrame()
-        if not df.empty:
-            self.column_combo.addItems(df.columns.tolist())
+        if self.model.rowCount() > 0:
+            self.column_combo.addItems(self.model.columns())
             # Default to price if available
             idx = self.column_combo.findText("price")
             if idx >= 0: self.column_combo.setCurrentIndex(idx)
-            
-        layout.addWidget(self.column_combo)
-        
-        layout.addWidget(QLabel("Änderung in % (z.B. 5.0 oder -10):"))
+
+        pct_layout.addWidget(self.column_combo)
+
+        pct_layout.addWidget(QLabel("Änderung in % (z.B. 5.0 oder -10):"))
         self.percent_edit = QLineEdit()
         self.percent_edit.setPlaceholderText("0.0")
-        layout.addWidget(self.percent_edit)
-        
+        pct_layout.addWidget(self.percent_edit)
+        self.mode_stack.addWidget(pct_page)
+
+        # --- Expression Page ---
+        expr_page = QWidget()
+        expr_layout = QVBoxLayout(expr_page)
+        expr_layout.setContentsMargins(0, 0, 0, 0)
+
+        expr_layout.addWidget(QLabel("Formel (Spalte = Ausdruck [where Bedingung] [round n] [min Wert]):"))
+        self.expression_edit = QLineEdit()
+        self.expression_edit.setPlaceholderText("price = price * 1.035 + 0.5 where maxDistance > 200 round 2 min 10")
+        expr_layout.addWidget(self.expression_edit)
+
+        preview_bar = QHBoxLayout()
+        preview_btn = QPushButton("🔍 Vorschau")
+        preview_btn.clicked.connect(self.show_preview)
+        preview_bar.addWidget(preview_btn)
+        preview_bar.addStretch()
+        expr_layout.addLayout(preview_bar)
+
+        self.preview_text = QPlainTextEdit()
+        self.preview_text.setReadOnly(True)
+        self.preview_text.setFont(QFont("Courier New", 10))
+        self.preview_text.setMinimumHeight(180)
+        expr_layout.addWidget(self.preview_text)
+        self.mode_stack.addWidget(expr_page)
+
+        # Rounding of money columns (applied in whole cents at every bulk step)
+        layout.addWidget(QLabel("Rundung (Preise):"))
+        self.rounding_combo = QComboBox()
+        for mode, label in ROUNDING_MODES.items():
+            self.rounding_combo.addItem(label, mode)
+        self.rounding_combo.setCurrentIndex(self.rounding_combo.findData(self.engine.rounding_mode))
+        layout.addWidget(self.rounding_combo)
+
+        # Revenue impact on historical shipments, computed in the background
+        simulate_bar = QHBoxLayout()
+        self.simulate_btn = QPushButton("📈 Umsatzwirkung simulieren…")
+        self.simulate_btn.setToolTip("Historische Sendungen (CSV oder Parquet) mit den aktuellen und den "
+                                     "angepassten Preisen bewerten.")
+        self.simulate_btn.clicked.connect(self.simulate_revenue)
+        simulate_bar.addWidget(self.simulate_btn)
+        simulate_bar.addStretch()
+        layout.addLayout(simulate_bar)
+
+        self.simulation_text = QPlainTextEdit()
+        self.simulation_text.setReadOnly(True)
+        self.simulation_text.setFont(QFont("Courier New", 10))
+        self.simulation_text.setMinimumHeight(160)
+        self.simulation_text.hide()
+        layout.addWidget(self.simulation_text)
+
+        self.scheduler = TaskScheduler(self, delay_ms=0, max_threads=1)
+        self._shipments = None # ((path, mtime), DataFrame) of the last loaded shipment history
+
         btn_box = QDialogButtonBox(QDialogButtonBox.Ok | QDialogButtonBox.Cancel)
         btn_box.button(QDialogButtonBox.Cancel).setText("Abbrechen")
         btn_box.accepted.connect(self.apply_update)
         btn_box.rejected.connect(self.reject)
         layout.addWidget(btn_box)
-        
+
+    def on_mode_changed(self, index):
+        self.mode_stack.setCurrentIndex(index)
+        self.adjustSize()
+
+    def show_preview(self):
+        df = self.model.getDataFrame()
+        if df.empty: return
+        try:
+            preview = self.engine.preview_bulk_expression(df, self.expression_edit.text(), self.selected_rows,
+                                                          self.rounding_combo.currentData())
+            self.preview_text.setPlainText("\n".join(preview.summary_lines()))
+        except BulkExpressionError as e:
+            self.preview_text.setPlainText(f"Fehler: {e}")
+
+    def _proposed_column(self, df):
+        """(column, values after the change) for the current mode, without touching the model."""
+        rounding = self.rounding_combo.currentData()
+        if self.mode_combo.currentIndex() == 1:
+            preview = self.engine.preview_bulk_expression(df, self.expression_edit.text(), self.selected_rows, rounding)
+            return preview.column, preview.apply(df.copy())[preview.column].to_numpy()
+        col = self.column_combo.currentText()
+        changed = self.engine.apply_bulk_change(df.copy(), col, float(self.percent_edit.text()),
+                                                self.selected_rows, rounding)
+        return col, changed[col].to_numpy()
+
+    def simulate_revenue(self):
+        df = self.model.getDataFrame()
+        if df.empty: return
+        try:
+            column, proposed = self._proposed_column(df)
+        except BulkExpressionError as e:
+            QMessageBox.warning(self, "Fehler", f"Ungültige Formel:\n{e}")
+            return
+        except ValueError:
+            QMessageBox.warning(self, "Fehler", "Ungültiger Zahlenwert.")
+            return
+
+        start = self._shipments[0][0] if self._shipments else ""
+        path, _ = QFileDialog.getOpenFileName(self, "Sendungshistorie wählen", start,
+                                              "Sendungen (*.csv *.parquet);;Alle Dateien (*)")
+        if not path: return
+
+        schema = self.engine.schema
+        money = schema.is_money(column) if schema is not None else True
+        cached = self._shipments
+
+        def run(cancelled):
+            # Worker thread: df is the model's DataFrame snapshot, nothing here writes to the model
+            try:
+                key = (path, os.path.getmtime(path))
+                rater = BracketRater(df, price_column=column)
+                shipments = cached[1] if cached and cached[0] == key else load_shipments(path, rater.quantity_column)
+                if cancelled():
+                    return None
+                return key, shipments, simulate_revenue(df, shipments, proposed, column, money, rater)
+            except Exception as e:
+                return f"Fehler: {e}"
+
+        self.simulate_btn.setEnabled(False)
+        self.simulation_text.setPlainText(f"Simulation läuft ({os.path.basename(path)})…")
+        self.simulation_text.show()
+        self.scheduler.schedule("simulate", run, self.show_simulation)
+
+    def show_simulation(self, result):
+        self.simulate_btn.setEnabled(True)
+        if result is None:
+            return
+        if isinstance(result, str):
+            self.simulation_text.setPlainText(result)
+            return
+        key, shipments, impact = result
+        self._shipments = (key, shipments)
+        self.simulation_text.setPlainText("\n".join(impact.summary_lines()))
+
+    def done(self, result):
+        self.scheduler.shutdown()
+        super().done(result)
+
     def apply_update(self):
+        if self.mode_combo.currentIndex() == 1:
+            self.apply_expression()
+            return
+
         col = self.column_combo.currentText()
         val_str = self.percent_edit.text()
-        
+
         if not col:
             QMessageBox.warning(self, "Warnung", "Keine Spalte gewählt.")
             return
@@ -64,14 +225,32 @@ class BulkUpdateDialog(QDialog):
             pct = float(val_str)
             df = self.model.getDataFrame()
             if df.empty: return
-            
-            # Pass selected_rows to engine
-            df = self.engine.apply_bulk_change(df, col, pct, self.selected_rows)
-            self.model.setDataFrame(df)
-            
+
+            # Pass selected_rows to engine, then hand only the changed cells back to the model
+            df = self.engine.apply_bulk_change(df, col, pct, self.selected_rows, self.rounding_combo.currentData())
+            if self.selected_rows is not None and len(self.selected_rows) > 0:
+                rows = row_positions(self.selected_rows, len(df))
+                self.model.updateCells(col, rows, df[col].to_numpy()[rows])
+            else:
+                self.model.updateColumn(col, df[col].to_numpy())
+
             # QMessageBox.information(self, "Erfolg", f"Spalte '{col}' wurde um {pct}% angepasst.")
             self.accept()
         except ValueError:
             QMessageBox.warning(self, "Fehler", "Ungültiger Zahlenwert.")
         except Exception as e:
             QMessageBox.critical(self, "Fehler", str(e))
+
+    def apply_expression(self):
+        try:
+            df = self.model.getDataFrame()
+            if df.empty: return
+
+            preview = self.engine.preview_bulk_expression(df, self.expression_edit.text(), self.selected_rows,
+                                                          self.rounding_combo.currentData())
+            self.model.updateCells(preview.column, np.flatnonzero(preview.mask), preview.stored_values)
+            self.accept()
+        except BulkExpressionError as e:
+            QMessageBox.warning(self, "Fehler", f"Ungültige Formel:\n{e}")
+        except Exception as e:
+            QMessageBox.critical(self, "Fehler", str(e))
@@ -1,9 +1,11 @@
 from PySide6.QtWidgets import (QDialog, QVBoxLayout, QHBoxLayout, QLineEdit, 
                                QPushButton, QLabel, QMessageBox, QTableWidget, 
                                QTableWidgetItem, QFormLayout, QHeaderView, 
-                               QDialogButtonBox, QFileDialog)
+                               QDialogButtonBox, QFileDialog, QComboBox)
 import json
 
+from core.schema import SUPPORTED_DTYPES, infer_dtype
+
 class DefinitionEditorDialog(QDialog):
     def __init__(self, engine, parent=None):
         super().__init__(parent)
@@ -42,9 +44,9 @@ class DefinitionEditorDialog(QDialog):
         layout.addLayout(form)
         
         # --- Columns Table ---
-        layout.addWidget(QLabel("Spalten & Standardwerte:"))
-        self.col_table = QTableWidget(0, 2)
-        self.col_table.setHorizontalHeaderLabels(["Spaltenname", "Standardwert"])
+        layout.addWidget(QLabel("Spalten, Standardwerte & Datentypen:"))
+        self.col_table = QTableWidget(0, 3)
+        self.col_table.setHorizontalHeaderLabels(["Spaltenname", "Standardwert", "Datentyp"])
         self.col_table.horizontalHeader().setSectionResizeMode(QHeaderView.Stretch)
         layout.addWidget(self.col_table)
         
@@ -84,12 +86,18 @@ class DefinitionEditorDialog(QDialog):
         # Initial check
         self.check_input()
         
-    def add_column_row(self, name="", val="0"):
+    def add_column_row(self, name="", val="0", dtype=None):
         row = self.col_table.rowCount()
         self.col_table.insertRow(row)
         self.col_table.setItem(row, 0, QTableWidgetItem(name))
         self.col_table.setItem(row, 1, QTableWidgetItem(val))
         
+        # Storage type (e.g. 'cents' for prices, 'int8' for ids), inferred from the name if not given
+        dtype_combo = QComboBox()
+        dtype_combo.addItems(list(SUPPORTED_DTYPES))
+        dtype_combo.setCurrentText(dtype or infer_dtype(name))
+        self.col_table.setCellWidget(row, 2, dtype_combo)
+        
     def remove_column_row(self):
         rows = set(i.row() for i in self.col_table.selectedItems())
         for row in sorted(rows, reverse=True):
@@ -103,8 +111,7 @@ class DefinitionEditorDialog(QDialog):
 
     def load_definition(self, path):
         try:
-            with open(path, 'r', encoding='utf-8') as f:
-                data = json.load(f)
+            data = self.engine.definitions.load_path(path)
             
             # Fill Metadata
             self.spec_edit.setText(data.get('spec_name', ''))
@@ -116,10 +123,11 @@ class DefinitionEditorDialog(QDialog):
             self.col_table.setRowCount(0)
             columns = data.get('columns', [])
             defaults = data.get('defaults', {})
+            dtypes = data.get('dtypes', {})
             
             for col in columns:
                 val = defaults.get(col, "0")
-                self.add_column_row(col, str(val))
+                self.add_column_row(col, str(val), dtypes.get(col))
                 
         except Exception as e:
             QMessageBox.critical(self, "Ladefehler", f"Fehler beim Laden der Datei:\n{str(e)}")
@@ -151,14 +159,18 @@ class DefinitionEditorDialog(QDialog):
             
         columns = []
         defaults = {}
+        dtypes = {}
         
         for r in range(self.col_table.rowCount()):
             name_item = self.col_table.item(r, 0)
             val_item = self.col_table.item(r, 1)
+            dtype_combo = self.col_table.cellWidget(r, 2)
             
             if name_item and name_item.text().strip():
                 col_name = name_item.text().strip()
                 columns.append(col_name)
+                if dtype_combo is not None:
+                    dtypes[col_name] = dtype_combo.currentText()
                 
                 if val_item and val_item.text().strip():
                     try:
@@ -173,6 +185,7 @@ class DefinitionEditorDialog(QDialog):
             "currency_code": self.cur_edit.text(),
             "id_orderkind_default": 2, # Default
             "columns": columns,
+            "dtypes": dtypes,
             "defaults": defaults
         }
         
@@ -0,0 +1,64 @@
+from PySide6.QtWidgets import (QDialog, QVBoxLayout, QLabel, QComboBox, QDialogButtonBox,
+                               QPlainTextEdit)
+from PySide6.QtGui import QFont
+
+from core.dedupe import find_duplicates
+
+class DuplicatesDialog(QDialog):
+    """
+    Reports exact duplicate rows and bracket conflicts (same bracket, other values)
+    of the table and removes them on request.
+    """
+
+    CONFLICT_MODES = [("Konflikte beibehalten", None),
+                      ("Konflikte: erste Zeile behalten", 'first'),
+                      ("Konflikte: letzte Zeile behalten (neuester Import)", 'last')]
+
+    def __init__(self, model, parent=None):
+        super().__init__(parent)
+        self.model = model
+        self.setWindowTitle("Duplikate prüfen")
+        self.resize(620, 420)
+
+        df = model.getDataFrame()
+        self.report = find_duplicates(df)
+
+        layout = QVBoxLayout(self)
+        self.report_text = QPlainTextEdit()
+        self.report_text.setReadOnly(True)
+        self.report_text.setFont(QFont("Courier New", 10))
+        self.report_text.setPlainText("\n".join(self.report.summary_lines(table=df)))
+        layout.addWidget(self.report_text)
+
+        layout.addWidget(QLabel("Bei Konflikten:"))
+        self.conflict_combo = QComboBox()
+        for label, mode in self.CONFLICT_MODES:
+            self.conflict_combo.addItem(label, mode)
+        self.conflict_combo.currentIndexChanged.connect(self.update_count)
+        layout.addWidget(self.conflict_combo)
+
+        self.count_label = QLabel()
+        layout.addWidget(self.count_label)
+
+        btn_box = QDialogButtonBox(QDialogButtonBox.Ok | QDialogButtonBox.Cancel)
+        btn_box.button(QDialogButtonBox.Ok).setText("Entfernen")
+        btn_box.button(QDialogButtonBox.Cancel).setText("Schließen")
+        btn_box.accepted.connect(self.remove_rows)
+        btn_box.rejected.connect(self.reject)
+        self.ok_button = btn_box.button(QDialogButtonBox.Ok)
+        layout.addWidget(btn_box)
+        self.update_count()
+
+    def _mask(self):
+        return self.report.removal_mask(self.conflict_combo.currentData())
+
+    def update_count(self):
+        count = int(self._mask().sum())
+        self.count_label.setText(f"{count} Zeile(n) werden entfernt.")
+        self.ok_button.setEnabled(count > 0)
+
+    def remove_rows(self):
+        mask = self._mask()
+        if mask.any():
+            self.model.removeRowsByMask(mask)
+        self.accept()
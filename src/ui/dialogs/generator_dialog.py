@@ -0,0 +1,140 @@
+from PySide6.QtWidgets import (QDialog, QVBoxLayout, QLabel, QComboBox,
+                               QLineEdit, QDialogButtonBox, QMessageBox, QPushButton,
+                               QStackedWidget, QWidget, QPlainTextEdit, QFormLayout, QFileDialog)
+from PySide6.QtGui import QFont
+
+from core.compressed_io import XML_SAVE_FILTER, with_filter_suffix
+from core.generator import (GeneratorError, LinearPricing, bracket_bounds, parse_anchor_grid,
+                            parse_number_list)
+
+class GeneratorDialog(QDialog):
+    """Builds a complete stepped tariff from distance and weight/volume breakpoints."""
+
+    def __init__(self, engine, order_kind=None, parent=None):
+        super().__init__(parent)
+        self.engine = engine
+        self.order_kind = order_kind
+        self.result_df = None
+        self.stream_path = None # Set when the grid should go straight to an XML file
+
+        self.setWindowTitle("Tarif-Generator")
+        self.resize(520, 560)
+
+        layout = QVBoxLayout(self)
+        columns = self.engine.get_current_schema()
+
+        # Breakpoints
+        form = QFormLayout()
+        self.distance_edit = QLineEdit()
+        self.distance_edit.setPlaceholderText("z.B. 50; 100; 200; 500; 1000")
+        form.addRow("Entfernungs-Stufen (km):", self.distance_edit)
+
+        self.quantity_combo = QComboBox()
+        self.quantity_combo.addItems([c for c in columns if c.startswith('max') and c != 'maxDistance'])
+        form.addRow("Mengen-Spalte:", self.quantity_combo)
+
+        self.quantity_edit = QLineEdit()
+        self.quantity_edit.setPlaceholderText("z.B. 10; 25; 50; 100; 250")
+        form.addRow("Mengen-Stufen:", self.quantity_edit)
+        layout.addLayout(form)
+
+        # Pricing function
+        layout.addWidget(QLabel("Preisfunktion:"))
+        self.pricing_combo = QComboBox()
+        self.pricing_combo.addItems(["Linear (Grundpreis + km + Menge)", "Ankerraster (interpoliert)"])
+        layout.addWidget(self.pricing_combo)
+
+        self.pricing_stack = QStackedWidget()
+        self.pricing_combo.currentIndexChanged.connect(self.pricing_stack.setCurrentIndex)
+        layout.addWidget(self.pricing_stack)
+
+        # --- Linear Page ---
+        linear_page = QWidget()
+        linear_form = QFormLayout(linear_page)
+        linear_form.setContentsMargins(0, 0, 0, 0)
+        self.base_edit = QLineEdit("0")
+        self.per_km_edit = QLineEdit("0")
+        self.per_unit_edit = QLineEdit("0")
+        linear_form.addRow("Grundpreis (€):", self.base_edit)
+        linear_form.addRow("Pro km (€):", self.per_km_edit)
+        linear_form.addRow("Pro Mengeneinheit (€):", self.per_unit_edit)
+        self.pricing_stack.addWidget(linear_page)
+
+        # --- Anchor Grid Page ---
+        anchor_page = QWidget()
+        anchor_layout = QVBoxLayout(anchor_page)
+        anchor_layout.setContentsMargins(0, 0, 0, 0)
+        anchor_layout.addWidget(QLabel("Ankerraster aus Excel einfügen (1. Zeile Mengen, 1. Spalte Entfernungen):"))
+        self.anchor_edit = QPlainTextEdit()
+        self.anchor_edit.setFont(QFont("Courier New", 10))
+        self.anchor_edit.setPlaceholderText("\t100\t1000\n100\t25,00\t120,00\n1000\t60,00\t300,00")
+        anchor_layout.addWidget(self.anchor_edit)
+        self.pricing_stack.addWidget(anchor_page)
+
+        # Size preview
+        self.info_label = QLabel()
+        self.info_label.setStyleSheet("color: #888; margin-top: 6px;")
+        layout.addWidget(self.info_label)
+        self.distance_edit.textChanged.connect(self.update_info)
+        self.quantity_edit.textChanged.connect(self.update_info)
+        self.update_info()
+
+        # Buttons
+        btn_box = QDialogButtonBox(QDialogButtonBox.Cancel)
+        btn_box.button(QDialogButtonBox.Cancel).setText("Abbrechen")
+        btn_box.rejected.connect(self.reject)
+
+        stream_btn = QPushButton("💾 Direkt als XML speichern")
+        stream_btn.clicked.connect(self.on_stream)
+        btn_box.addButton(stream_btn, QDialogButtonBox.ActionRole)
+
+        table_btn = QPushButton("In Tabelle übernehmen")
+        table_btn.setProperty("class", "success-btn")
+        table_btn.clicked.connect(self.on_table)
+        btn_box.addButton(table_btn, QDialogButtonBox.AcceptRole)
+        layout.addWidget(btn_box)
+
+    def update_info(self):
+        try:
+            n_d = bracket_bounds(parse_number_list(self.distance_edit.text()))[1].size
+            n_q = bracket_bounds(parse_number_list(self.quantity_edit.text()))[1].size
+        except GeneratorError:
+            self.info_label.setText("Stufen eingeben, um die Tarifgröße zu sehen.")
+            return
+        rows = n_d * n_q
+        mb = rows * self.engine.schema.memory_per_row() / 1e6 if self.engine.schema else 0
+        rows_text = f"{rows:,}".replace(",", ".")
+        mb_text = f"{mb:.1f}".replace(".", ",")
+        self.info_label.setText(f"{n_d} × {n_q} = {rows_text} Zeilen (≈ {mb_text} MB im Speicher)")
+
+    def _pricing(self):
+        if self.pricing_combo.currentIndex() == 1:
+            return parse_anchor_grid(self.anchor_edit.toPlainText())
+        try:
+            return LinearPricing(*(float(e.text().replace(',', '.') or 0)
+                                   for e in (self.base_edit, self.per_km_edit, self.per_unit_edit)))
+        except ValueError:
+            raise GeneratorError("Ungültiger Zahlenwert in der Preisfunktion.")
+
+    def _build(self) -> bool:
+        try:
+            self.result_df = self.engine.generate_grid(parse_number_list(self.distance_edit.text()),
+                                                       parse_number_list(self.quantity_edit.text()),
+                                                       self._pricing(), self.order_kind,
+                                                       self.quantity_combo.currentText() or None)
+            return True
+        except GeneratorError as e:
+            QMessageBox.warning(self, "Fehler", str(e))
+        except Exception as e:
+            QMessageBox.critical(self, "Fehler", str(e))
+        return False
+
+    def on_table(self):
+        if self._build():
+            self.accept()
+
+    def on_stream(self):
+        path, selected_filter = QFileDialog.getSaveFileName(self, "XML speichern", "", XML_SAVE_FILTER)
+        if path and self._build():
+            self.stream_path = with_filter_suffix(path, selected_filter)
+            self.accept()
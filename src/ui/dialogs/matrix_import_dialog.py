@@ -286,7 +286,8 @@ class MatrixImportDialog(QDialog):
         except Exception as e:
             QMessageBox.critical(self, "Import Fehler", f"Fehler beim Verarbeiten:\n{str(e)}")
 
-    def clean_number(self, val_str):
+    @staticmethod
+    def clean_number(val_str):
         val_str = val_str.strip()
         if not val_str: return 0.0
         
@@ -300,9 +301,10 @@ class MatrixImportDialog(QDialog):
         # Let's try to just extract the number block first.
         
         # Match anything starting with digit, then digits/dots/commas
-        match = re.search(r'[0-9]+(?:[.,][0-9]+)*', val_str)
+        # A minus right in front belongs to the number (e.g. exported credits "-0,50")
+        match = re.search(r'[-−]?[0-9]+(?:[.,][0-9]+)*', val_str)
         if match:
-            num_str = match.group(0)
+            num_str = match.group(0).replace('−', '-')
             # Assumption: If comma is present, it's likely decimal separator in DACH region
             # OR standard US list. 
             # Heuristic: 
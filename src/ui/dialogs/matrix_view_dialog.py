@@ -0,0 +1,136 @@
+from PySide6.QtWidgets import (QDialog, QVBoxLayout, QHBoxLayout, QLabel, QComboBox,
+                               QTableView, QHeaderView, QPushButton, QApplication, QFileDialog,
+                               QMessageBox)
+
+from core.matrix import bracket_axes, export_matrix, grid_texts, matrix_tsv
+from ..models import MatrixModel
+
+class MatrixViewDialog(QDialog):
+    """
+    Shows the current tariff as a grid (e.g. distance brackets × weight brackets).
+    Non-modal: the grid follows edits made in the table and edits in the grid
+    are written back to the table rows. Tariffs with several order kinds are
+    shown one kind at a time.
+    """
+
+    def __init__(self, model, parent=None):
+        super().__init__(parent)
+        self.source_model = model
+        self.setWindowTitle("Matrix-Ansicht")
+        self.resize(900, 600)
+
+        layout = QVBoxLayout(self)
+        columns = list(model.columns())
+        rows_axis, cols_axis = bracket_axes(columns) or (columns[0], columns[min(1, len(columns) - 1)])
+        value_axis = 'price' if 'price' in columns else columns[-1]
+
+        # Axis selection
+        axis_layout = QHBoxLayout()
+        self.row_combo = QComboBox()
+        self.col_combo = QComboBox()
+        self.value_combo = QComboBox()
+        for label, combo, current in (("Zeilen:", self.row_combo, rows_axis),
+                                      ("Spalten:", self.col_combo, cols_axis),
+                                      ("Wert:", self.value_combo, value_axis)):
+            combo.addItems(columns)
+            combo.setCurrentText(current)
+            combo.currentTextChanged.connect(self.update_axes)
+            axis_layout.addWidget(QLabel(label))
+            axis_layout.addWidget(combo)
+        self.kind_label = QLabel("Auftragsart:")
+        self.kind_combo = QComboBox()
+        self.kind_combo.currentIndexChanged.connect(self.update_order_kind)
+        axis_layout.addWidget(self.kind_label)
+        axis_layout.addWidget(self.kind_combo)
+        axis_layout.addStretch()
+        layout.addLayout(axis_layout)
+
+        # Grid
+        self.matrix_model = MatrixModel(model, rows_axis, cols_axis, value_axis, self)
+        self.matrix_model.modelReset.connect(self.update_kinds)
+        self.matrix_model.modelReset.connect(self.update_info)
+        self.table_view = QTableView()
+        self.table_view.setModel(self.matrix_model)
+        self.table_view.horizontalHeader().setSectionResizeMode(QHeaderView.Interactive)
+        self.table_view.horizontalHeader().setDefaultSectionSize(80)
+        layout.addWidget(self.table_view)
+
+        # Info + Export
+        bottom_layout = QHBoxLayout()
+        self.info_label = QLabel()
+        self.info_label.setStyleSheet("color: #888;")
+        bottom_layout.addWidget(self.info_label)
+        bottom_layout.addStretch()
+
+        copy_btn = QPushButton("📋 In Zwischenablage kopieren")
+        copy_btn.setToolTip("Im Layout des Matrix-Imports: 1. Zeile Spalten-Werte, 1. Spalte Zeilen-Werte.")
+        copy_btn.clicked.connect(self.copy_to_clipboard)
+        bottom_layout.addWidget(copy_btn)
+
+        export_btn = QPushButton("💾 Exportieren…")
+        export_btn.clicked.connect(self.export_file)
+        bottom_layout.addWidget(export_btn)
+        layout.addLayout(bottom_layout)
+        self.update_kinds()
+        self.update_info()
+
+    def update_axes(self):
+        self.matrix_model.setAxes(self.row_combo.currentText(), self.col_combo.currentText(),
+                                  self.value_combo.currentText())
+
+    def update_kinds(self):
+        """Fills the order kind selector with the kinds present in the table."""
+        kinds = self.matrix_model.orderKinds()
+        self.kind_combo.blockSignals(True)
+        self.kind_combo.clear()
+        for kind in kinds:
+            self.kind_combo.addItem(str(kind), kind)
+        if kinds:
+            self.kind_combo.setCurrentIndex(kinds.index(self.matrix_model.orderKind()))
+        self.kind_combo.blockSignals(False)
+        self.kind_label.setVisible(bool(kinds))
+        self.kind_combo.setVisible(bool(kinds))
+        self.kind_combo.setEnabled(len(kinds) > 1)
+
+    def update_order_kind(self, index):
+        if index >= 0:
+            self.matrix_model.setOrderKind(self.kind_combo.itemData(index))
+
+    def update_info(self):
+        grid = self.matrix_model.matrixLayout()
+        if grid is None:
+            self.info_label.setText("Achsen-Spalten nicht im Tarif vorhanden.")
+            return
+        rows, cols = grid.shape
+        text = f"{rows} × {cols} Zellen"
+        if grid.duplicates:
+            text += f" – {grid.duplicates} Zeilen teilen sich eine Zelle mit einer anderen Zeile (nur eine wird angezeigt)"
+        self.info_label.setText(text)
+
+    def _export_data(self):
+        """(layout, values of the value column, is money) or None if the grid is empty."""
+        grid = self.matrix_model.matrixLayout()
+        if grid is None or grid.cell_rows.size == 0:
+            QMessageBox.warning(self, "Fehler", "Die Matrix ist leer.")
+            return None
+        value_column = self.matrix_model.axes()[2]
+        return grid, self.source_model.columnValues(value_column), self.source_model.columnIsMoney(value_column)
+
+    def copy_to_clipboard(self):
+        data = self._export_data()
+        if data is None:
+            return
+        grid, values, money = data
+        QApplication.clipboard().setText(matrix_tsv(grid, grid_texts(grid, values, money)))
+
+    def export_file(self):
+        data = self._export_data()
+        if data is None:
+            return
+        path, _ = QFileDialog.getSaveFileName(self, "Matrix exportieren", "", "Excel (*.xlsx);;CSV (*.csv)")
+        if not path:
+            return
+        try:
+            export_matrix(path, *data)
+        except Exception as e:
+            QMessageBox.critical(self, "Fehler", f"Export fehlgeschlagen:\n{str(e)}")
@@ -1,18 +1,27 @@
 import os
+import numpy as np
 import pandas as pd
 from PySide6.QtWidgets import (QMainWindow, QWidget, QVBoxLayout, QHBoxLayout, 
                                QTableView, QPushButton, QLabel, QLineEdit, QComboBox, 
                                QDockWidget, QFrame, QFileDialog, QMessageBox, QDialog, 
-                               QDialogButtonBox, QRadioButton, QButtonGroup, QDateEdit, QHeaderView, QApplication)
-from PySide6.QtCore import Qt, QDate, QSize, QTimer, QEvent
+                               QDialogButtonBox, QRadioButton, QButtonGroup, QDateEdit, QHeaderView, QApplication,
+                               QCheckBox)
+from PySide6.QtCore import Qt, QDate, QSize, QTimer, QEvent, QFileSystemWatcher, QStandardPaths
 from PySide6.QtGui import QColor, QPalette, QIcon, QPixmap, QPainter, QFont
 
 # Adjust import based on sys.path setup in main.py
 from core.tariff_engine import TariffEngine
+from core.comtec_document import ComtecDocument
+from core.compressed_io import XML_SAVE_FILTER, with_filter_suffix
+from core.edit_journal import EditJournal
+from core.compaction import compact_brackets, verify_compaction
+from core.dedupe import find_duplicates
 
 from .models import PandasModel, FilterProxyModel
 from .widgets import FilterHeader, EnhancedTableView
-from .dialogs import BulkUpdateDialog, MatrixImportDialog, DefinitionEditorDialog
+from .scheduler import TaskScheduler
+from .dialogs import (BulkUpdateDialog, MatrixImportDialog, DefinitionEditorDialog, GeneratorDialog, MatrixViewDialog,
+                      DuplicatesDialog)
 
 from core.utils import get_resource_path
 
@@ -46,6 +55,12 @@ class MainWindow(QMainWindow):
         
         self.engine = TariffEngine()
         
+        # Invalidate the definition registry when TariffDefinitions changes on disk
+        self.definition_watcher = QFileSystemWatcher(self)
+        self.definition_watcher.directoryChanged.connect(self._on_definitions_changed)
+        self.definition_watcher.fileChanged.connect(self._on_definitions_changed)
+        self._watch_definitions()
+        
         # Use centralized path logic
         self.template_folder = get_resource_path("XML Vorlage")
         
@@ -73,6 +88,9 @@ class MainWindow(QMainWindow):
         self.header.setSectionResizeMode(QHeaderView.Stretch)
         self.header.filterChanged.connect(self.proxy_model.setFilterByColumn)
         self.table_view.setHorizontalHeader(self.header)
+        # Header clicks sort the source model in place (stable NumPy sort, see PandasModel.sort)
+        self.header.setSortIndicator(-1, Qt.AscendingOrder)
+        self.table_view.setSortingEnabled(True)
         
         self.table_view.setAlternatingRowColors(True)
         self.table_view.setSelectionBehavior(QTableView.SelectRows)
@@ -186,6 +204,18 @@ class MainWindow(QMainWindow):
         self.spec_label.setPlaceholderText("Tarif-Spezifikation")
         self.header_layout.addWidget(self.spec_label)
 
+        # Tariff item selector, only shown for documents with several tariffs / items
+        self.item_label = QLabel("Position:")
+        self.item_combo = QComboBox()
+        self.item_combo.setMinimumWidth(220)
+        self.item_combo.currentIndexChanged.connect(self.switch_tariff_item)
+        self.header_layout.addWidget(self.item_label)
+        self.header_layout.addWidget(self.item_combo)
+        self.item_label.hide()
+        self.item_combo.hide()
+        self.document = None     # ComtecDocument when the loaded file holds more than one item
+        self.current_item = None
+
         # Header inputs are enabled by default (User request)
 
         self.main_layout.insertWidget(0, self.header_frame)
@@ -250,14 +280,43 @@ class MainWindow(QMainWindow):
         matrix_btn.setProperty("class", "primary-btn") 
         self.action_layout.addWidget(matrix_btn)
 
+        # Tariff Generator (breakpoints + pricing function)
+        generator_btn = QPushButton("⚙ Generator")
+        generator_btn.clicked.connect(self.open_generator)
+        self.action_layout.addWidget(generator_btn)
+
+        # Grid view (distance × weight) of the current table
+        matrix_view_btn = QPushButton("▦ Matrix-Ansicht")
+        matrix_view_btn.clicked.connect(self.open_matrix_view)
+        self.action_layout.addWidget(matrix_view_btn)
+
         # Bulk Update Button
         bulk_btn = QPushButton("📉 %-Anpassung")
         bulk_btn.clicked.connect(self.open_bulk_update_dialog)
         self.action_layout.addWidget(bulk_btn)
 
+        # Exact duplicates and conflicting brackets (e.g. after repeated imports)
+        duplicates_btn = QPushButton("🧹 Duplikate")
+        duplicates_btn.clicked.connect(self.open_duplicates_dialog)
+        self.action_layout.addWidget(duplicates_btn)
+
         # Spacer to push Generate to the right
         self.action_layout.addStretch()
 
+        # Keep the original file's formatting, comments and unknown elements on save
+        self.lossless_check = QCheckBox("Originalformat beibehalten")
+        self.lossless_check.setChecked(True)
+        self.lossless_check.setToolTip("Speichert nur geänderte Werte in die geladene Datei zurück; "
+                                       "Formatierung und Kommentare bleiben byte-genau erhalten.")
+        self.action_layout.addWidget(self.lossless_check)
+
+        # Merge neighbouring brackets with identical prices before saving
+        self.compact_check = QCheckBox("Stufen zusammenfassen")
+        self.compact_check.setToolTip("Fasst benachbarte Gewichts-/Volumen- und Entfernungsstufen mit gleichem "
+                                      "Preis, Rate und gleichen IDs vor dem Speichern zu einer Stufe zusammen. "
+                                      "Gespeichert wird nur, wenn die Preisfindung nachweislich unverändert bleibt.")
+        self.action_layout.addWidget(self.compact_check)
+
         # Generate XML
         gen_btn = QPushButton("💾 XML generieren")
         gen_btn.clicked.connect(self.generate_xml)
@@ -280,12 +339,29 @@ class MainWindow(QMainWindow):
         self.model.setDataFrame(pd.DataFrame()) # Empty start
         self.update_ui_state() # Initial state check
 
+        # Crash recovery: every edit is journaled as a delta against the last clean save
+        # Each window journals into a file of its own; journals of crashed sessions are offered on start
+        self.journal_dir = QStandardPaths.writableLocation(QStandardPaths.AppLocalDataLocation)
+        self.journal = EditJournal.for_session(self.journal_dir)
+        self.name_edit.editingFinished.connect(self._journal_metadata)
+        self.valid_from.dateChanged.connect(self._journal_metadata)
+        self.valid_to.dateChanged.connect(self._journal_metadata)
+        QTimer.singleShot(0, self._offer_recovery)
+
+        # Filter index, filter mask and journal sync catch up in the background after edits
+        self.scheduler = TaskScheduler(self)
+        self.scheduler.failed.connect(self._background_failed)
+        self._requested_revision = {} # Job key -> model revision it was last scheduled for
+        for signal in (self.model.dataChanged, self.model.rowsInserted, self.model.rowsRemoved,
+                       self.model.modelReset, self.model.layoutChanged):
+            signal.connect(self._schedule_background_work)
+        self.table_view.horizontalScrollBar().valueChanged.connect(self._schedule_background_work)
+
     def update_ui_state(self):
         """Toggles between Placeholder and Table View based on data existence."""
-        df = self.model.getDataFrame()
-        # has_data = df is not None and not df.empty
+        # has_data = rows exist
         # Modified so that empty tables (but with Schema/Columns) are also shown!
-        has_data = df is not None and len(df.columns) > 0
+        has_data = self.model.columnCount() > 0
         
         if has_data:
             self.placeholder_widget.hide()
@@ -302,23 +378,106 @@ class MainWindow(QMainWindow):
             self.action_frame.hide()
 
     def open_xml_file(self):
-        file_path, _ = QFileDialog.getOpenFileName(self, "XML Datei öffnen", self.template_folder, "XML Files (*.xml)")
+        file_path, _ = QFileDialog.getOpenFileName(self, "XML Datei öffnen", self.template_folder,
+                                                   "XML Files (*.xml *.xml.gz *.xml.zst)")
         if file_path:
             self._load_file(file_path)
 
     def _load_file(self, path):
         if not os.path.exists(path):
             return
+        self.model.setJournal(None)
+
+        try:
+            document = ComtecDocument.open(path)
+        except Exception:
+            document = None # Let load_template report the problem
+
+        if document is not None and len(document) > 1:
+            # Index only; each item is parsed when it is selected
+            self.document = document
+            self.current_item = None
+            self.item_combo.blockSignals(True)
+            self.item_combo.clear()
+            self.item_combo.addItems([document.label(item) for item in document.items()])
+            self.item_combo.setCurrentIndex(0)
+            self.item_combo.blockSignals(False)
+            self.item_label.show()
+            self.item_combo.show()
+            self._load_item(0)
+            return
 
-        success, msg = self.engine.load_template(path)
+        self._clear_document()
+        if document is not None:
+            # A single item: its document is the file itself, already read (and decompressed) above
+            success, msg = self.engine.load_bytes(document.raw, path)
+        else:
+            success, msg = self.engine.load_template(path)
         if not success:
             QMessageBox.critical(self, "Error", msg)
             return
-            
+        self._show_loaded()
+
+    def _clear_document(self):
+        self.document = None
+        self.current_item = None
+        self.item_label.hide()
+        self.item_combo.hide()
+
+    def _load_item(self, position):
+        """Loads one tariff item of the open document into the engine and the table."""
+        item = self.document.items()[position]
+        success, msg = self.engine.load_bytes(self.document.item_document(item), self.document.path)
+        if not success:
+            QMessageBox.critical(self, "Error", msg)
+            return False
+        self.current_item = item
+        self._show_loaded()
+        return True
+
+    def _current_item_position(self):
+        if self.document is None or self.current_item is None:
+            return None
+        return self.document.items().index(self.current_item)
+
+    def _commit_item(self, df=None, origins=None):
+        """Writes the table (or df with its origins) and header back into the open document's current item."""
+        if self.document is None or self.current_item is None:
+            return
+        self.engine.update_metadata(self._metadata_from_header())
+        if df is None:
+            df, origins = self.model.getDataFrame(), self.model.rowOrigins()
+        if self.lossless_check.isChecked() and self.engine.can_save_lossless():
+            data = self.engine.render_lossless(df, origins)
+        else:
+            self.engine.update_tuples(df)
+            data = self.engine.render_xml().encode('utf-8')
+        self.document.replace_item(self.current_item, data)
+        position = self.document.items().index(self.current_item)
+        self.item_combo.setItemText(position, self.document.label(self.current_item))
+
+    def switch_tariff_item(self, position):
+        if self.document is None or position < 0:
+            return
+        try:
+            self._commit_item()
+        except Exception as e:
+            QMessageBox.critical(self, "Fehler", f"Position konnte nicht übernommen werden:\n{str(e)}")
+            # Stay on the current item so its edits are not lost
+            self.item_combo.blockSignals(True)
+            self.item_combo.setCurrentIndex(self.document.items().index(self.current_item))
+            self.item_combo.blockSignals(False)
+            return
+        self.model.setJournal(None)
+        self._load_item(position)
+
+    def _show_loaded(self):
+        """Fills header and table from the template the engine just loaded."""
         # Load Metadata
         meta = self.engine.get_metadata()
         self.name_edit.setText(meta.get('name', ''))
         self.spec_label.setText(meta.get('spec', ''))
+        self._show_definition_status()
         
         # Parse Dates
         try:
@@ -331,9 +490,11 @@ class MainWindow(QMainWindow):
             pass # Keep default if parse fails
         
         # Load Data
-        result = self.engine.extract_tuples_check_schema()
-        df = pd.DataFrame(result['data'])
-        self.model.setDataFrame(df)
+        # Typed according to the tariff definition (cents, float32 brackets, int8 ids)
+        df = self.engine.load_table()
+        # Rows remember their tuple in the file so saves can splice instead of rewriting
+        self.model.setDataFrame(df, self.engine.schema, np.arange(len(df)))
+        self.header.setSortIndicator(-1, Qt.AscendingOrder)
         self.update_ui_state()
         
         # Auto-detect Order Kind
@@ -356,6 +517,138 @@ class MainWindow(QMainWindow):
         except:
              pass
         self.kind_combo.currentTextChanged.connect(self.update_order_kind_in_table)
+        self._start_journal(source=self.engine.current_file_path, item=self._current_item_position())
+
+    def _start_journal(self, **base):
+        """Starts a fresh journal for edits on top of base (see EditJournal.start)."""
+        try:
+            self.model.setJournal(self.journal.start(**base))
+        except OSError as e:
+            self.model.setJournal(None)
+            self.statusBar().showMessage(f"Automatische Sicherung nicht verfügbar: {e}", 10000)
+
+    def _journal_metadata(self, *args):
+        if self.journal.is_open:
+            self.journal.record_metadata(self._metadata_from_header())
+
+    def _offer_recovery(self):
+        """
+        Offers to replay the newest journal of a session that did not end cleanly.
+        Further crashed sessions stay on disk and are offered by the next window.
+        """
+        orphan = None
+        for journal in EditJournal.orphans(self.journal_dir):
+            base_record, journal_records = EditJournal.read(journal.path)
+            if base_record is None or not journal_records:
+                journal.discard() # Nothing to recover
+            elif orphan is None:
+                orphan, base, records = journal, base_record, journal_records
+            else:
+                journal.release()
+        if orphan is None:
+            return
+        what = base.get('source') or base.get('definition') or "?"
+        reply = QMessageBox.question(self, "Wiederherstellen",
+                                     f"Eine frühere Sitzung wurde nicht sauber beendet.\n"
+                                     f"{len(records)} ungesicherte Änderungen an '{os.path.basename(what)}' wiederherstellen?",
+                                     QMessageBox.Yes | QMessageBox.No)
+        if reply != QMessageBox.Yes:
+            orphan.discard()
+            return
+        try:
+            if base.get('source'):
+                self._load_file(base['source'])
+                if base.get('item') is not None and self.document is not None:
+                    self.item_combo.setCurrentIndex(base['item'])
+            elif base.get('definition'):
+                self.model.setJournal(None)
+                result = self.engine.create_from_definition(base['definition'])
+                self._clear_document()
+                self.model.setDataFrame(result['data'], self.engine.schema)
+                self.spec_label.setText(base['definition'].replace(".json", ""))
+                self._show_definition_status()
+                self.update_ui_state()
+            else:
+                orphan.release()
+                return
+        except Exception as e:
+            orphan.release()
+            QMessageBox.critical(self, "Fehler", f"Wiederherstellung fehlgeschlagen:\n{str(e)}")
+            return
+
+        # Replay with the journal detached (the orphan stays untouched until then),
+        # then restart this session's journal on the same base and take the edits over
+        self.model.setJournal(None)
+        meta = self.model.applyJournal(orphan, records)
+        if meta:
+            self.name_edit.setText(meta.get('name', ''))
+            for edit, key in ((self.valid_from, 'valid_from'), (self.valid_to, 'valid_to')):
+                date = QDate.fromString(meta.get(key, ''), "yyyy-MM-dd")
+                if date.isValid():
+                    edit.setDate(date)
+        self.update_ui_state()
+        self._start_journal(**{k: base.get(k) for k in ('source', 'item', 'definition')})
+        if self.journal.is_open:
+            self.journal.adopt(orphan, records)
+            orphan.discard()
+        else:
+            orphan.release() # Keep it for the next start rather than losing the edits
+
+    def closeEvent(self, event):
+        # A clean exit leaves nothing to recover
+        self.scheduler.shutdown()
+        self.journal.discard()
+        super().closeEvent(event)
+
+    def _visible_columns(self):
+        first = self.table_view.columnAt(0)
+        last = self.table_view.columnAt(self.table_view.viewport().width() - 1)
+        if first < 0:
+            return set()
+        if last < 0:
+            last = self.model.columnCount() - 1
+        return set(range(first, last + 1))
+
+    def _schedule_background_work(self, *args):
+        """
+        Coalesces model change notifications (and scrolling, which changes which columns
+        come first) into debounced background recomputes. Results that are already
+        current, or being computed for the current revision, are not requested again.
+        """
+        model, proxy = self.model, self.proxy_model
+        revision = model.revision()
+        if proxy.filters and not proxy.acceptMaskIsFresh():
+            self.scheduler.schedule("filter_mask", lambda cancelled: proxy.computeAcceptMask(),
+                                    lambda result: proxy.storeAcceptMask(*result), TaskScheduler.TABLE)
+        # Distinct values for the filter dialogs, visible columns first
+        visible = self._visible_columns()
+        for col in range(model.columnCount()):
+            key = f"filter_values:{col}"
+            if model.filterValuesAreFresh(col) or (self._requested_revision.get(key) == revision
+                                                   and self.scheduler.is_scheduled(key)):
+                continue
+            self._requested_revision[key] = revision
+            self.scheduler.schedule(key,
+                                    lambda cancelled, c=col: model.computeFilterValues(c),
+                                    lambda result, c=col: model.storeFilterValues(c, *result),
+                                    TaskScheduler.VIEWPORT if col in visible else TaskScheduler.IDLE)
+        if self.journal.is_open:
+            self.scheduler.schedule("journal_sync", lambda cancelled: self.journal.sync(),
+                                    priority=TaskScheduler.IDLE, delay_ms=2000)
+
+    def _background_failed(self, key, error):
+        # The dialogs recompute filter values on demand, so a failed job only costs that wait
+        self._requested_revision.pop(key, None)
+        self.statusBar().showMessage(f"Hintergrundberechnung '{key}' fehlgeschlagen: {error}", 10000)
+
+    def _show_definition_status(self):
+        """Tooltip on the spec field naming the resolved definition, or what does not match."""
+        issues = self.engine.definition_issues()
+        if self.engine.definition_name:
+            lines = [f"Definition: {self.engine.definition_name}"] + issues
+        else:
+            lines = issues
+        self.spec_label.setToolTip("\n".join(lines))
 
     def update_order_kind_in_table(self):
         kind_str = self.kind_combo.currentText()
@@ -365,34 +658,32 @@ class MainWindow(QMainWindow):
         
         # Since using Proxy Model, we must be careful. 
         # Easier to update source model directly.
-        df = self.model.getDataFrame()
-        if not df is None and not df.empty and 'id_orderkind' in df.columns:
-            df['id_orderkind'] = val
-            self.model.setDataFrame(df)
+        if self.model.rowCount() > 0 and 'id_orderkind' in self.model.columns():
+            self.model.updateColumn('id_orderkind', val)
 
     def open_bulk_update_dialog(self):
-        df = self.model.getDataFrame()
-        if df.empty:
+        if self.model.rowCount() == 0:
             QMessageBox.warning(self, "Info", "Tabelle ist leer. Bitte laden Sie zuerst einen Tarif.")
             return
             
         # Get selected rows
         selection = self.table_view.selectionModel()
-        selected_rows = []
+        selected_rows = None
         if selection.hasSelection():
-            proxy_indexes = selection.selectedRows()
-            selected_rows = [self.proxy_model.mapToSource(idx).row() for idx in proxy_indexes]
+            # Sorted int64 array built from the selection ranges, not per-index mapping
+            selected_rows = self.proxy_model.selectedSourceRows(selection)
             
         dialog = BulkUpdateDialog(self.engine, self.model, selected_rows, self)
         dialog.exec()
 
     def add_row(self):
-        df = self.model.getDataFrame()
+        # Only shape and dtypes are needed here, so the DataFrame is not materialized
+        row_count = self.model.rowCount()
         
         # Get defaults
         defaults = self.engine.get_parameter_defaults()
         
-        if df.empty:
+        if row_count == 0:
             # If dataframe is empty, create a new one with default columns
             current_schema = self.engine.get_current_schema()
             if not current_schema:
@@ -402,39 +693,40 @@ class MainWindow(QMainWindow):
             # Use defaults or fallback to ""
             new_row_data = {}
             for col in current_schema:
-                new_row_data[col] = defaults.get(col, "")
+                new_row_data[col] = [defaults.get(col, "")]
                 
-            new_df = pd.DataFrame([new_row_data])
-            self.model.setDataFrame(new_df)
+            new_df = self.engine.coerce_frame(pd.DataFrame(new_row_data))
+            if self.model.columnCount() == 0:
+                self.model.setDataFrame(new_df, self.engine.schema)
+            else:
+                self.model.appendRows(new_df)
             self.update_ui_state()
         else:
             # Create a new row with the same columns as the existing DataFrame
             new_row_data = {}
-            for col in df.columns:
+            for col in self.model.columns():
                 # 1. Try engine defaults
                 if col in defaults:
-                    new_row_data[col] = defaults[col]
+                    new_row_data[col] = [defaults[col]]
                 # 2. Try to infer from existing data (if previous rows exist)
-                elif len(df) > 0 and pd.api.types.is_numeric_dtype(df[col]):
-                    new_row_data[col] = 0.0
+                elif self.model.columnIsNumeric(col):
+                    new_row_data[col] = [0.0]
                 # 3. Fallback
                 else:
-                    new_row_data[col] = ""
+                    new_row_data[col] = [""]
                     
-            new_row_df = pd.DataFrame([new_row_data])
-            df = pd.concat([df, new_row_df], ignore_index=True)
-            self.model.setDataFrame(df)
+            # Appended into the model's growable buffer, O(1) amortized
+            self.model.appendRows(self.engine.coerce_frame(pd.DataFrame(new_row_data)))
 
     def open_matrix_import(self):
         # Get current column names
-        df = self.model.getDataFrame()
+        cols = self.model.columns()
         
         # Check if Schema exists (Columns) rather than data (Rows)
-        if df is None or len(df.columns) == 0:
+        if len(cols) == 0:
             QMessageBox.warning(self, "Fehler", "Bitte erstelle erst einen neuen oder öffne einen bestehenden Tarif.")
             return
             
-        cols = df.columns.tolist()
         dialog = MatrixImportDialog(cols, self)
         if dialog.exec() == QDialog.Accepted:
             new_data = dialog.result_data
@@ -455,8 +747,9 @@ class MainWindow(QMainWindow):
             except:
                  selected_kind = 0
 
-            # Ensure new_df has all columns of 'df'
-            for col in df.columns:
+            # Ensure new_df has all columns of the table
+            row_count = self.model.rowCount()
+            for col in cols:
                 if col not in new_df.columns:
                     # 1. Check for specific overrides first
                     if col == 'id_orderkind':
@@ -466,7 +759,7 @@ class MainWindow(QMainWindow):
                         val = defaults[col]
                     # 3. Fallback (try existing row or 0)
                     else:
-                        val = df.iloc[0][col] if not df.empty else 0
+                        val = self.engine.schema.user_value(col, self.model.cellValue(0, col)) if row_count > 0 else 0
                     
                     new_df[col] = val
                     
@@ -475,12 +768,69 @@ class MainWindow(QMainWindow):
             # Check if we should Replace or Append (Based on Dialog Selection)
             # If dialog.replace_mode is True, we clear existing data first
             if getattr(dialog, 'replace_mode', False):
-                 df = pd.DataFrame(columns=df.columns) # Clear but keep schema
+                 # Clear but keep schema
+                 self.model.removeRowsByMask(np.ones(row_count, dtype=bool))
             
-            combined_df = pd.concat([df, new_df], ignore_index=True)
-            self.model.setDataFrame(combined_df)
+            self.model.appendRows(self.engine.coerce_frame(new_df))
             # QMessageBox.information(self, "Import", f"{len(new_data)} Zeilen importiert.")
 
+            # Appending the same paste twice leaves duplicates the upload would reject
+            if not getattr(dialog, 'replace_mode', False):
+                report = find_duplicates(self.model.getDataFrame())
+                if not report.is_clean:
+                    reply = QMessageBox.question(self, "Duplikate",
+                                                 f"Nach dem Import enthält der Tarif {report.exact.size} exakte Duplikate "
+                                                 f"und {report.conflicts.size} Konflikte. Jetzt prüfen?",
+                                                 QMessageBox.Yes | QMessageBox.No)
+                    if reply == QMessageBox.Yes:
+                        self.open_duplicates_dialog()
+
+    def open_duplicates_dialog(self):
+        if self.model.rowCount() == 0:
+            return
+        dialog = DuplicatesDialog(self.model, self)
+        if dialog.exec() == QDialog.Accepted:
+            self.update_ui_state()
+
+    def open_matrix_view(self):
+        if self.model.columnCount() == 0:
+            QMessageBox.warning(self, "Fehler", "Bitte erstelle erst einen neuen oder öffne einen bestehenden Tarif.")
+            return
+        # Non-modal, so table and grid can be edited side by side
+        dialog = MatrixViewDialog(self.model, self)
+        dialog.setAttribute(Qt.WA_DeleteOnClose)
+        dialog.show()
+
+    def open_generator(self):
+        if self.model.columnCount() == 0:
+            QMessageBox.warning(self, "Fehler", "Bitte erstelle erst einen neuen oder öffne einen bestehenden Tarif.")
+            return
+
+        kind = 2 if self.kind_combo.currentText() == "Distribution" else 3
+        dialog = GeneratorDialog(self.engine, kind, self)
+        if dialog.exec() != QDialog.Accepted or dialog.result_df is None:
+            return
+
+        if dialog.stream_path:
+            # Large grids go straight to disk without passing through the table
+            try:
+                self.engine.update_metadata(self._metadata_from_header())
+                self.engine.save_streaming(dialog.result_df, dialog.stream_path)
+            except Exception as e:
+                QMessageBox.critical(self, "Fehler", f"Fehler beim Speichern:\n{str(e)}")
+            return
+
+        self.model.setDataFrame(dialog.result_df, self.engine.schema)
+        self.update_ui_state()
+
+    def _metadata_from_header(self):
+        return {
+            'name': self.name_edit.text(),
+            'valid_from': self.valid_from.date().toString("yyyy-MM-dd"),
+            'valid_to': self.valid_to.date().toString("yyyy-MM-dd"),
+            'id': self.name_edit.text()
+        }
+
     def update_delete_button_state(self):
         selection = self.table_view.selectionModel()
         if selection.hasSelection():
@@ -490,9 +840,9 @@ class MainWindow(QMainWindow):
 
     def delete_rows_action(self):
         selection = self.table_view.selectionModel()
-        df = self.model.getDataFrame()
+        row_count = self.model.rowCount()
         
-        if df.empty:
+        if row_count == 0:
              return
 
         if not selection.hasSelection():
@@ -501,28 +851,23 @@ class MainWindow(QMainWindow):
                                            "Möchten Sie wirklich ALLE Zeilen löschen?", 
                                            QMessageBox.Yes | QMessageBox.No)
             if confirm == QMessageBox.Yes:
-                # Clear DataFrame but keep columns
-                empty_df = pd.DataFrame(columns=df.columns)
-                # Clear DataFrame but keep columns
-                empty_df = pd.DataFrame(columns=df.columns)
-                self.model.setDataFrame(empty_df)
+                # Remove every row as one range, keeping the columns
+                self.model.removeRowsByMask(np.ones(row_count, dtype=bool))
                 self.update_ui_state()
         else:
-            # Delete SELECTED rows
-            proxy_indexes = selection.selectedRows()
-            source_indexes = [self.proxy_model.mapToSource(idx).row() for idx in proxy_indexes]
-            rows = set(source_indexes)
+            # Delete SELECTED rows, mapped from the selection ranges in bulk
+            rows = self.proxy_model.selectedSourceRows(selection)
             
-            if not rows: return
+            if not len(rows): return
 
             confirm = QMessageBox.critical(self, "Löschen bestätigen", 
                                            f"Möchten Sie wirklich {len(rows)} ausgewählte Zeile(n) löschen?", 
                                            QMessageBox.Yes | QMessageBox.No)
             
             if confirm == QMessageBox.Yes:
-                df = df.drop(list(rows))
-                df = df.reset_index(drop=True)
-                self.model.setDataFrame(df)
+                mask = np.zeros(row_count, dtype=bool)
+                mask[rows] = True
+                self.model.removeRowsByMask(mask)
                 # Clear selection after delete to reset button text
                 self.table_view.clearSelection()
 
@@ -533,13 +878,7 @@ class MainWindow(QMainWindow):
     def generate_xml(self):
         try:
             # 1. Update Metadata
-            new_meta = {
-                'name': self.name_edit.text(),
-                'valid_from': self.valid_from.date().toString("yyyy-MM-dd"),
-                'valid_to': self.valid_to.date().toString("yyyy-MM-dd"),
-                'id': self.name_edit.text()
-            }
-            self.engine.update_metadata(new_meta)
+            self.engine.update_metadata(self._metadata_from_header())
 
             # 2. Update Order Kind
             df = self.model.getDataFrame()
@@ -548,15 +887,41 @@ class MainWindow(QMainWindow):
                 df = self.engine.set_order_kind(df, 2)
             elif kind_str == "Retoure":
                 df = self.engine.set_order_kind(df, 3)
+            origins = self.model.rowOrigins()
 
-            # 3. Update XML
-            self.engine.update_tuples(df)
+            # 3. Optionally merge brackets, but only if every price stays the same
+            compaction = None
+            if self.compact_check.isChecked():
+                compaction = compact_brackets(df)
+                mismatches = verify_compaction(df, compaction.frame)
+                if mismatches:
+                    QMessageBox.warning(self, "Stufen zusammenfassen",
+                                        f"Das Zusammenfassen würde die Preisfindung ändern ({mismatches} Prüfpunkte "
+                                        f"weichen ab, z.B. wegen überlappender Stufen). Es wurde nicht gespeichert.")
+                    return
+                df, origins = compaction.frame, origins[compaction.keep]
 
             # 4. Save
             default_name = self.name_edit.text() + ".xml"
-            save_path, _ = QFileDialog.getSaveFileName(self, "XML speichern", default_name, "XML Files (*.xml)")
-            if save_path:
+            save_path, selected_filter = QFileDialog.getSaveFileName(self, "XML speichern", default_name, XML_SAVE_FILTER)
+            if not save_path:
+                return
+            save_path = with_filter_suffix(save_path, selected_filter)
+            if self.document is not None:
+                # Multi-item file: put this item back and write the whole document in one pass
+                self._commit_item(df, origins)
+                self.document.save(save_path, self.engine.compression_level)
+            elif self.lossless_check.isChecked() and self.engine.can_save_lossless():
+                # Splice the edits into the loaded file's bytes
+                self.engine.save_lossless(df, origins, save_path)
+            else:
+                self.engine.update_tuples(df)
                 self.engine.save_to_file(save_path)
+            if compaction is not None and compaction.merged:
+                # Show what was saved, so further edits and the journal match the file
+                self.model.setDataFrame(df, origins=origins)
+            # The saved file is the new clean state to recover from
+            self._start_journal(source=save_path, item=self._current_item_position())
         except Exception as e:
             QMessageBox.critical(self, "Fehler", f"Ein Fehler ist aufgetreten:\n{str(e)}")
             import traceback
@@ -649,7 +1014,9 @@ class MainWindow(QMainWindow):
 
             try:
                 # Create from definition
+                self.model.setJournal(None)
                 result = self.engine.create_from_definition(selected_def)
+                self._clear_document()
                 df = result['data']
                 
                 # Apply Order Kind to DataFrame
@@ -657,7 +1024,7 @@ class MainWindow(QMainWindow):
                     df['id_orderkind'] = selected_kind
                 
                 # Update GUI
-                self.model.setDataFrame(df)
+                self.model.setDataFrame(df, self.engine.schema)
                 self.update_ui_state()
                 
                 # Update Header UI to match selection
@@ -671,12 +1038,31 @@ class MainWindow(QMainWindow):
                 # Update Metadata fields
                 self.name_edit.setText(tariff_name)
                 self.spec_label.setText(selected_def.replace(".json", "")) # Show clean name
+                self._show_definition_status()
                 self.valid_from.setDate(date_from)
                 self.valid_to.setDate(date_to)
+                self._start_journal(definition=selected_def)
+                self._journal_metadata()
                 
             except Exception as e:
                 QMessageBox.critical(self, "Fehler", f"Fehler beim Erstellen des Tarifs: {str(e)}")
 
+    def _watch_definitions(self):
+        folder = self.engine.definitions_folder
+        if not os.path.isdir(folder):
+            return
+        registry = self.engine.definitions
+        names = registry.filenames() + list(registry.errors()) # Invalid files too, so fixing them is noticed
+        paths = [folder] + [os.path.join(folder, f) for f in names]
+        watched = set(self.definition_watcher.directories() + self.definition_watcher.files())
+        missing = [p for p in paths if p not in watched]
+        if missing:
+            self.definition_watcher.addPaths(missing)
+
+    def _on_definitions_changed(self, path):
+        self.engine.definitions.invalidate(path if path.endswith('.json') else None)
+        self._watch_definitions() # Pick up new files; replaced files drop out of the watch list
+
     def open_definition_editor(self):
         dialog = DefinitionEditorDialog(self.engine, self)
         if dialog.exec() == QDialog.Accepted:
@@ -1,10 +1,31 @@
+import numpy as np
 import pandas as pd
 from PySide6.QtCore import Qt, QAbstractTableModel, QModelIndex, QSortFilterProxyModel
 
+from core.column_buffer import ColumnBuffer
+from core.schema import format_cents
+from core.matrix import MatrixLayout
+
+def format_display_value(value):
+    """DisplayRole text for a single cell value."""
+    if isinstance(value, (float, np.floating)):
+        value = float(value)
+        # If it has no decimal part, show as int
+        if value.is_integer():
+            return str(int(value))
+        return f"{value:.2f}"
+    return str(value)
+
 class FilterProxyModel(QSortFilterProxyModel):
     def __init__(self, parent=None):
         super().__init__(parent)
         self.filters = {}  # {column_index: set_of_allowed_values}
+        self.setSortRole(PandasModel.SortRole) # Used only if QSortFilterProxyModel sorts by itself
+        # Vectorized filter result, recomputed whenever the source model revision changes
+        self._accept_mask = None
+        self._mask_revision = None
+        self._rowwise_revision = None
+        self._rowwise_count = 0
 
     def setFilterByColumn(self, column, allowed_values):
         if allowed_values is None:
@@ -12,59 +33,229 @@ class FilterProxyModel(QSortFilterProxyModel):
                 del self.filters[column]
         else:
             self.filters[column] = set(str(v) for v in allowed_values)
+        self._accept_mask = None
         self.invalidateFilter()
 
     def clearFilters(self):
         self.filters.clear()
+        self._accept_mask = None
         self.invalidateFilter()
 
-    def filterAcceptsRow(self, source_row, source_parent):
-        if not self.filters:
-            return True
-            
+    # While the mask is stale, up to this many rows are checked one by one before
+    # the whole mask is recomputed (edits re-filter only the rows they touched)
+    ROWWISE_LIMIT = 256
+
+    def sort(self, column, order=Qt.AscendingOrder):
+        """
+        Sorting is done by the source model (a NumPy sort over the raw columns), so the
+        proxy only filters and keeps an unsorted, cheap row mapping.
+        """
+        self.sourceModel().sort(column, order)
+
+    def computeAcceptMask(self):
+        """(model revision, mask) for the current filters; safe to call from a worker thread."""
+        model = self.sourceModel()
+        revision = model.revision()
+        mask = np.ones(model.rowCount(), dtype=bool)
+        for col, allowed in list(self.filters.items()):
+            if col < model.columnCount():
+                mask &= model.columnMatches(col, allowed)
+        return revision, mask
+
+    def storeAcceptMask(self, revision, mask):
+        """Takes a mask computed in the background, unless the model changed since."""
+        if revision == self.sourceModel().revision():
+            self._accept_mask = mask
+            self._mask_revision = revision
+
+    def acceptMaskIsFresh(self):
+        return self._accept_mask is not None and self._mask_revision == self.sourceModel().revision()
+
+    def acceptMask(self):
+        """Boolean mask over all source rows, True where the row passes every column filter."""
+        if not self.acceptMaskIsFresh():
+            self.storeAcceptMask(*self.computeAcceptMask())
+        return self._accept_mask
+
+    def _rowAccepted(self, source_row):
         model = self.sourceModel()
         for col, allowed in self.filters.items():
-            index = model.index(source_row, col, source_parent)
-            data = model.data(index, Qt.DisplayRole)
-            if str(data) not in allowed:
+            if col < model.columnCount() and model.data(model.index(source_row, col)) not in allowed:
                 return False
         return True
 
+    def filterAcceptsRow(self, source_row, source_parent):
+        if not self.filters:
+            return True
+
+        if not self.acceptMaskIsFresh() and self._accept_mask is not None:
+            # Stale after an edit: check the few re-filtered rows directly and leave
+            # the full recompute to the background scheduler
+            revision = self.sourceModel().revision()
+            if self._rowwise_revision != revision:
+                self._rowwise_revision, self._rowwise_count = revision, 0
+            if self._rowwise_count < self.ROWWISE_LIMIT:
+                self._rowwise_count += 1
+                return self._rowAccepted(source_row)
+
+        mask = self.acceptMask()
+        return source_row < len(mask) and bool(mask[source_row])
+
+    def mapRowsToSource(self, proxy_rows):
+        """Maps an int64 array of proxy rows to source rows in one vectorized step."""
+        proxy_rows = np.asarray(proxy_rows, dtype=np.int64)
+        if self.sortColumn() >= 0:
+            # Sorted proxies have no cheap bulk mapping, fall back to Qt's per-index mapping
+            return np.array([self.mapToSource(self.index(int(r), 0)).row() for r in proxy_rows], dtype=np.int64)
+        if not self.filters:
+            return proxy_rows
+        return np.flatnonzero(self.acceptMask())[proxy_rows]
+
+    def selectedSourceRows(self, selection_model):
+        """
+        Returns the selected rows as a sorted, unique int64 array of source rows.
+        Works on the selection ranges, so selecting a whole table costs O(n) array work.
+        """
+        ranges = [np.arange(r.top(), r.bottom() + 1, dtype=np.int64) for r in selection_model.selection()]
+        if not ranges:
+            return np.zeros(0, dtype=np.int64)
+        return np.unique(self.mapRowsToSource(np.concatenate(ranges)))
+
 class PandasModel(QAbstractTableModel):
+    """
+    Table model backed by a growable ColumnBuffer.
+    getDataFrame() materializes a DataFrame only when the engine needs one;
+    edits must go back through the model so views get fine-grained signals.
+    """
+    SortRole = Qt.UserRole + 1
+
     def __init__(self, df=pd.DataFrame()):
         super().__init__()
-        self._df = df
+        self._buf = ColumnBuffer.from_frame(df)
+        self._schema = None # TariffSchema, used to display and edit money columns stored as cents
+        self._revision = 0 # Bumped on every mutation so caches (e.g. filter masks) know when to refresh
+        self._journal = None # EditJournal that receives every edit as a delta (see setJournal)
+        self._filter_values = {} # column -> (revision, distinct display texts), see columnFilterValues
+
+    def revision(self):
+        return self._revision
+
+    def setJournal(self, journal):
+        """Records all following edits in journal (an EditJournal), or stops recording with None."""
+        self._journal = journal
+
+    def applyJournal(self, journal, records):
+        """Replays recovered journal records onto the current table; returns the recorded header fields."""
+        self.beginResetModel()
+        self._buf, meta = journal.replay(records, self._buf)
+        self._revision += 1
+        self.endResetModel()
+        return meta
 
     def rowCount(self, parent=QModelIndex()):
-        return self._df.shape[0]
+        return len(self._buf)
 
     def columnCount(self, parent=QModelIndex()):
-        return self._df.shape[1]
+        return len(self._buf.columns)
+
+    def columns(self):
+        return self._buf.columns
+
+    def columnIsMoney(self, column):
+        """True if the column (by name) is stored as cents."""
+        return self._schema is not None and self._schema.is_money(column)
+
+    def columnIsNumeric(self, column):
+        return self._buf.dtype(column).kind in 'biuf'
+
+    def columnValues(self, column):
+        """Read-only array of a column's stored values, addressed by column name."""
+        return self._buf.column(column)
+
+    def cellValue(self, row, column):
+        """Raw stored value of a cell, addressed by row number and column name."""
+        return self._buf.value(row, self._buf.columns.index(column))
 
     def data(self, index, role=Qt.DisplayRole):
         if not index.isValid():
             return None
         if role == Qt.DisplayRole:
             # Check bounds just in case
-            if index.row() >= self._df.shape[0] or index.column() >= self._df.shape[1]:
+            if index.row() >= len(self._buf) or index.column() >= self.columnCount():
                 return None
                 
-            value = self._df.iloc[index.row(), index.column()]
-            if isinstance(value, float):
-                # If it has no decimal part, show as int
-                if value.is_integer():
-                    return str(int(value))
-                return f"{value:.2f}"
-            return str(value)
+            value = self._buf.value(index.row(), index.column())
+            if self._isMoney(index.column()):
+                return format_cents([value])[0]
+            return format_display_value(value)
+        if role == self.SortRole:
+            # Raw stored value, so a QSortFilterProxyModel compares numbers, not strings
+            if index.row() >= len(self._buf) or index.column() >= self.columnCount():
+                return None
+            value = self._buf.value(index.row(), index.column())
+            return value.item() if isinstance(value, np.generic) else value
         if role == Qt.TextAlignmentRole:
             return Qt.AlignCenter
         return None
 
+    def columnDisplayValues(self, column):
+        """Vectorized DisplayRole strings for a whole column (same formatting as data())."""
+        return self._formatValues(column, self._buf.column(self._buf.columns[column]))
+
+    def _distinctValues(self, column):
+        """(distinct raw values, index of each row's value) of a column."""
+        values = self._buf.column(self._buf.columns[column])
+        if values.dtype == object:
+            codes, uniques = pd.factorize(values, use_na_sentinel=False)
+            return np.asarray(uniques, dtype=object), codes
+        return np.unique(values, return_inverse=True)
+
+    def columnMatches(self, column, allowed):
+        """
+        Boolean mask of rows whose DisplayRole text is in allowed. Only the distinct
+        values are formatted, then mapped back to the rows.
+        """
+        uniques, inverse = self._distinctValues(column)
+        return np.isin(self._formatValues(column, uniques), list(allowed))[inverse]
+
+    def computeFilterValues(self, column):
+        """(revision, distinct DisplayRole texts of a column); safe to call from a worker thread."""
+        revision = self._revision
+        uniques, _ = self._distinctValues(column)
+        return revision, pd.unique(self._formatValues(column, uniques)).tolist()
+
+    def storeFilterValues(self, column, revision, values):
+        if revision == self._revision:
+            self._filter_values[column] = (revision, values)
+
+    def filterValuesAreFresh(self, column):
+        cached = self._filter_values.get(column)
+        return cached is not None and cached[0] == self._revision
+
+    def columnFilterValues(self, column):
+        """Distinct DisplayRole texts of a column for the filter dialog, cached per revision."""
+        if not self.filterValuesAreFresh(column):
+            self.storeFilterValues(column, *self.computeFilterValues(column))
+        return self._filter_values[column][1]
+
+    def _formatValues(self, column, values):
+        if self._isMoney(column):
+            return format_cents(values)
+        if values.dtype.kind == 'f':
+            values = values.astype(np.float64)
+            whole = np.isfinite(values) & (values == np.floor(values))
+            result = np.char.mod('%.2f', values).astype(object)
+            result[whole] = values[whole].astype(np.int64).astype(str)
+            return result
+        if values.dtype.kind in 'iu':
+            return values.astype(str).astype(object)
+        return np.array([format_display_value(v) for v in values], dtype=object)
+
     def headerData(self, section, orientation, role=Qt.DisplayRole):
         if role == Qt.DisplayRole:
             if orientation == Qt.Horizontal:
-                if section < len(self._df.columns):
-                    return self._df.columns[section]
+                if section < self.columnCount():
+                    return self._buf.columns[section]
             if orientation == Qt.Vertical:
                 return str(section + 1)
         return None
@@ -78,23 +269,297 @@ class PandasModel(QAbstractTableModel):
         if role == Qt.EditRole:
             try:
                 # Attempt to convert to float if column is numeric
-                current_val = self._df.iloc[index.row(), index.column()]
-                if isinstance(current_val, (float, int)):
+                current_val = self._buf.value(index.row(), index.column())
+                if isinstance(current_val, (float, int, np.number)):
                     val = float(value)
                 else:
                     val = value
                 
-                self._df.iloc[index.row(), index.column()] = val
+                column = self._buf.columns[index.column()]
+                if self._isMoney(index.column()):
+                    val = self._schema.coerce_column(column, [val])[0]
+                self._buf.set_cells(column, [index.row()], [val])
+                self._revision += 1
+                if self._journal is not None:
+                    self._journal.record_cells(column, [index.row()], [val])
                 self.dataChanged.emit(index, index, [Qt.DisplayRole, Qt.EditRole])
                 return True
             except ValueError:
                 return False
         return False
     
-    def setDataFrame(self, df):
+    def _isMoney(self, col_idx):
+        return self._schema is not None and self._schema.is_money(self._buf.columns[col_idx])
+
+    def setSchema(self, schema):
+        self._schema = schema
+
+    def setDataFrame(self, df, schema=None, origins=None):
+        """Replaces the table. origins maps rows to the tuples of a loaded file (see rowOrigins)."""
         self.beginResetModel()
-        self._df = df
+        if schema is not None:
+            self._schema = schema
+        self._buf = ColumnBuffer.from_frame(df, origins)
+        self._revision += 1
         self.endResetModel()
+        if self._journal is not None:
+            self._journal.record_frame(df)
 
     def getDataFrame(self):
-        return self._df
+        return self._buf.to_frame()
+
+    def rowOrigins(self):
+        """Source tuple number per row (-1 for rows added since loading), used by lossless saves."""
+        return self._buf.origins()
+
+    def appendRows(self, rows):
+        """
+        Appends rows (DataFrame or mapping of column -> values) at the end of the
+        buffer and notifies views with a single rowsInserted. O(1) amortized per row.
+        """
+        count = len(rows) if isinstance(rows, pd.DataFrame) else len(next(iter(rows.values()), []))
+        if count == 0:
+            return
+        if self.columnCount() == 0:
+            # No schema yet, so the column layout changes as well
+            self.setDataFrame(pd.DataFrame(rows))
+            return
+
+        first = len(self._buf)
+        self.beginInsertRows(QModelIndex(), first, first + count - 1)
+        self._buf.append(rows)
+        self._revision += 1
+        self.endInsertRows()
+        if self._journal is not None:
+            self._journal.record_append(rows)
+
+    def sort(self, column, order=Qt.AscendingOrder):
+        """
+        Sorts by one column (header clicks). The sort is stable, so rows that tie keep
+        their current order: sorting by maxWeight and then by maxDistance yields rows
+        ordered by maxDistance, then maxWeight.
+        """
+        if 0 <= column < self.columnCount():
+            self.sortByColumns([self._buf.columns[column]], [order == Qt.AscendingOrder])
+
+    def sortByColumns(self, columns, ascending=None):
+        """
+        Reorders the rows by several columns at once (first = primary key) with one
+        stable np.lexsort, then moves the data in place. Views get one layoutChanged;
+        persistent indexes (selection, current cell) follow their rows.
+        """
+        ascending = [True] * len(columns) if ascending is None else list(ascending)
+        order = self._buf.argsort(columns, ascending)
+        if np.array_equal(order, np.arange(order.size)):
+            return
+        self.layoutAboutToBeChanged.emit()
+        new_rows = np.empty_like(order)
+        new_rows[order] = np.arange(order.size)
+        old_indexes = self.persistentIndexList()
+        self._buf.permute(order)
+        self._revision += 1
+        self.changePersistentIndexList(old_indexes, [self.index(int(new_rows[i.row()]), i.column())
+                                                     for i in old_indexes])
+        self.layoutChanged.emit()
+        if self._journal is not None:
+            self._journal.record_sort(columns, ascending)
+
+    def updateColumn(self, column, values):
+        """Replaces a whole column (array or scalar) and emits one ranged dataChanged."""
+        if column not in self._buf.columns:
+            return
+        self._buf.set_column(column, values)
+        self._revision += 1
+        if self._journal is not None:
+            self._journal.record_column(column, values)
+        self._emitColumnChanged(self._buf.columns.index(column), 0, len(self._buf) - 1)
+
+    def updateCells(self, column, rows, values):
+        """
+        Writes values into a column at the given positional rows (aligned with values)
+        and emits one dataChanged covering the affected row span.
+        """
+        rows = np.asarray(rows, dtype=np.int64)
+        if column not in self._buf.columns or rows.size == 0:
+            return
+        self._buf.set_cells(column, rows, values)
+        self._revision += 1
+        if self._journal is not None:
+            self._journal.record_cells(column, rows, values)
+        self._emitColumnChanged(self._buf.columns.index(column), int(rows.min()), int(rows.max()))
+
+    def _emitColumnChanged(self, col_idx, first_row, last_row):
+        if last_row < first_row:
+            return
+        self.dataChanged.emit(self.index(first_row, col_idx), self.index(last_row, col_idx),
+                              [Qt.DisplayRole, Qt.EditRole])
+
+    # Above this many separate runs, or this many rows moved up by the per-run compaction,
+    # per-range signals cost more than a reset
+    MAX_REMOVE_RANGES = 512
+    MAX_REMOVE_SHIFTED_ROWS = 1 << 22
+
+    def removeRowsByMask(self, mask):
+        """
+        Removes all rows where mask is True.
+        Views are notified with one rowsRemoved per contiguous run instead of a reset;
+        each run is compacted between its beginRemoveRows and endRemoveRows, so the
+        storage always matches what the view has been told.
+        """
+        mask = np.asarray(mask, dtype=bool)
+        positions = np.flatnonzero(mask)
+        if positions.size == 0:
+            return
+
+        # Contiguous runs [start, end] of removed rows
+        breaks = np.flatnonzero(np.diff(positions) != 1) + 1
+        starts = positions[np.concatenate(([0], breaks))]
+        ends = positions[np.concatenate((breaks - 1, [positions.size - 1]))]
+        if self._journal is not None:
+            self._journal.record_delete(starts, ends)
+
+        # Removing bottom-up, each run moves the rows that are kept below it
+        kept_below = (len(self._buf) - 1 - ends) - (positions.size - np.cumsum(ends - starts + 1))
+        if len(starts) > self.MAX_REMOVE_RANGES or int(kept_below.sum()) > self.MAX_REMOVE_SHIFTED_ROWS:
+            self.beginResetModel()
+            self._buf.delete(mask)
+            self._revision += 1
+            self.endResetModel()
+            return
+
+        # Bottom-up, so earlier runs keep their row numbers
+        for start, end in zip(starts[::-1], ends[::-1]):
+            self.beginRemoveRows(QModelIndex(), int(start), int(end))
+            self._buf.delete_range(int(start), int(end))
+            self.endRemoveRows()
+        self._revision += 1
+
+
+class MatrixModel(QAbstractTableModel):
+    """
+    Grid view of a PandasModel: rows are the distinct values of one bracket column
+    (e.g. maxDistance), columns those of another (e.g. maxWeight), cells show a value
+    column (price). The pivot is only an index (MatrixLayout.cell_rows) from grid cell
+    to table row, rebuilt vectorized when rows or key columns change; cell texts are
+    produced on demand, so the view only formats what is visible. Edits go through
+    the source model, so they are journaled and reach the XML like table edits.
+    Tariffs with several order kinds have one grid per kind; the model shows one
+    kind at a time (setOrderKind), so a cell never stands for rows of another kind.
+    """
+    ORDER_KIND_COLUMN = 'id_orderkind'
+
+    def __init__(self, source, row_column, col_column, value_column='price', parent=None):
+        super().__init__(parent)
+        self._source = source
+        self._axes = (row_column, col_column, value_column)
+        self._order_kind = None
+        self._layout = None
+        self._rebuild()
+        source.dataChanged.connect(self._onSourceDataChanged)
+        for signal in (source.rowsInserted, source.rowsRemoved, source.modelReset, source.layoutChanged):
+            signal.connect(self._reset)
+
+    def setAxes(self, row_column, col_column, value_column='price'):
+        self._axes = (row_column, col_column, value_column)
+        self._reset()
+
+    def axes(self):
+        return self._axes
+
+    def orderKinds(self):
+        """Sorted distinct order kinds of the source rows ([] if the tariff has no order kind column)."""
+        if self.ORDER_KIND_COLUMN not in self._source.columns():
+            return []
+        kinds = np.unique(self._source.columnValues(self.ORDER_KIND_COLUMN))
+        if kinds.dtype.kind == 'f':
+            kinds = kinds[np.isfinite(kinds)]
+        return kinds.tolist()
+
+    def orderKind(self):
+        """Order kind whose rows the grid shows, or None if the tariff has no order kinds."""
+        return self._order_kind
+
+    def setOrderKind(self, kind):
+        self._order_kind = kind
+        self._reset()
+
+    def matrixLayout(self):
+        """Current MatrixLayout, or None if an axis column is missing."""
+        return self._layout
+
+    def _rebuild(self):
+        columns = self._source.columns()
+        kinds = self.orderKinds()
+        if self._order_kind not in kinds:
+            self._order_kind = kinds[0] if kinds else None # The shown kind may have been edited away
+        if all(col in columns for col in self._axes):
+            row_column, col_column, _ = self._axes
+            rows = None
+            if self._order_kind is not None:
+                rows = np.flatnonzero(self._source.columnValues(self.ORDER_KIND_COLUMN) == self._order_kind)
+            self._layout = MatrixLayout(self._source.columnValues(row_column),
+                                        self._source.columnValues(col_column), rows)
+        else:
+            self._layout = None
+
+    def _reset(self, *args):
+        self.beginResetModel()
+        self._rebuild()
+        self.endResetModel()
+
+    def _onSourceDataChanged(self, top_left, bottom_right, roles=()):
+        columns = self._source.columns()
+        changed = columns[top_left.column():bottom_right.column() + 1]
+        if self._axes[0] in changed or self._axes[1] in changed or self.ORDER_KIND_COLUMN in changed:
+            self._reset() # A bracket moved to another cell or order kind
+        elif self._axes[2] in changed and self._layout is not None:
+            # The view repaints only the visible part of this range
+            self.dataChanged.emit(self.index(0, 0), self.index(self.rowCount() - 1, self.columnCount() - 1),
+                                  [Qt.DisplayRole, Qt.EditRole])
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if self._layout is None else self._layout.shape[0]
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if self._layout is None else self._layout.shape[1]
+
+    def _sourceIndex(self, index):
+        row = int(self._layout.cell_rows[index.row(), index.column()])
+        if row < 0:
+            return None
+        return self._source.index(row, self._source.columns().index(self._axes[2]))
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid() or self._layout is None:
+            return None
+        if role in (Qt.DisplayRole, Qt.EditRole):
+            source_index = self._sourceIndex(index)
+            return "" if source_index is None else self._source.data(source_index, Qt.DisplayRole)
+        if role == Qt.TextAlignmentRole:
+            return Qt.AlignCenter
+        return None
+
+    def setData(self, index, value, role=Qt.EditRole):
+        if role != Qt.EditRole or not index.isValid() or self._layout is None:
+            return False
+        source_index = self._sourceIndex(index)
+        if source_index is None:
+            return False
+        if isinstance(value, str):
+            value = value.strip().replace(',', '.')
+        return self._source.setData(source_index, value, role)
+
+    def flags(self, index):
+        if not index.isValid() or self._layout is None:
+            return Qt.ItemIsEnabled
+        if self._layout.cell_rows[index.row(), index.column()] < 0:
+            return Qt.ItemIsEnabled # No tariff row for this combination
+        return Qt.ItemIsEnabled | Qt.ItemIsSelectable | Qt.ItemIsEditable
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if role != Qt.DisplayRole or self._layout is None:
+            return None
+        keys = self._layout.col_keys if orientation == Qt.Horizontal else self._layout.row_keys
+        if section < len(keys):
+            return format_display_value(keys[section])
+        return None
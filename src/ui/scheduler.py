@@ -0,0 +1,136 @@
+from PySide6.QtCore import QObject, QRunnable, QThreadPool, QTimer, Signal
+
+
+class _JobSignals(QObject):
+    # Emitted from the worker thread, delivered queued on the thread owning the scheduler
+    done = Signal(object, object) # job, result (or the exception raised)
+
+
+class _Job(QRunnable):
+    def __init__(self, key, generation, func, is_current, signals):
+        super().__init__()
+        self.setAutoDelete(False) # The scheduler keeps it until it finishes or is taken back
+        self.key = key
+        self.generation = generation
+        self.func = func
+        self.is_current = is_current
+        self.signals = signals
+
+    def run(self):
+        result = None
+        if self.is_current(self.key, self.generation): # Else superseded while waiting in the queue
+            try:
+                result = self.func(lambda: not self.is_current(self.key, self.generation))
+            except Exception as e:
+                result = e # Reported on the GUI thread, see TaskScheduler._on_done
+        self.signals.done.emit(self, result)
+
+
+class TaskScheduler(QObject):
+    """
+    Debounced background jobs keyed by name.
+
+    schedule(key, func, on_result) (re)starts a QTimer for key; notifications arriving
+    within the delay collapse into one run. When the timer fires, func runs on a
+    QThreadPool worker as func(cancelled) and on_result(result) is called back on the
+    GUI thread. Scheduling a key again supersedes the previous job: if it is still
+    queued it is taken out of the pool, if it is running cancelled() turns True and its
+    result is dropped. Higher priorities (VIEWPORT before TABLE before IDLE) are taken
+    from the pool queue first.
+
+    Jobs must only read state; every write happens in on_result on the GUI thread, which
+    should check that the data it computed from (e.g. a model revision) is still current.
+    An exception raised by func goes to on_error(exception) if given, else to the failed
+    signal, instead of on_result.
+    """
+    failed = Signal(str, object) # key, exception of a job scheduled without on_error
+
+    VIEWPORT = 2 # Affects what is on screen right now
+    TABLE = 1    # Whole-table state the next user action needs
+    IDLE = 0     # Housekeeping (autosave sync)
+
+    def __init__(self, parent=None, delay_ms=250, max_threads=2):
+        super().__init__(parent)
+        self.delay_ms = delay_ms
+        self.pool = QThreadPool(self)
+        self.pool.setMaxThreadCount(max_threads)
+        self._signals = _JobSignals()
+        self._signals.done.connect(self._on_done)
+        self._generation = {} # key -> generation of the newest request
+        self._pending = {}    # key -> (func, on_result, priority), waiting for the timer
+        self._callbacks = {}  # key -> (on_result, on_error) of the submitted generation
+        self._timers = {}     # key -> QTimer
+        self._jobs = {}       # key -> newest submitted _Job
+        self._alive = set()   # Every submitted job until it reports back (keeps the runnable alive)
+
+    def schedule(self, key, func, on_result=None, priority=TABLE, delay_ms=None, on_error=None):
+        self._generation[key] = self._generation.get(key, 0) + 1
+        self._pending[key] = (func, (on_result, on_error), priority)
+        timer = self._timers.get(key)
+        if timer is None:
+            timer = QTimer(self)
+            timer.setSingleShot(True)
+            timer.timeout.connect(lambda k=key: self._submit(k))
+            self._timers[key] = timer
+        timer.start(self.delay_ms if delay_ms is None else delay_ms)
+
+    def cancel(self, key):
+        """Drops a pending or running job; its result will not be delivered."""
+        self._generation[key] = self._generation.get(key, 0) + 1
+        self._pending.pop(key, None)
+        if key in self._timers:
+            self._timers[key].stop()
+        self._take_back(key)
+
+    def cancel_all(self):
+        for key in list(self._generation):
+            self.cancel(key)
+
+    def is_busy(self):
+        return bool(self._pending or self._jobs)
+
+    def is_scheduled(self, key):
+        """True while a job for key waits for its timer, in the pool queue or runs."""
+        return key in self._pending or key in self._jobs
+
+    def _is_current(self, key, generation):
+        return self._generation.get(key) == generation
+
+    def _take_back(self, key):
+        job = self._jobs.get(key)
+        if job is not None and self.pool.tryTake(job):
+            del self._jobs[key]
+            self._alive.discard(job)
+
+    def _submit(self, key):
+        if key not in self._pending:
+            return
+        func, callbacks, priority = self._pending.pop(key)
+        self._take_back(key) # An older run still in the queue is superseded
+        generation = self._generation[key]
+        job = _Job(key, generation, func, self._is_current, self._signals)
+        self._jobs[key] = job
+        self._alive.add(job)
+        self._callbacks[key] = callbacks
+        self.pool.start(job, priority)
+
+    def _on_done(self, job, result):
+        self._alive.discard(job)
+        key = job.key
+        if self._jobs.get(key) is job:
+            del self._jobs[key]
+        if not self._is_current(key, job.generation):
+            return
+        on_result, on_error = self._callbacks.pop(key, (None, None))
+        if isinstance(result, Exception):
+            if on_error is not None:
+                on_error(result)
+            else:
+                self.failed.emit(key, result)
+        elif on_result is not None:
+            on_result(result)
+
+    def shutdown(self):
+        """Cancels everything and waits for running jobs (call before the window closes)."""
+        self.cancel_all()
+        self.pool.waitForDone()
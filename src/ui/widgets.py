@@ -49,15 +49,10 @@ class FilterHeader(QHeaderView):
         else:
             source_model = model
             
-        # Get unique values
-        unique_values = set()
-        for row in range(source_model.rowCount()):
-            idx = source_model.index(row, col)
-            val = source_model.data(idx, Qt.DisplayRole)
-            unique_values.add(str(val))
+        # Get unique values (usually precomputed in the background)
+        vals_list = [str(v) for v in source_model.columnFilterValues(col)]
             
         # Smart Sort
-        vals_list = list(unique_values)
         try:
             sorted_values = sorted(vals_list, key=lambda x: float(x) if x and x.strip() else -float('inf'))
         except ValueError:
@@ -0,0 +1,34 @@
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, 'src'))
+
+TEMPLATE_FOLDER = os.path.join(ROOT, 'XML Vorlage')
+
+
+@pytest.fixture
+def distri_path():
+    """Stepped volume × distance tariff with one order kind."""
+    return os.path.join(TEMPLATE_FOLDER, 'PROD_Uploadfile_VLX_LEJ_DISTRI_TARIF_2024.xml')
+
+
+@pytest.fixture
+def tobacco_path():
+    """Stepped weight × distance tariff."""
+    return os.path.join(TEMPLATE_FOLDER, 'TOBACCO_SKZ_BAT_DISTRIBUTION.xml')
+
+
+@pytest.fixture
+def load_table():
+    """Loads a tariff file with a fresh TariffEngine; returns (engine, table)."""
+    from core.tariff_engine import TariffEngine
+
+    def load(path):
+        engine = TariffEngine()
+        success, msg = engine.load_template(path)
+        assert success, msg
+        return engine, engine.load_table()
+    return load
@@ -0,0 +1,99 @@
+from fractions import Fraction
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from core.bulk_expression import BulkExpressionError, compile_bulk_expression
+from core.schema import TariffSchema
+
+COLUMNS = ['maxDistance', 'minWeight', 'price']
+
+
+@pytest.mark.parametrize('text', [
+    "price = __import__('os').system('true')",
+    'price = price.real',
+    'price = abs(price)',
+    'price = price[0]',
+    'price = (lambda: 1)()',
+    "price = 'text'",
+    'price = True',
+    'price = price if price > 1 else 0',
+    'price = [price]',
+    'price = price where price in (1, 2)',
+    'price = price where price is None',
+    'price = price << 1',
+    'price = unknown * 2',
+    'price = price where unknown > 1',
+    'unknown = 1',
+    'price == 1',
+    'price = ',
+    'price = price where ',
+    'price = price +',
+])
+def test_rejects_everything_outside_the_whitelist(text):
+    with pytest.raises(BulkExpressionError):
+        compile_bulk_expression(text, COLUMNS)
+
+
+def test_splits_clauses_in_any_order_and_case():
+    rule = compile_bulk_expression('price = price * 1.035 + 0.5 MIN 10,5 where maxDistance > 200 and minWeight >= 1000 round 1',
+                                   COLUMNS)
+    assert rule.target == 'price'
+    assert rule.round_digits == 1 and rule.cents_step == 10
+    assert rule.floor == 10.5
+    assert rule.referenced_columns() == ['maxDistance', 'minWeight', 'price']
+
+
+@pytest.mark.parametrize('text', [
+    'price = price round 2 round 1',
+    'price = price where price > 1 where price < 5',
+    'price = price round x',
+    'price = price min ten',
+])
+def test_rejects_repeated_or_invalid_clauses(text):
+    with pytest.raises(BulkExpressionError):
+        compile_bulk_expression(text, COLUMNS)
+
+
+@pytest.mark.parametrize('text, terms', [
+    ('price = price * 1.035 + 0.005', (Fraction('1.035'), Fraction('0.005'))),
+    ('price = 0.1 + 0.2 + price', (Fraction(1), Fraction('0.3'))),
+    ('price = (price - 1) / 3', (Fraction(1, 3), Fraction(-1, 3))),
+    ('price = -(2 * price) + 1', (Fraction(-2), Fraction(1))),
+    ('price = 5', (Fraction(0), Fraction(5))),
+    ('price = price * price', None),
+    ('price = price / price', None),
+    ('price = price / 0', None),
+    ('price = price * maxDistance', None),
+    ('price = price ** 2', None),
+])
+def test_affine_terms_are_exact(text, terms):
+    assert compile_bulk_expression(text, COLUMNS).affine_terms() == terms
+
+
+def test_evaluate_masks_rows_and_applies_in_cents():
+    df = pd.DataFrame({'maxDistance': np.array([100, 250, 300], dtype=np.float32),
+                       'minWeight': np.array([0, 1000, 500], dtype=np.float32),
+                       'price': np.array([1000, 2000, 3000], dtype=np.int64)})
+    schema = TariffSchema(df.columns.tolist())
+    rule = compile_bulk_expression('price = price * 1.1 + 0.01 where maxDistance > 200 and not minWeight < 1000', COLUMNS)
+    preview = rule.evaluate(df, schema=schema)
+    assert preview.mask.tolist() == [False, True, False]
+    assert preview.stored_values.tolist() == [2201]
+
+    # An explicit row selection narrows the where clause further
+    assert compile_bulk_expression('price = price + 1', COLUMNS).evaluate(df, rows=[0, 2], schema=schema).mask.tolist() \
+        == [True, False, True]
+
+    updated = preview.apply(df.copy())
+    assert updated['price'].tolist() == [1000, 2201, 3000]
+    assert updated['price'].dtype == np.int64
+
+
+def test_evaluate_leaves_non_finite_results_alone():
+    df = pd.DataFrame({'maxDistance': np.array([0.0, 2.0]), 'minWeight': np.array([1.0, 1.0]),
+                       'price': np.array([100, 100], dtype=np.int64)})
+    preview = compile_bulk_expression('minWeight = minWeight / maxDistance min 0,75', COLUMNS).evaluate(df)
+    assert preview.mask.tolist() == [False, True]
+    assert preview.new_values.tolist() == [0.75]
@@ -0,0 +1,50 @@
+import numpy as np
+import pytest
+
+from core.byte_index import ByteIndex
+
+
+@pytest.mark.parametrize('fixture', ['distri_path', 'tobacco_path'])
+def test_unedited_table_saves_byte_identical(fixture, request, load_table, tmp_path):
+    path = request.getfixturevalue(fixture)
+    engine, df = load_table(path)
+    with open(path, 'rb') as f:
+        raw = f.read()
+    assert engine.render_lossless(df, np.arange(len(df))) == raw
+
+    target = tmp_path / 'copy.xml'
+    engine.save_lossless(df, np.arange(len(df)), str(target))
+    assert target.read_bytes() == raw
+
+
+def test_single_edit_splices_only_that_value(tobacco_path, load_table):
+    engine, df = load_table(tobacco_path)
+    raw = engine._source_bytes
+    index = ByteIndex(raw)
+    row = 5
+    start, end, _ = index.values['price'][row]
+
+    edited = df.copy()
+    edited.loc[row, 'price'] = df.loc[row, 'price'] + 1234
+    out = engine.render_lossless(edited, np.arange(len(df)))
+
+    new_text = engine.schema.format_column('price', edited['price'].to_numpy()[[row]])[0].encode()
+    assert new_text != raw[start:end]
+    assert out == raw[:start] + new_text + raw[end:]
+
+
+def test_delete_and_append_touch_only_those_tuples(tobacco_path, load_table):
+    engine, df = load_table(tobacco_path)
+    raw = engine._source_bytes
+    index = ByteIndex(raw)
+
+    # Dropping the first row cuts out its tuple with the whitespace in front of it
+    out = engine.render_lossless(df.iloc[1:].reset_index(drop=True), np.arange(1, len(df)))
+    assert out == raw[:index.tuple_lead[0]] + raw[index.tuple_end[0]:]
+
+    # An appended copy of the last row repeats the last tuple after it
+    last = len(df) - 1
+    grown = df.iloc[list(range(len(df))) + [last]].reset_index(drop=True)
+    out = engine.render_lossless(grown, np.append(np.arange(len(df)), -1))
+    end = index.tuple_end[last]
+    assert out == raw[:end] + index.lead_bytes(last) + index.tuple_bytes(last) + raw[end:]
@@ -0,0 +1,64 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from core.column_buffer import ColumnBuffer
+from core.tariff_engine import TariffEngine
+
+
+def _buffer():
+    return ColumnBuffer.from_frame(pd.DataFrame({'id_orderkind': [1, 1, 1], 'maxDistance': [10.0, 20.0, 30.0]}))
+
+
+def test_to_frame_changes_do_not_reach_the_cache():
+    buf = _buffer()
+    df = buf.to_frame()
+    df['maxDistance'] = 0.0
+    df.loc[0, 'id_orderkind'] = 7
+    assert buf.to_frame().to_dict('list') == {'id_orderkind': [1, 1, 1], 'maxDistance': [10.0, 20.0, 30.0]}
+
+
+def test_set_order_kind_leaves_its_input_unchanged():
+    buf = _buffer()
+    df = buf.to_frame()
+    changed = TariffEngine().set_order_kind(df, 3)
+    assert changed['id_orderkind'].tolist() == [3, 3, 3]
+    assert df['id_orderkind'].tolist() == [1, 1, 1]
+    assert buf.to_frame()['id_orderkind'].tolist() == [1, 1, 1]
+
+
+def _random_frame(n=200, seed=3):
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({
+        'id_orderkind': rng.integers(1, 4, n).astype(np.int8),
+        'maxDistance': rng.choice([50, 100, 150.5, 200], n).astype(np.float32),
+        'price': rng.integers(-500, 500, n).astype(np.int64),
+        'note': rng.choice(['a', 'b', 'ä', 'B'], n).astype(object),
+    })
+
+
+@pytest.mark.parametrize('columns, ascending', [
+    (['price'], [True]),
+    (['price'], [False]),
+    (['maxDistance', 'price'], [True, False]),
+    (['id_orderkind', 'maxDistance', 'price'], [False, True, True]),
+    (['note', 'id_orderkind'], [False, True]),
+    (['maxDistance'], [False]),
+])
+def test_argsort_matches_stable_sort_values(columns, ascending):
+    df = _random_frame()
+    order = ColumnBuffer.from_frame(df).argsort(columns, ascending)
+    expected = df.sort_values(columns, ascending=ascending, kind='stable').index.to_numpy()
+    np.testing.assert_array_equal(order, expected)
+
+
+def test_argsort_puts_missing_values_last_ascending_and_first_descending():
+    df = pd.DataFrame({'maxDistance': [30.0, np.nan, 10.0, np.nan, 20.0, 10.0],
+                       'price': [1, 2, 3, 4, 5, 6]})
+    buf = ColumnBuffer.from_frame(df)
+    assert buf.argsort(['maxDistance']).tolist() == [2, 5, 4, 0, 1, 3]
+    assert buf.argsort(['maxDistance'], [False]).tolist() == [1, 3, 0, 4, 2, 5]
+    assert buf.argsort(['maxDistance', 'price'], [False, False]).tolist() == [3, 1, 0, 4, 5, 2]
+    for ascending, na_position in ((True, 'last'), (False, 'first')):
+        expected = df.sort_values('maxDistance', ascending=ascending, kind='stable', na_position=na_position)
+        assert buf.argsort(['maxDistance'], [ascending]).tolist() == expected.index.tolist()
@@ -0,0 +1,60 @@
+import numpy as np
+import pytest
+
+from core.compaction import compact_brackets, verify_compaction
+from core.rating import BracketRater
+
+
+@pytest.fixture
+def flat_quantity_table(distri_path, load_table):
+    """DISTRI with one price per distance bracket, so every distance collapses to one quantity bracket."""
+    _, df = load_table(distri_path)
+    df = df.copy()
+    df['price'] = df.groupby('maxDistance')['price'].transform('first')
+    return df
+
+
+def test_unchanged_table_stays_as_it_is(distri_path, load_table):
+    _, df = load_table(distri_path)
+    result = compact_brackets(df)
+    assert result.merged == 0
+    assert verify_compaction(df, result.frame) == 0
+
+
+def test_compaction_merges_equal_neighbours_and_keeps_pricing(flat_quantity_table):
+    df = flat_quantity_table
+    result = compact_brackets(df, axis='quantity')
+    assert len(result.frame) == df['maxDistance'].nunique()
+    assert result.merged == len(df) - len(result.frame)
+    assert verify_compaction(df, result.frame) == 0
+
+    # Each merged bracket spans the whole quantity range of its distance
+    assert (result.frame['minVolume'] == df['minVolume'].min()).all()
+    assert (result.frame['maxVolume'] == df['maxVolume'].max()).all()
+    np.testing.assert_array_equal(result.frame['price'].to_numpy(), df['price'].to_numpy()[result.keep])
+
+    before, after = BracketRater(df), BracketRater(result.frame)
+    rng = np.random.default_rng(3)
+    d = rng.uniform(0, before.max_distance, 500)
+    q = rng.uniform(0, before.max_quantity, 500)
+    np.testing.assert_array_equal(before.quote(d, q)[0], after.quote(d, q)[0])
+
+
+def test_both_axes_never_merge_more_than_pricing_allows(flat_quantity_table):
+    result = compact_brackets(flat_quantity_table)
+    assert verify_compaction(flat_quantity_table, result.frame) == 0
+    assert len(result.frame) <= flat_quantity_table['maxDistance'].nunique()
+
+
+def test_verify_compaction_reports_changed_pricing(flat_quantity_table):
+    result = compact_brackets(flat_quantity_table, axis='quantity')
+    changed = result.frame.copy()
+    changed.loc[0, 'price'] += 1
+    assert verify_compaction(flat_quantity_table, changed) > 0
+    # Dropping a bracket leaves shipments unrated that were rated before
+    assert verify_compaction(flat_quantity_table, result.frame.iloc[1:]) > 0
+
+
+def test_unknown_axis_is_rejected(flat_quantity_table):
+    with pytest.raises(ValueError):
+        compact_brackets(flat_quantity_table, axis='price')
@@ -0,0 +1,67 @@
+import gzip
+
+import pytest
+
+from core.compressed_io import (XML_SAVE_FILTER, atomic_write_compressed, check_level, read_bytes,
+                                tariff_stem, with_filter_suffix)
+
+
+def test_gzip_round_trip_of_a_tariff(tmp_path, distri_path, load_table):
+    engine, df = load_table(distri_path)
+    target = str(tmp_path / 'distri.xml.gz')
+    engine.compression_level = 9
+    engine.save_lossless(df, range(len(df)), target)
+
+    with open(target, 'rb') as f:
+        assert f.read(2) == b'\x1f\x8b'
+    with open(distri_path, 'rb') as f:
+        assert read_bytes(target) == f.read()
+    _, reloaded = load_table(target)
+    assert reloaded.equals(df)
+
+
+def test_compressed_content_is_read_whatever_the_name(tmp_path):
+    path = tmp_path / 'misnamed.xml'
+    path.write_bytes(gzip.compress(b'<comtec/>'))
+    assert read_bytes(str(path)) == b'<comtec/>'
+
+
+def test_stream_write_is_deterministic(tmp_path):
+    path = tmp_path / 'a.xml.gz'
+    outputs = []
+    for _ in range(2):
+        with atomic_write_compressed(str(path), 'w', encoding='utf-8') as f:
+            f.write('<comtec>ä</comtec>')
+        outputs.append(path.read_bytes())
+    assert outputs[0] == outputs[1]
+    assert read_bytes(str(path)).decode('utf-8') == '<comtec>ä</comtec>'
+
+
+@pytest.mark.parametrize('path, level, valid', [
+    ('t.xml.gz', 9, True), ('t.xml.gz', 22, False), ('t.xml.gz', 0, False),
+    ('t.xml.zst', 22, True), ('t.xml.zst', 23, False), ('t.xml', 99, True), ('t.xml.gz', None, True),
+])
+def test_check_level_per_format(path, level, valid):
+    if valid:
+        check_level(path, level)
+    else:
+        with pytest.raises(ValueError):
+            check_level(path, level)
+
+
+def test_invalid_level_leaves_no_file(tmp_path):
+    path = tmp_path / 't.xml.gz'
+    with pytest.raises(ValueError):
+        with atomic_write_compressed(str(path), 'wb', level=22) as f:
+            f.write(b'x')
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_save_filter_sets_the_suffix():
+    plain, gz, zst = XML_SAVE_FILTER.split(';;')
+    assert with_filter_suffix('Tarif.xml', gz) == 'Tarif.xml.gz'
+    assert with_filter_suffix('Tarif', zst) == 'Tarif.xml.zst'
+    assert with_filter_suffix('Tarif', plain) == 'Tarif.xml'
+    assert with_filter_suffix('Tarif.xml.zst', gz) == 'Tarif.xml.zst' # Typed suffix wins
+    assert with_filter_suffix('T.XML', plain) == 'T.XML'
+    assert tariff_stem('dir/Tarif.xml.gz') == 'Tarif'
@@ -0,0 +1,56 @@
+import numpy as np
+
+from core.comtec_document import ComtecDocument
+from core.tariff_engine import TariffEngine
+
+
+def _multi_item_bytes(path):
+    """The file's tariff with its item repeated, followed by a second copy of the whole tariff."""
+    with open(path, 'rb') as f:
+        raw = f.read()
+    start, end = raw.index(b'<tariff_item>'), raw.rindex(b'</tariff_item>') + len(b'</tariff_item>')
+    raw = raw[:end] + b"\n      " + raw[start:end] + raw[end:]
+    start = raw.index(b'<resource_tariff>')
+    end = raw.rindex(b'</resource_tariff>') + len(b'</resource_tariff>')
+    return raw[:end] + b"\n  " + raw[start:end] + raw[end:]
+
+
+def _edit_price(document, item, delta):
+    engine = TariffEngine()
+    success, msg = engine.load_bytes(document.item_document(item))
+    assert success, msg
+    df = engine.load_table()
+    df.loc[0, 'price'] += delta
+    document.replace_item(item, engine.render_lossless(df, np.arange(len(df))))
+    return df
+
+
+def test_unedited_document_renders_byte_identical(distri_path):
+    raw = _multi_item_bytes(distri_path)
+    document = ComtecDocument(raw)
+    assert len(document.tariffs) == 2 and len(document) == 4
+    for item in document.items():
+        document.item_document(item) # Materializing items does not modify the document
+    assert not document.is_modified()
+    assert document.render() == raw
+
+
+def test_replacing_one_item_keeps_the_others_byte_identical(distri_path):
+    raw = _multi_item_bytes(distri_path)
+    document = ComtecDocument(raw)
+    items = document.items()
+    originals = [raw[item.start:item.end] for item in items]
+    edited = _edit_price(document, items[1], 100)
+    assert document.is_modified()
+
+    rendered = ComtecDocument(document.render())
+    rendered_items = rendered.items()
+    assert len(rendered_items) == len(items)
+    body = rendered.raw[rendered_items[1].start:rendered_items[1].end]
+    assert body != originals[1]
+    assert rendered.raw == raw[:items[1].start] + body + raw[items[1].end:]
+    assert [rendered.raw[i.start:i.end] for i in rendered_items[2:]] == originals[2:]
+
+    engine = TariffEngine()
+    engine.load_bytes(rendered.item_document(rendered_items[1]))
+    assert engine.load_table().equals(edited)
@@ -0,0 +1,52 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from core.dedupe import bracket_key_columns, find_duplicates
+
+
+@pytest.fixture
+def table(distri_path, load_table):
+    """DISTRI plus an exact copy of row 5 and a copy of row 7 with another price."""
+    _, df = load_table(distri_path)
+    conflict = df.iloc[[7]].copy()
+    conflict['price'] += 100
+    return pd.concat([df, df.iloc[[5]], conflict], ignore_index=True)
+
+
+def test_find_duplicates_matches_pandas(table):
+    n = len(table) - 2
+    report = find_duplicates(table)
+    keys = bracket_key_columns(table.columns.tolist())
+    exact = table.duplicated()
+    np.testing.assert_array_equal(report.exact, np.flatnonzero(exact))
+    np.testing.assert_array_equal(report.conflicts, np.flatnonzero(table.duplicated(subset=keys) & ~exact))
+    assert report.exact.tolist() == [n] and report.conflicts.tolist() == [n + 1]
+    assert report.conflict_rows().tolist() == [7, n + 1]
+    assert report.conflict_groups == 1
+    assert not report.is_clean
+
+
+def test_removal_masks(table):
+    n = len(table) - 2
+    report = find_duplicates(table)
+    assert np.flatnonzero(report.removal_mask()).tolist() == [n]
+    assert np.flatnonzero(report.removal_mask('first')).tolist() == [n, n + 1]
+    assert np.flatnonzero(report.removal_mask('last')).tolist() == [5, 7]
+    with pytest.raises(ValueError):
+        report.removal_mask('newest')
+
+    cleaned = table[~report.removal_mask('first')].reset_index(drop=True)
+    assert find_duplicates(cleaned).is_clean
+
+
+def test_nan_values_count_as_equal():
+    df = pd.DataFrame({'maxDistance': [10.0, 10.0, 20.0], 'price': [np.nan, np.nan, 1.0]})
+    report = find_duplicates(df)
+    assert report.exact.tolist() == [1]
+    assert report.conflicts.size == 0
+
+
+def test_summary_names_conflicting_rows(table):
+    lines = find_duplicates(table).summary_lines(table=table)
+    assert any(f"Zeile {len(table)} widerspricht Zeile 8" in line for line in lines)
@@ -0,0 +1,112 @@
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from core.column_buffer import ColumnBuffer
+from core.edit_journal import EditJournal
+
+
+def _base_frame():
+    return pd.DataFrame({
+        'maxDistance': np.array([50, 100, 150, 200], dtype=np.float32),
+        'price': np.array([1000, 2000, 3000, 4000], dtype=np.int64),
+        'note': ['a', 'b', 'c', 'd'],
+    })
+
+
+def _edit(journal, buf):
+    """Applies a sequence of edits to buf and records each in journal, as PandasModel does."""
+    buf.set_cells('price', np.array([1, 3]), np.array([2100, 4200]))
+    journal.record_cells('price', [1, 3], [2100, 4200])
+    rows = {'maxDistance': np.array([250.5], dtype=np.float32), 'price': np.array([5000]), 'note': np.array(['e'], dtype=object)}
+    buf.append(rows)
+    journal.record_append(rows)
+    order = buf.argsort(['price'], [False])
+    buf.permute(order)
+    journal.record_sort(['price'], [False])
+    mask = np.zeros(len(buf), dtype=bool)
+    mask[[0, 2]] = True
+    buf.delete(mask)
+    journal.record_delete([0, 2], [0, 2])
+    journal.record_metadata({'name': 'Tarif'})
+
+
+def test_replay_rebuilds_the_edited_table(tmp_path):
+    journal = EditJournal.for_session(str(tmp_path))
+    journal.start(source='tariff.xml', item=1)
+    buf = ColumnBuffer.from_frame(_base_frame())
+    _edit(journal, buf)
+    journal.close()
+
+    base, records = EditJournal.read(journal.path)
+    assert base == {'op': 'base', 'source': 'tariff.xml', 'item': 1, 'definition': None}
+    replayed, meta = journal.replay(records, ColumnBuffer.from_frame(_base_frame()))
+    assert meta == {'name': 'Tarif'}
+    pd.testing.assert_frame_equal(replayed.to_frame(), buf.to_frame())
+    assert replayed.dtype('maxDistance') == np.float32
+
+
+def test_replay_ignores_a_torn_last_line(tmp_path):
+    journal = EditJournal.for_session(str(tmp_path))
+    journal.start(source='tariff.xml')
+    journal.record_cells('price', [0], [1])
+    journal.close()
+    with open(journal.path, 'a', encoding='utf-8') as f:
+        f.write('{"op":"set","col')
+    _, records = EditJournal.read(journal.path)
+    assert len(records) == 1
+
+
+def test_sessions_use_separate_locked_journals(tmp_path):
+    first = EditJournal.for_session(str(tmp_path)).start(source='a.xml')
+    second = EditJournal.for_session(str(tmp_path)).start(source='b.xml')
+    assert first.path != second.path
+    first.record_cells('price', [0], [1])
+
+    # Running sessions are not orphans, and discarding one leaves the other alone
+    assert EditJournal.orphans(str(tmp_path)) == []
+    second.discard()
+    assert os.path.exists(first.path)
+    with pytest.raises(OSError):
+        EditJournal(first.path).start(source='a.xml')
+
+
+def test_orphan_is_adopted_with_its_frames(tmp_path):
+    crashed = EditJournal.for_session(str(tmp_path)).start(source='a.xml')
+    crashed.record_frame(_base_frame())
+    crashed.record_cells('price', [0], [999])
+    crashed.release() # As if the process had ended without discarding
+
+    orphans = EditJournal.orphans(str(tmp_path))
+    assert [o.path for o in orphans] == [crashed.path]
+    orphan = orphans[0]
+    _, records = EditJournal.read(orphan.path)
+    recovered, _ = orphan.replay(records, ColumnBuffer.from_frame(_base_frame().iloc[:0]))
+
+    session = EditJournal.for_session(str(tmp_path)).start(source='a.xml')
+    session.adopt(orphan, records)
+    orphan.discard()
+    session.close()
+    assert not os.path.exists(crashed.path)
+
+    _, adopted = EditJournal.read(session.path)
+    replayed, _ = session.replay(adopted, ColumnBuffer.from_frame(_base_frame().iloc[:0]))
+    pd.testing.assert_frame_equal(replayed.to_frame(), recovered.to_frame())
+    assert replayed.to_frame()['price'].tolist() == [999, 2000, 3000, 4000]
+
+
+def test_restart_removes_the_previous_frames(tmp_path):
+    journal = EditJournal.for_session(str(tmp_path)).start(source='a.xml')
+    journal.record_frame(_base_frame())
+    journal.record_frame(_base_frame())
+    assert len(list(tmp_path.glob('*.npz'))) == 2
+    journal.start(source='a.xml') # e.g. after a save
+    assert list(tmp_path.glob('*.npz')) == []
+    journal.record_frame(_base_frame())
+    journal.close()
+    _, records = EditJournal.read(journal.path)
+    replayed, _ = journal.replay(records, ColumnBuffer.from_frame(_base_frame().iloc[:0]))
+    pd.testing.assert_frame_equal(replayed.to_frame(), ColumnBuffer.from_frame(_base_frame()).to_frame())
+    journal.discard()
@@ -0,0 +1,36 @@
+import numpy as np
+import pytest
+
+from core.matrix import MatrixLayout, grid_texts, matrix_tsv
+
+pytest.importorskip('PySide6')
+from ui.dialogs.matrix_import_dialog import MatrixImportDialog
+
+
+def test_layout_restricted_to_rows_keeps_table_row_numbers():
+    kinds = np.array([1, 2, 1, 2])
+    layout = MatrixLayout([100, 100, 200, 200], [10, 10, 10, 10], np.flatnonzero(kinds == 2))
+    assert layout.cell_rows.tolist() == [[1], [3]]
+    assert layout.duplicates == 0
+    assert MatrixLayout([100, 100, 200, 200], [10, 10, 10, 10]).duplicates == 2
+
+
+def test_exported_money_reads_back_with_its_sign():
+    cents = np.array([-50, 0, 1999, -123456, 5, -7], dtype=np.int64)
+    layout = MatrixLayout([100, 100, 100, 200, 200, 200], [1.5, 10, 20, 1.5, 10, 20])
+    tsv = matrix_tsv(layout, grid_texts(layout, cents, money=True))
+
+    rows = [line.split('\t') for line in tsv.splitlines()]
+    assert [MatrixImportDialog.clean_number(t) for t in rows[0][1:]] == [1.5, 10, 20]
+    assert [MatrixImportDialog.clean_number(row[0]) for row in rows[1:]] == [100, 200]
+    read = [MatrixImportDialog.clean_number(t) for row in rows[1:] for t in row[1:]]
+    assert np.round(np.array(read) * 100).astype(np.int64).tolist() == cents.tolist()
+    assert rows[1][1] == '-0,50'
+
+
+@pytest.mark.parametrize('text, value', [
+    ('-0,50', -0.5), ('−1.234,56', -1234.56), ('-1.000', -1000.0), ('€ -12,30', -12.3),
+    ('10-20', 10.0), ('1.234,56', 1234.56), ('', 0.0),
+])
+def test_clean_number_keeps_a_leading_minus(text, value):
+    assert MatrixImportDialog.clean_number(text) == value
@@ -0,0 +1,104 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+pytest.importorskip('PySide6')
+from PySide6.QtCore import Qt
+
+from ui.models import MatrixModel, PandasModel
+
+
+@pytest.fixture
+def model(tobacco_path, load_table):
+    engine, df = load_table(tobacco_path)
+    model = PandasModel()
+    model.setDataFrame(df, engine.schema)
+    return model
+
+
+def _dtypes(model):
+    return {col: model.columnValues(col).dtype for col in model.columns()}
+
+
+def test_edits_keep_the_schema_dtypes(model):
+    before = _dtypes(model)
+    assert before['maxDistance'] == np.float32 and before['id_orderkind'] == np.int8
+    col = model.columns().index('maxDistance')
+    assert model.setData(model.index(0, col), "123.45")
+    model.updateColumn('id_orderkind', 3)
+    model.updateCells('maxWeight', [1, 2], np.array([10.0, 20.5]))
+    model.updateCells('price', [0], np.array([1999], dtype=np.int64))
+    assert _dtypes(model) == before
+    assert model.data(model.index(0, col), Qt.DisplayRole) == "123.45"
+
+
+def test_values_that_do_not_fit_widen_the_column(model):
+    model.updateCells('maxDistance', [0], np.array([999999.99]))
+    model.updateColumn('id_orderkind', 300)
+    assert model.columnValues('maxDistance').dtype == np.float64
+    assert model.columnValues('maxDistance')[0] == 999999.99
+    assert model.columnValues('id_orderkind').dtype == np.int64
+    model.updateCells('id_unit', [0], np.array([1.5]))
+    assert model.columnValues('id_unit').dtype == np.float64
+
+
+@pytest.mark.parametrize('max_shifted', [None, 0])
+def test_remove_rows_by_mask_signals_match_the_data(max_shifted):
+    n = 50
+    model = PandasModel(pd.DataFrame({'a': np.arange(n), 'txt': [f"r{i}" for i in range(n)]}))
+    if max_shifted is not None:
+        model.MAX_REMOVE_SHIFTED_ROWS = max_shifted # Forces the reset path
+    mask = np.random.default_rng(1).random(n) < 0.4
+    expected = np.flatnonzero(~mask).tolist()
+
+    shadow = list(range(n))
+    runs, mismatches = [], []
+
+    def check(*_):
+        if model.columnValues('a').tolist() != shadow:
+            mismatches.append(list(shadow))
+
+    def removed(parent, first, last):
+        runs.append((first, last))
+        del shadow[first:last + 1]
+        check()
+    model.rowsAboutToBeRemoved.connect(check)
+    model.rowsRemoved.connect(removed)
+    model.modelReset.connect(lambda: shadow.__setitem__(slice(None), expected))
+    model.removeRowsByMask(mask)
+
+    assert mismatches == []
+    assert model.columnValues('a').tolist() == expected == shadow
+    assert model.columnValues('txt').tolist() == [f"r{i}" for i in expected]
+    if max_shifted is None:
+        # One signal per contiguous run, bottom-up
+        assert len(runs) == int(np.sum(np.diff(np.concatenate(([0], mask.astype(np.int8)))) == 1))
+        assert runs == sorted(runs, reverse=True)
+    else:
+        assert runs == []
+
+
+def test_matrix_shows_and_edits_one_order_kind_at_a_time(tobacco_path, load_table):
+    engine, df = load_table(tobacco_path)
+    other = df.assign(id_orderkind=np.int8(5), price=df['price'] + 100)
+    model = PandasModel()
+    model.setDataFrame(pd.concat([df, other], ignore_index=True), engine.schema)
+    n = len(df)
+    matrix = MatrixModel(model, 'maxDistance', 'maxWeight')
+    assert matrix.orderKinds() == [2, 5] and matrix.orderKind() == 2
+    assert matrix.matrixLayout().duplicates == 0
+    assert (matrix.matrixLayout().cell_rows < n).all()
+
+    matrix.setOrderKind(5)
+    cell = matrix.index(0, 0)
+    row = int(matrix.matrixLayout().cell_rows[0, 0])
+    assert row >= n
+    assert matrix.setData(cell, "12,34")
+    prices = model.columnValues('price')
+    assert prices[row] == 1234
+    assert (prices[:n] == df['price'].to_numpy()).all() # Kind 2 is untouched
+
+    # When the shown kind disappears, the grid falls back to the remaining one
+    model.updateColumn('id_orderkind', 2)
+    assert matrix.orderKinds() == [2] and matrix.orderKind() == 2
+    assert matrix.matrixLayout().duplicates == n
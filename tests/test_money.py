@@ -0,0 +1,78 @@
+from decimal import Decimal, ROUND_HALF_EVEN, ROUND_HALF_UP
+from fractions import Fraction
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from core.bulk_expression import compile_bulk_expression
+from core.money import affine_cents, euros_to_cents, reference_affine_cents, verify_affine
+from core.schema import TariffSchema
+
+_DECIMAL_MODES = {'half_up': ROUND_HALF_UP, 'half_even': ROUND_HALF_EVEN}
+
+
+def _decimal_rule(euros, factor, offset, digits, mode):
+    """Independent reference: exact Decimal result quantized once to the given digits, in cents."""
+    value = Decimal(euros) * Decimal(factor) + Decimal(offset)
+    return int(value.quantize(Decimal(1).scaleb(-digits), rounding=_DECIMAL_MODES[mode]) * 100)
+
+
+def _apply(text, euros, mode='half_up'):
+    df = pd.DataFrame({'price': np.array([round(e * 100) for e in euros], dtype=np.int64)})
+    preview = compile_bulk_expression(text, ['price']).evaluate(df, schema=TariffSchema(['price']), rounding=mode)
+    return preview.stored_values.tolist()
+
+
+@pytest.mark.parametrize('text, euros, expected', [
+    ('price = price + 0.005 round 0', [1.49], [100]),
+    ('price = price + 0.005 round 1', [1.44], [140]),
+    ('price = price + 0.01 round 0', [1.49], [200]),
+    ('price = price * 1 round 0', [2.50, 3.50, -2.50], [300, 400, -300]),
+    ('price = price * 1 round 1', [0.25, 0.35], [30, 40]),
+])
+def test_round_clause_rounds_exact_value_once(text, euros, expected):
+    assert _apply(text, euros) == expected
+
+
+def test_round_clause_half_even_ties():
+    assert _apply('price = price * 1 round 0', [2.50, 3.50, -2.50], 'half_even') == [200, 400, -200]
+    assert _apply('price = price * 1 round 1', [0.25, 0.35], 'half_even') == [20, 40]
+
+
+@pytest.mark.parametrize('mode', ['half_up', 'half_even'])
+@pytest.mark.parametrize('digits', [0, 1, 2])
+def test_affine_rule_matches_decimal_reference(mode, digits):
+    euros = [f"{c / 100:.2f}" for c in range(-300, 301, 7)] + ['1.49', '1.44', '0.05', '2.45', '12.35']
+    expected = [_decimal_rule(e, '1.035', '0.005', digits, mode) for e in euros]
+    result = _apply(f'price = price * 1.035 + 0.005 round {digits}', [float(e) for e in euros], mode)
+    assert result == expected
+
+
+def test_non_affine_rule_rounds_once_to_step():
+    # price * price is evaluated in floats; 1.22² = 1.4884 must not become 1.49 and then 2.00
+    assert _apply('price = price * price round 0', [1.22]) == [100]
+    assert _apply('price = price * price round 1', [1.5]) == [230]
+
+
+@pytest.mark.parametrize('mode', ['half_up', 'half_even'])
+@pytest.mark.parametrize('step', [1, 10, 100])
+def test_verify_affine_takes_exact_fractions(mode, step):
+    cents = np.arange(-5000, 5000, dtype=np.int64)
+    assert verify_affine(cents, Fraction(1, 3), Fraction(1, 200), mode, step) == 0
+    assert verify_affine(cents, Fraction(7, 6), 0, mode, step) == 0
+
+
+def test_reference_keeps_fraction_ties_exact():
+    # 45 cents * 1/2 = 22.5 cents is an exact tie
+    assert reference_affine_cents([45], Fraction(1, 2), 0, 'half_up').tolist() == [23]
+    assert reference_affine_cents([45], Fraction(1, 2), 0, 'half_even').tolist() == [22]
+    assert affine_cents([45], Fraction(1, 2), 0, 'half_even').tolist() == [22]
+    # 45 cents / 3 = 15 cents is a tie at step 10, not 14.99...
+    assert reference_affine_cents([45], Fraction(1, 3), 0, 'half_up', 10).tolist() == [20]
+
+
+def test_euros_to_cents_resolves_float_noise_as_ties():
+    assert euros_to_cents([1.005, 2.675], 'half_up').tolist() == [101, 268]
+    assert euros_to_cents([1.005, 2.675], 'half_even').tolist() == [100, 268]
+    assert euros_to_cents([2.5, 3.5], 'half_even', step=100).tolist() == [200, 400]
@@ -0,0 +1,121 @@
+import asyncio
+import json
+import shutil
+
+import numpy as np
+import pytest
+
+from core.quote_service import QuoteError, QuoteServer, TariffStore, quote
+from core.rating import BracketRater
+
+
+def _decimal(values):
+    """Bracket bounds as the decimals the file states (float32 0.7 is 0.7, not 0.69999999)."""
+    return values.astype(str).astype(np.float64) if values.dtype == np.float32 else values.astype(np.float64)
+
+
+def _brute_force(df, quantity_column, distances, quantities, kind):
+    """Row of the smallest (maxDistance, max quantity) bracket covering each shipment, or -1."""
+    rows = np.flatnonzero(df['id_orderkind'].to_numpy() == kind) if 'id_orderkind' in df else np.arange(len(df))
+    bounds = {}
+    for axis in ('Distance', quantity_column[3:]):
+        lo = _decimal(df['min' + axis].to_numpy())[rows]
+        bounds[axis] = (lo, _decimal(df['max' + axis].to_numpy())[rows], lo.min())
+    result = []
+    for d, q in zip(distances, quantities):
+        best, best_key = -1, None
+        for i, row in enumerate(rows):
+            covered = True
+            for axis, value in (('Distance', d), (quantity_column[3:], q)):
+                lo, hi, lowest = bounds[axis]
+                covered &= value >= 0 and value <= hi[i] and (value > lo[i] or value == lowest == lo[i])
+            key = (bounds['Distance'][1][i], bounds[quantity_column[3:]][1][i])
+            if covered and (best_key is None or key < best_key):
+                best, best_key = row, key
+        result.append(best)
+    return np.array(result)
+
+
+@pytest.mark.parametrize('fixture', ['distri_path', 'tobacco_path'])
+def test_rater_matches_brute_force_lookup(fixture, request, load_table):
+    _, df = load_table(request.getfixturevalue(fixture))
+    rater = BracketRater(df)
+    kind = rater.order_kinds[0]
+    d_keys, q_keys = rater.bracket_keys(kind)
+    rng = np.random.default_rng(7)
+    # Every bracket bound, just above it, and random points inside and outside the grid
+    distances = np.concatenate([d_keys, d_keys + 0.01, [-1, 0], rng.uniform(-10, d_keys.max() * 1.1, 40)])
+    quantities = np.concatenate([q_keys, q_keys + 0.01, [0, -1], rng.uniform(-10, q_keys.max() * 1.1, 40)])
+    n = min(distances.size, quantities.size)
+    distances, quantities = rng.permutation(distances)[:n], rng.permutation(quantities)[:n]
+    distances[:2], quantities[:2] = d_keys[0], q_keys[0] # The lowest corner is covered
+
+    expected = _brute_force(df, rater.quantity_column, distances, quantities, kind)
+    np.testing.assert_array_equal(rater.lookup(distances, quantities, kind), expected)
+    assert expected[0] >= 0
+
+
+@pytest.fixture
+def store(tmp_path, distri_path):
+    shutil.copy(distri_path, tmp_path / 'distri.xml')
+    store = TariffStore([str(tmp_path)])
+    store.refresh()
+    return store
+
+
+@pytest.mark.parametrize('tariff', [['distri'], {'name': 'distri'}, 7, None])
+def test_quote_rejects_tariff_that_is_not_a_name(store, tariff):
+    with pytest.raises(QuoteError):
+        quote(store, {'tariff': tariff, 'distance': [10], 'quantity': [1]})
+    status, result = QuoteServer(store)._dispatch('POST', '/quote', json.dumps({'tariff': tariff}).encode())
+    assert status == 400 and 'error' in result
+
+
+def test_quote_prices_known_tariff(store):
+    result = quote(store, {'tariff': 'distri', 'shipments': [{'distance': 10, 'quantity': 1},
+                                                             {'distance': -1, 'quantity': 1}]})
+    assert result['prices'][0] is not None and result['prices'][1] is None
+    assert result['unrated'] == 1
+
+
+def test_refresh_replaces_errors_instead_of_mutating_them(store, tmp_path):
+    before = store.errors
+    (tmp_path / 'broken.xml').write_text('<not a tariff', encoding='utf-8')
+    store.refresh()
+    assert before == {} and store.errors is not before
+    assert list(store.errors) == [str(tmp_path / 'broken.xml')]
+    (tmp_path / 'broken.xml').unlink()
+    store.refresh()
+    assert store.errors == {}
+
+
+def test_server_answers_500_and_keeps_the_connection(store):
+    server = QuoteServer(store)
+    calls = []
+
+    def failing_tariffs():
+        calls.append(1)
+        raise RuntimeError("kaputt")
+    store.tariffs = failing_tariffs
+
+    async def exchange():
+        listener = await asyncio.start_server(server._handle_client, '127.0.0.1', 0)
+        port = listener.sockets[0].getsockname()[1]
+        reader, writer = await asyncio.open_connection('127.0.0.1', port)
+        statuses = []
+        for path in ('/tariffs', '/quote'):
+            body = json.dumps({'tariff': 'distri', 'distance': 10, 'quantity': 1}).encode()
+            method = 'GET' if path == '/tariffs' else 'POST'
+            writer.write(f"{method} {path} HTTP/1.1\r\nContent-Length: {len(body)}\r\n\r\n".encode() + body)
+            head = await reader.readuntil(b"\r\n\r\n")
+            length = int([line for line in head.decode().split("\r\n") if line.startswith("Content-Length")][0].split(":")[1])
+            statuses.append((int(head.split(b" ")[1]), json.loads(await reader.readexactly(length))))
+        writer.close()
+        listener.close()
+        await listener.wait_closed()
+        return statuses
+
+    (first, error), (second, result) = asyncio.run(exchange())
+    assert first == 500 and 'kaputt' in error['error']
+    assert second == 200 and result['prices'][0] is not None
+    assert calls == [1]
@@ -0,0 +1,26 @@
+import numpy as np
+import pandas as pd
+
+from core.schema import TariffSchema
+
+
+def test_small_bracket_bounds_stay_float32():
+    schema = TariffSchema(['maxWeight'])
+    stored = schema.coerce_column('maxWeight', np.array(['0.7', '250', '99999.99'], dtype=object))
+    assert stored.dtype == np.float32
+    assert schema.format_column('maxWeight', stored).tolist() == ['0.70', '250.00', '99999.99']
+
+
+def test_bounds_that_lose_cents_in_float32_widen_to_float64():
+    schema = TariffSchema(['minWeight', 'maxWeight'])
+    df = schema.coerce_frame(pd.DataFrame({'minWeight': [0.0, 500000.0], 'maxWeight': [500000.0, 999999.99]}))
+    assert df['minWeight'].dtype == np.float32
+    assert df['maxWeight'].dtype == np.float64
+    assert schema.format_column('maxWeight', df['maxWeight'].to_numpy()).tolist() == ['500000.00', '999999.99']
+
+
+def test_float32_check_ignores_missing_values():
+    schema = TariffSchema(['maxDistance'])
+    stored = schema.coerce_column('maxDistance', np.array([None, 'x', 12.5], dtype=object))
+    assert stored.dtype == np.float32
+    assert np.isnan(stored[:2]).all() and stored[2] == 12.5
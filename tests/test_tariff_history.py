@@ -0,0 +1,88 @@
+import numpy as np
+import pytest
+
+from core.comtec_document import ComtecDocument
+from core.tariff_history import (HistoryError, TariffHistory, decode_column, encode_column, tariff_name,
+                                 tuple_skeleton)
+
+
+@pytest.fixture
+def history(tmp_path):
+    with TariffHistory(str(tmp_path / 'history.sqlite')) as history:
+        yield history
+
+
+@pytest.mark.parametrize('values', [np.array([0.7, 250.5], dtype=np.float32), np.array([1999, -5], dtype=np.int64),
+                                    np.array([2, 3], dtype=np.int8), np.array(['a', 'ä'], dtype=object)])
+def test_column_encoding_round_trips(values):
+    decoded = decode_column(*encode_column(values))
+    assert decoded.dtype == values.dtype
+    np.testing.assert_array_equal(decoded, values)
+
+
+def test_checkout_round_trips_table_and_header(history, distri_path, load_table, tmp_path):
+    [(_, version_id, added)] = history.add_file(distri_path)
+    assert added > 0
+    engine, df = history.checkout(version_id)
+    source_engine, source = load_table(distri_path)
+    assert df.equals(source)
+    assert engine.get_metadata() == source_engine.get_metadata()
+
+    # The checked out version saves back to an equivalent tariff file
+    target = str(tmp_path / 'checkout.xml')
+    engine.save_streaming(df, target)
+    _, reloaded = load_table(target)
+    assert reloaded.equals(source)
+
+
+def test_new_version_shares_unchanged_chunks(history, distri_path, load_table):
+    [(_, first, full_size)] = history.add_file(distri_path, label='2024')
+    engine, df = load_table(distri_path)
+    raised = df.copy()
+    raised['price'] = raised['price'] * 2
+    with open(distri_path, 'rb') as f:
+        skeleton = tuple_skeleton(f.read())
+    second, added = history.add(raised, skeleton, tariff_name(distri_path), '2025',
+                                engine.get_metadata().get('valid_from'), schema=engine.schema)
+    assert 0 < added < full_size
+    chunks = [{c['name']: c['chunks'] for c in history.version(v).manifest['columns']} for v in (first, second)]
+    assert [c for c in chunks[0] if chunks[0][c] != chunks[1][c]] == ['price'] # Only the price column is new
+
+    prices = history.price_history(tariff_name(distri_path), at=(10, 0.1))
+    assert prices['label'].tolist() == ['2024', '2025']
+    assert prices['price'].iloc[1] == pytest.approx(prices['price'].iloc[0] * 2)
+    assert prices['change_pct'].iloc[1] == pytest.approx(100)
+
+    history.delete(second)
+    assert [v.id for v in history.versions()] == [first]
+    assert history.frame(history.version(first)).equals(df)
+    with pytest.raises(HistoryError):
+        history.version(second)
+
+
+def _two_item_file(tmp_path, path):
+    """path with its tariff item repeated."""
+    with open(path, 'rb') as f:
+        raw = f.read()
+    start, end = raw.index(b'<tariff_item>'), raw.rindex(b'</tariff_item>') + len(b'</tariff_item>')
+    target = tmp_path / 'two_items.xml'
+    target.write_bytes(raw[:end] + b"\n" + raw[start:end] + raw[end:])
+    return str(target)
+
+
+def test_multi_item_file_stores_every_item(history, distri_path, load_table, tmp_path):
+    path = _two_item_file(tmp_path, distri_path)
+    assert len(ComtecDocument.open(path)) == 2
+    stored = history.add_file(path, tariff='distri')
+    assert [name for name, _, _ in stored] == ['distri:1', 'distri:2']
+    _, source = load_table(distri_path)
+    for _, version_id, _ in stored:
+        engine, df = history.checkout(version_id)
+        assert df.equals(source)
+        assert len(engine.root.findall('.//tariff_item')) == 1
+
+
+def test_skeleton_refuses_multi_item_documents(tmp_path, distri_path):
+    with open(_two_item_file(tmp_path, distri_path), 'rb') as f:
+        with pytest.raises(ValueError):
+            tuple_skeleton(f.read())
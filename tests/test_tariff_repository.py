@@ -0,0 +1,74 @@
+import os
+import shutil
+
+import numpy as np
+import pytest
+
+from core.rating import BracketRater
+from core.tariff_repository import RepositoryError, TariffRepository
+
+
+@pytest.fixture
+def repo(tmp_path, distri_path, tobacco_path):
+    folder = tmp_path / "tariffs"
+    folder.mkdir()
+    shutil.copy(distri_path, folder)
+    shutil.copy(tobacco_path, folder)
+    with TariffRepository(str(tmp_path / "repo.sqlite")) as repo:
+        result = repo.ingest([str(folder)])
+        assert result['ingested'] == 2 and not result['errors']
+        yield repo, folder
+
+
+def _tariff_id(repo, name):
+    return int(repo.tariffs(name=name)['id'].iloc[0])
+
+
+def test_open_round_trips_table_and_header(repo, distri_path, load_table):
+    repo, _ = repo
+    engine, df = repo.open(_tariff_id(repo, 'DISTRI'))
+    source_engine, source = load_table(distri_path)
+    assert df.equals(source)
+    assert engine.get_metadata() == source_engine.get_metadata()
+
+
+def test_reingest_skips_unchanged_and_prunes_deleted(repo):
+    repo, folder = repo
+    assert repo.ingest([str(folder)]) == {'ingested': 0, 'unchanged': 2, 'removed': 0, 'errors': {}}
+    os.remove(next(folder.glob('TOBACCO*')))
+    result = repo.ingest([str(folder)], prune=True)
+    assert result['removed'] == 1
+    assert list(repo.tariffs()['name']) == ['PROD_Uploadfile_VLX_LEJ_DISTRI_TARIF_2024']
+
+
+def test_find_exact_bracket(repo):
+    repo, _ = repo
+    found = repo.find_brackets({'maxDistance': 250, 'maxVolume': 10})
+    assert len(found) == 1
+    assert found['max_distance'].iloc[0] == 250 and found['max_quantity'].iloc[0] == 10
+    # A weight bracket filter must not match a volume tariff
+    assert repo.find_brackets({'maxDistance': 250, 'maxWeight': 10}).empty
+
+
+def test_find_rejects_unknown_columns(repo):
+    repo, _ = repo
+    with pytest.raises(RepositoryError):
+        repo.find_brackets({'description': 1})
+
+
+@pytest.mark.parametrize("name", ['DISTRI', 'TOBACCO'])
+def test_containment_matches_bracket_rater(repo, name):
+    repo, _ = repo
+    tariff = _tariff_id(repo, name)
+    _, df = repo.open(tariff)
+    rater = BracketRater(df)
+    d_keys, q_keys = rater.bracket_keys()
+    rng = np.random.default_rng(7)
+    points = [(0.0, 0.0), (d_keys[1], q_keys[1]), (-1.0, 1.0)]
+    points += [(float(rng.choice(d_keys)), float(rng.choice(q_keys))) for _ in range(30)]
+    points += [(rng.uniform(0, d_keys[-1] * 1.1), rng.uniform(0, q_keys[-1] * 1.1)) for _ in range(30)]
+    for distance, quantity in points:
+        row = int(rater.lookup([distance], [quantity])[0])
+        found = repo.find_brackets(at=(distance, quantity))
+        rows = set((found.loc[found['tariff'] == tariff, 'row'] - 1).tolist())
+        assert rows == ({row} if row >= 0 else set()), (distance, quantity)